@@ -0,0 +1,108 @@
+import time
+
+import aiohttp
+
+
+class CircuitOpenError(aiohttp.ClientError):
+    """熔断器处于打开状态，请求被直接拒绝
+
+    继承 ClientError，指令处理函数会像处理连接失败一样处理它。
+    """
+
+    def __init__(self, host: str, retry_after: float) -> None:
+        super().__init__(f"{host} 暂时不可用，{retry_after:.0f} 秒后重试")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """单个上游主机的熔断器
+
+    连续失败 failure_threshold 次后打开，打开期间请求立即失败；
+    经过 recovery_timeout 秒进入半开状态，只放行一个探测请求，
+    探测成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self, host: str, failure_threshold: int = 5, recovery_timeout: float = 30
+    ) -> None:
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probing = False
+
+    def before_request(self):
+        """请求前调用，熔断时抛出 CircuitOpenError"""
+        if self.state == self.CLOSED:
+            return
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.recovery_timeout - now
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.host, remaining)
+            self.state = self.HALF_OPEN
+            self._probing = False
+        # 半开状态只允许一个探测请求
+        if self._probing:
+            self.rejected += 1
+            raise CircuitOpenError(self.host, self.recovery_timeout)
+        self._probing = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def release_probe(self):
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class CircuitBreakerBoard:
+    """按主机管理熔断器"""
+
+    STATE_NAMES = {
+        CircuitBreaker.CLOSED: "🟢 正常",
+        CircuitBreaker.OPEN: "🔴 熔断",
+        CircuitBreaker.HALF_OPEN: "🟡 探测中",
+    }
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.breakers: dict = {}
+
+    def get(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(host, self.failure_threshold, self.recovery_timeout)
+            self.breakers[host] = breaker
+        return breaker
+
+    def describe(self) -> str:
+        """返回各主机熔断状态的可读文本"""
+        if not self.breakers:
+            return "暂无请求记录"
+        lines = []
+        for host, breaker in sorted(self.breakers.items()):
+            line = f"{host}：{self.STATE_NAMES[breaker.state]}，连续失败 {breaker.failures} 次，已拒绝 {breaker.rejected} 次"
+            if breaker.state == CircuitBreaker.OPEN:
+                remaining = breaker.opened_at + breaker.recovery_timeout - time.monotonic()
+                line += f"，{max(remaining, 0):.0f} 秒后探测"
+            lines.append(line)
+        return "\n".join(lines)
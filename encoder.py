@@ -0,0 +1,137 @@
+import asyncio
+import io
+import os
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image as PILImage
+
+logger = logging.getLogger("astrbot")
+
+# format 为 jpeg / webp / png，quality 为 1-100，max_dimension 为最长边像素，0 表示不缩放
+EncodeProfile = namedtuple("EncodeProfile", ["format", "quality", "max_dimension"])
+
+FORMAT_EXTS = {"jpeg": "jpg", "webp": "webp", "png": "png"}
+
+
+def parse_profile(text: str):
+    """解析 "格式:质量:最大边长" 形式的配置，original 或空字符串表示保持原样"""
+    text = (text or "").strip().lower()
+    if text in ("", "original", "原图"):
+        return None
+    parts = text.split(":")
+    fmt = {"jpg": "jpeg"}.get(parts[0], parts[0])
+    if fmt not in FORMAT_EXTS:
+        raise ValueError(f"不支持的图片格式：{parts[0]}")
+    quality = int(parts[1]) if len(parts) > 1 and parts[1] else 85
+    max_dimension = int(parts[2]) if len(parts) > 2 and parts[2] else 0
+    return EncodeProfile(fmt, max(1, min(quality, 100)), max(max_dimension, 0))
+
+
+class ImageEncoder:
+    """按指令配置重新编码发出的图片
+
+    缩放、格式转换和压缩都在独立线程池中执行；
+    重新编码后反而更大且没有缩放时保留原图。按指令记录编码前后的大小。
+    """
+
+    def __init__(self, store, profiles: dict, max_workers: int = 2) -> None:
+        self.store = store
+        self.profiles: dict = {}
+        for command, text in profiles.items():
+            try:
+                self.profiles[command] = parse_profile(text)
+            except ValueError as e:
+                logger.warning(f"{command} 的图片编码配置无效，保持原图: {e}")
+                self.profiles[command] = None
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="encoder")
+        # 指令 -> [图片数, 编码前字节数, 编码后字节数]
+        self.stats: dict = {}
+
+    def profile(self, command: str):
+        return self.profiles.get(command)
+
+    def record(self, command: str, before: int, after: int):
+        stats = self.stats.setdefault(command, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += before
+        stats[2] += after
+
+    @staticmethod
+    def prepare(img, profile: EncodeProfile):
+        """按最长边缩放，并转换为目标格式支持的色彩模式"""
+        if profile.max_dimension and max(img.size) > profile.max_dimension:
+            img = img.copy()
+            img.thumbnail((profile.max_dimension, profile.max_dimension), PILImage.LANCZOS)
+        if profile.format == "jpeg" and img.mode != "RGB":
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = PILImage.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            else:
+                img = img.convert("RGB")
+        return img
+
+    @classmethod
+    def encode_image(cls, img, profile: EncodeProfile) -> bytes:
+        img = cls.prepare(img, profile)
+        buf = io.BytesIO()
+        if profile.format == "jpeg":
+            img.save(buf, format="JPEG", quality=profile.quality, optimize=True, progressive=True)
+        elif profile.format == "webp":
+            img.save(buf, format="WEBP", quality=profile.quality, method=4)
+        else:
+            # PNG 量化为 256 色调色板，适合海报、截图一类颜色较少的图片
+            if img.mode not in ("P", "L"):
+                img = img.convert("RGBA").quantize(colors=256, method=PILImage.FASTOCTREE)
+            img.save(buf, format="PNG", optimize=True)
+        return buf.getvalue()
+
+    def _encode_file(self, path: str, profile: EncodeProfile):
+        with PILImage.open(path) as img:
+            if getattr(img, "is_animated", False):
+                # 动图保持原样
+                return None
+            resized = bool(profile.max_dimension and max(img.size) > profile.max_dimension)
+            img.load()
+            data = self.encode_image(img, profile)
+        if not resized and len(data) >= os.path.getsize(path):
+            return None
+        return data
+
+    async def encode_file(self, command: str, path: str) -> str:
+        """按指令配置重新编码存储中的图片，返回新图片路径；无需编码时返回原路径"""
+        profile = self.profile(command)
+        if profile is None:
+            return path
+        before = os.path.getsize(path)
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(self.executor, self._encode_file, path, profile)
+        except Exception as e:
+            # 无法识别的图片直接发送原图
+            logger.warning(f"{command} 图片重新编码失败，发送原图: {e}")
+            data = None
+        if data is None:
+            self.record(command, before, before)
+            return path
+        self.record(command, before, len(data))
+        logger.debug(f"{command} 图片重新编码：{before / 1024:.0f}KB -> {len(data) / 1024:.0f}KB")
+        return await self.store.put(data, FORMAT_EXTS[profile.format])
+
+    def describe(self) -> str:
+        """返回各指令编码前后大小的可读文本"""
+        if not self.stats:
+            return "暂无编码记录"
+        lines = []
+        for command, (count, before, after) in sorted(self.stats.items()):
+            line = f"{command}：{count} 张，平均 {after / count / 1024:.0f}KB"
+            if before:
+                line += f"（编码前 {before / count / 1024:.0f}KB，节省 {1 - after / before:.0%}）"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
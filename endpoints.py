@@ -0,0 +1,312 @@
+import asyncio
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import aiohttp
+
+from .http_client import PluginHttpClient
+from .circuit_breaker import CircuitBreakerBoard
+
+logger = logging.getLogger("astrbot")
+
+class UpstreamError(Exception):
+    """上游接口返回了非 200 状态码"""
+
+    def __init__(self, endpoint: str, status: int, body: str = "") -> None:
+        super().__init__(f"{endpoint} 返回 HTTP {status}")
+        self.endpoint = endpoint
+        self.status = status
+        self.body = body
+
+
+@dataclass
+class Endpoint:
+    """一个上游接口的声明
+
+    params 为参数名到是否必填的映射，defaults 为每次请求都会带上的固定参数。
+    parser 可选 json / text / media，media 把响应体流式写入图片存储并返回文件路径。
+    coalesce 为 True 时，相同参数的并发请求只会真正请求一次上游；
+    每次都应返回不同内容的随机接口需要关闭。
+    cache_if 不为空时只缓存使其返回 True 的结果，避免把错误或空结果缓存 cache_ttl 秒。
+    """
+
+    name: str
+    host: str
+    path: str
+    params: dict = field(default_factory=dict)
+    defaults: dict = field(default_factory=dict)
+    method: str = "GET"
+    scheme: str = "https"
+    timeout: float = 15
+    connect_timeout: float = 10
+    retries: int = 0
+    cache_ttl: float = 0
+    parser: str = "json"
+    headers: dict = field(default_factory=dict)
+    coalesce: bool = True
+    cache_if: Optional[Callable] = None
+
+    @property
+    def url(self) -> str:
+        return f"{self.scheme}://{self.host}{self.path}"
+
+
+def has_data(data) -> bool:
+    """接口返回 code 200 且 data 不为空"""
+    return isinstance(data, dict) and data.get("code") == 200 and bool(data.get("data"))
+
+
+def has_field(key: str) -> Callable:
+    """返回 JSON 中 key 字段不为空时才缓存的判断函数，用于没有 code 字段的接口"""
+    return lambda data: isinstance(data, dict) and bool(data.get(key))
+
+
+def has_text(data) -> bool:
+    """文本接口返回了非空内容，而不是空白或 HTML 错误页"""
+    return isinstance(data, str) and bool(data.strip()) and not data.lstrip().startswith("<")
+
+
+def contains(marker: str) -> Callable:
+    """返回文本中包含 marker 时才缓存的判断函数"""
+    return lambda data: isinstance(data, str) and marker in data
+
+
+BROWSER_UA = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+ENDPOINTS = [
+    # yuxli
+    Endpoint("weather", "api.yuxli.cn", "/api/tianqi.php", params={"msg": True},
+             defaults={"b": "1"}, scheme="http", parser="text", retries=1, cache_ttl=600, cache_if=contains("☁.")),
+    Endpoint("lunar", "api.yuxli.cn", "/api/nongli.php",
+             scheme="http", parser="text", retries=1, cache_ttl=1800, cache_if=has_text),
+    # pearktrue
+    Endpoint("certificate", "api.pearktrue.cn", "/api/certcommend/",
+             params={"name": True, "title": True, "classname": True}, parser="media", timeout=30),
+    Endpoint("highspeed_ticket", "api.pearktrue.cn", "/api/highspeedticket",
+             params={"from": True, "to": True, "time": False}, retries=1, cache_ttl=180, cache_if=has_data),
+    Endpoint("college", "api.pearktrue.cn", "/api/college/",
+             params={"keyword": True}, retries=1, cache_ttl=3600, cache_if=has_data),
+    Endpoint("trademark", "api.pearktrue.cn", "/api/trademark/",
+             params={"keyword": True}, retries=1, cache_ttl=3600, cache_if=has_data),
+    Endpoint("brain_teaser", "api.pearktrue.cn", "/api/brainteasers/", timeout=30, coalesce=False),
+    Endpoint("movie_lines", "api.pearktrue.cn", "/api/media/lines.php",
+             params={"word": True, "page": True}, timeout=30, retries=1, cache_ttl=3600,
+             cache_if=has_data),
+    Endpoint("horoscope", "api.pearktrue.cn", "/api/xzys/",
+             params={"xz": True}, retries=1, cache_ttl=1800, cache_if=has_data),
+    Endpoint("pan123", "api.pearktrue.cn", "/api/123panparse/",
+             params={"url": True, "pwd": False, "Authorization": False}),
+    Endpoint("ai_recognition", "api.pearktrue.cn", "/api/airecognizeimg/",
+             params={"file": True}, method="POST", timeout=30),
+    # nilou
+    Endpoint("genshin_basic", "api.nilou.moe", "/v1/bbs/genshin/BasicInfo",
+             params={"uid": True, "server": True}, retries=1, cache_ttl=300,
+             cache_if=has_field("data")),
+    Endpoint("genshin_abyss", "api.nilou.moe", "/v1/bbs/genshin/AbyssInfo",
+             params={"uid": True, "server": True, "type": True}, retries=1, cache_ttl=300,
+             cache_if=has_field("data")),
+    # 52vmy
+    Endpoint("random_game_image", "api.52vmy.cn", "/api/img/tu/game", retries=1, coalesce=False),
+    Endpoint("search_360", "api.52vmy.cn", "/api/img/360", params={"msg": True},
+             retries=1, coalesce=False),
+    # tangdouz
+    Endpoint("dont_starve_wiki", "api.tangdouz.com", "/a/jhwiki.php",
+             params={"nr": True}, defaults={"return": "json"}, retries=1, cache_ttl=3600,
+             cache_if=has_field("content")),
+    Endpoint("minecraft_wiki", "api.tangdouz.com", "/mcwiki.php",
+             params={"nr": True}, defaults={"return": "json"}, retries=1, cache_ttl=3600,
+             cache_if=has_field("allcontent")),
+    # 34bc
+    Endpoint("huluxia", "wwm.34bc.com", "/API/hlx_ruanjian.php",
+             params={"msg": True, "n": False}, parser="text", retries=1, cache_ttl=600,
+             cache_if=has_text),
+    Endpoint("haoyou_hot", "wwm.34bc.com", "/API/Haoyou_Quick_Hot_Search.php",
+             parser="text", retries=1, cache_ttl=300, cache_if=contains("----好游快爆热搜榜----")),
+    # 图片类
+    Endpoint("genshin_image", "api.xiaomei520.sbs", "/api/元神/",
+             scheme="http", parser="media", headers=BROWSER_UA, coalesce=False),
+    Endpoint("blue_archive_image", "rba.kanostar.top", "/adapt",
+             params={"type": True}, parser="media", headers=BROWSER_UA, coalesce=False),
+    Endpoint("arknights_headhunt", "app.zichen.zone", "/api/headhunts/api.php",
+             params={"pool": True}, defaults={"type": "img"}, parser="media", coalesce=False),
+    Endpoint("ai_image", "api.lvlong.xyz", "/api/ai_image",
+             params={"description": True, "width": False, "height": False,
+                     "enhance": False, "model": False, "seed": False},
+             parser="media", timeout=180, coalesce=False),
+    # 其他
+    Endpoint("trace_moe", "api.trace.moe", "/search",
+             params={"url": True}, defaults={"anilistInfo": ""}),
+    Endpoint("mcsrvstat", "api.mcsrvstat.us", "/2/{ip}", params={"ip": True}, retries=1),
+    Endpoint("hitokoto", "v1.hitokoto.cn", "/", retries=1, coalesce=False),
+    Endpoint("epic_free_games", "store-site-backend-static-ipv4.ak.epicgames.com",
+             "/freeGamesPromotions", retries=1, cache_ttl=600, cache_if=has_field("data")),
+    Endpoint("king_glory", "api.wzryqz.cn", "/gethero",
+             params={"hero": True, "type": True}, timeout=10, cache_ttl=600, cache_if=has_data),
+]
+
+
+class EndpointRegistry:
+    """上游接口注册表
+
+    统一负责拼接 URL、校验参数、超时、重试、缓存、并发合并、按主机熔断以及响应解析，
+    指令处理函数只需要 `await registry.call(名称, **参数)`。
+    """
+
+    def __init__(self, http: PluginHttpClient, media=None, cache_size: int = 256) -> None:
+        self.http = http
+        self.media = media
+        self.breakers = CircuitBreakerBoard()
+        self.endpoints: dict = {}
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        # (接口名, 规范化参数) -> 正在进行中的请求任务
+        self._inflight: dict = {}
+        self.stats = {"calls": 0, "cache_hits": 0, "coalesced": 0, "upstream": 0}
+
+    def register(self, endpoint: Endpoint):
+        self.endpoints[endpoint.name] = endpoint
+
+    def get(self, name: str) -> Endpoint:
+        return self.endpoints[name]
+
+    def normalize_params(self, endpoint: Endpoint, params: dict) -> dict:
+        """校验并规范化参数，去掉值为 None 的可选参数"""
+        normalized = {}
+        for key, value in params.items():
+            if key not in endpoint.params:
+                raise ValueError(f"{endpoint.name} 不接受参数 {key}")
+            if value is None:
+                continue
+            normalized[key] = str(value)
+        for key, required in endpoint.params.items():
+            if required and key not in normalized:
+                raise ValueError(f"{endpoint.name} 缺少必填参数 {key}")
+        return normalized
+
+    def cache_key(self, endpoint: Endpoint, params: dict) -> tuple:
+        return (endpoint.name, tuple(sorted(params.items())))
+
+    async def call(self, name: str, **params):
+        """调用指定接口，返回解析后的数据；非 200 状态抛出 UpstreamError"""
+        endpoint = self.get(name)
+        params = self.normalize_params(endpoint, params)
+        key = self.cache_key(endpoint, params)
+        self.stats["calls"] += 1
+
+        if endpoint.cache_ttl > 0:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return cached[1]
+
+        if not endpoint.coalesce:
+            return await self._fetch_and_store(endpoint, params, key)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._fetch_and_store(endpoint, params, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_inflight_done(key, t))
+        # shield: 某个调用方被取消时不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+
+    def _on_inflight_done(self, key: tuple, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # 标记异常已被获取，避免所有调用方都取消时出现未获取异常的警告
+            task.exception()
+
+    async def _fetch_and_store(self, endpoint: Endpoint, params: dict, key: tuple):
+        self.stats["upstream"] += 1
+        data = await self._fetch_with_retry(endpoint, params)
+
+        if endpoint.cache_ttl > 0 and (endpoint.cache_if is None or endpoint.cache_if(data)):
+            self._cache[key] = (time.monotonic() + endpoint.cache_ttl, data)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return data
+
+    def describe_stats(self) -> str:
+        """返回调用统计的可读文本"""
+        stats = self.stats
+        return (
+            f"接口调用：{stats['calls']} 次\n"
+            f"实际请求上游：{stats['upstream']} 次\n"
+            f"缓存命中：{stats['cache_hits']} 次\n"
+            f"并发合并节省：{stats['coalesced']} 次\n"
+            f"进行中的请求：{len(self._inflight)} 个"
+        )
+
+    async def _fetch_with_retry(self, endpoint: Endpoint, params: dict):
+        breaker = self.breakers.get(endpoint.host)
+        attempt = 0
+        while True:
+            # 熔断打开时直接抛出 CircuitOpenError，不再重试
+            breaker.before_request()
+            try:
+                data = await self._fetch(endpoint, params)
+            except (aiohttp.ClientError, asyncio.TimeoutError, UpstreamError) as e:
+                # 4xx 说明主机仍然可用，只有网络错误、超时和 5xx 计入熔断
+                retryable = not isinstance(e, UpstreamError) or e.status >= 500
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if not retryable or attempt >= endpoint.retries:
+                    raise
+                attempt += 1
+                logger.warning(f"请求 {endpoint.name} 失败：{e!r}，第 {attempt} 次重试")
+                await asyncio.sleep(0.2 * attempt)
+            except BaseException:
+                # 被取消或解析失败时不改变熔断状态，只释放半开探测名额
+                breaker.release_probe()
+                raise
+            else:
+                breaker.record_success()
+                return data
+
+    async def _fetch(self, endpoint: Endpoint, params: dict):
+        url = endpoint.url
+        query = dict(endpoint.defaults)
+        for key, value in params.items():
+            placeholder = "{" + key + "}"
+            if placeholder in url:
+                url = url.replace(placeholder, value)
+            else:
+                query[key] = value
+
+        timeout = aiohttp.ClientTimeout(
+            total=endpoint.timeout, connect=endpoint.connect_timeout
+        )
+        kwargs = {"timeout": timeout, "headers": endpoint.headers or None}
+        if endpoint.method == "GET":
+            kwargs["params"] = query
+        else:
+            kwargs["json"] = query
+
+        async with self.http.session.request(endpoint.method, url, **kwargs) as resp:
+            if resp.status != 200:
+                body = await resp.text(errors="replace")
+                raise UpstreamError(endpoint.name, resp.status, body[:500])
+            if endpoint.parser == "json":
+                return await resp.json(content_type=None)
+            if endpoint.parser == "text":
+                return await resp.text()
+            return await self.media.put_stream(resp)
+
+
+def build_default_registry(http: PluginHttpClient, media=None) -> EndpointRegistry:
+    registry = EndpointRegistry(http, media)
+    for endpoint in ENDPOINTS:
+        registry.register(endpoint)
+    return registry
@@ -0,0 +1,142 @@
+import asyncio
+import math
+import time
+import logging
+
+logger = logging.getLogger("astrbot")
+
+
+class TimerWheel:
+    """所有 ExpiringMap 共用的时间轮清理器
+
+    只有一个后台任务，每 resolution 秒转动一格并让各个表清理到期的键；
+    所有表都为空时任务自动退出，下次写入时再启动。
+    """
+
+    def __init__(self, resolution: float = 1.0) -> None:
+        self.resolution = resolution
+        self.maps: list = []
+        self._task = None
+        self._closed = False
+
+    def add(self, expiring_map: "ExpiringMap"):
+        self.maps.append(expiring_map)
+
+    def wake(self):
+        if self._closed:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while not self._closed:
+            await asyncio.sleep(self.resolution)
+            now = time.monotonic()
+            for expiring_map in self.maps:
+                try:
+                    expiring_map.sweep(now)
+                except Exception as e:
+                    logger.warning(f"清理过期数据失败: {e}")
+            if not any(len(m) for m in self.maps):
+                return
+
+    def close(self):
+        self._closed = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+
+class ExpiringMap:
+    """键在 ttl 秒后自动过期的字典
+
+    写入和查询都是 O(1)：键按到期时间放进时间轮对应的槽，
+    时间轮每转一格只检查当前槽里的键。查询时也会判断是否过期，
+    因此即使清理稍有延迟也不会读到过期数据。
+    on_expire(key, value) 在键自然过期时调用，可以是协程函数。
+    """
+
+    def __init__(self, wheel: TimerWheel, ttl: float, on_expire=None) -> None:
+        self.wheel = wheel
+        self.ttl = ttl
+        self.on_expire = on_expire
+        self.entries: dict = {}
+        self.slots = [set() for _ in range(math.ceil(ttl / wheel.resolution) + 2)]
+        self._next_tick = None
+        wheel.add(self)
+
+    def _tick_of(self, deadline: float) -> int:
+        return math.ceil(deadline / self.wheel.resolution)
+
+    def set(self, key, value=True):
+        deadline = time.monotonic() + self.ttl
+        self.entries[key] = (value, deadline)
+        tick = self._tick_of(deadline)
+        self.slots[tick % len(self.slots)].add(key)
+        if self._next_tick is None:
+            self._next_tick = math.floor(time.monotonic() / self.wheel.resolution)
+        self.wheel.wake()
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def __contains__(self, key) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def pop(self, key, default=None):
+        """移除并返回键的值，不触发 on_expire；槽中残留的键在转到时被忽略"""
+        entry = self.entries.pop(key, None)
+        if entry is None or entry[1] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def sweep(self, now: float):
+        if self._next_tick is None:
+            return
+        # 只处理已经完整经过的格子，格子里的键此时一定已经到期
+        current = math.floor(now / self.wheel.resolution)
+        if current - self._next_tick >= len(self.slots):
+            # 事件循环被阻塞超过一整圈时直接全量检查
+            for slot in self.slots:
+                slot.clear()
+            for key, (value, deadline) in list(self.entries.items()):
+                if deadline <= now:
+                    del self.entries[key]
+                    self._expired(key, value)
+                else:
+                    self.slots[self._tick_of(deadline) % len(self.slots)].add(key)
+            self._next_tick = current + 1
+            return
+        # 处理上次清理之后经过的每一格
+        for tick in range(self._next_tick, current + 1):
+            slot = self.slots[tick % len(self.slots)]
+            if not slot:
+                continue
+            keys = list(slot)
+            slot.clear()
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                value, deadline = entry
+                if deadline > now:
+                    # 键被重新写入过，新的到期时间在别的槽里；若恰好落在同一槽（下一圈）则放回
+                    if self._tick_of(deadline) % len(self.slots) == tick % len(self.slots):
+                        slot.add(key)
+                    continue
+                del self.entries[key]
+                self._expired(key, value)
+        self._next_tick = current + 1
+
+    def _expired(self, key, value):
+        if self.on_expire is None:
+            return
+        result = self.on_expire(key, value)
+        if asyncio.iscoroutine(result):
+            asyncio.ensure_future(result)
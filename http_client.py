@@ -0,0 +1,49 @@
+import aiohttp
+
+
+class PluginHttpClient:
+    """插件共享的 HTTP 客户端
+
+    所有指令复用同一个 ClientSession，连接池按主机限流、保持长连接并缓存 DNS，
+    避免每条消息都重新进行 TCP/TLS 握手和域名解析。
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        keepalive_timeout: float = 30,
+        dns_cache_ttl: int = 300,
+        total_timeout: float = 30,
+        connect_timeout: float = 10,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout, connect=connect_timeout
+        )
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """获取共享会话，首次使用时在事件循环中创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout
+            )
+        return self._session
+
+    async def close(self):
+        """关闭会话并释放连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
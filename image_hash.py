@@ -0,0 +1,43 @@
+from PIL import Image as PILImage
+
+# 64 位 dHash 切分成 8 段，每段 8 位；汉明距离不超过 7 的两个哈希至少有一段完全相同
+HASH_BANDS = 8
+BAND_BITS = 8
+
+
+def dhash_file(path: str, hash_size: int = 8) -> int:
+    """计算图片的差值哈希（dHash），返回 64 位无符号整数
+
+    缩放到 (hash_size + 1) x hash_size 的灰度图后比较相邻像素的明暗，
+    对缩放、重新压缩和轻微调色不敏感。动图只取第一帧。
+    """
+    with PILImage.open(path) as img:
+        # JPEG 直接以缩小的尺寸解码，大图也只需要几毫秒
+        img.draft("L", (hash_size * 8, hash_size * 8))
+        small = img.convert("L").resize((hash_size + 1, hash_size), PILImage.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def hash_bands(value: int) -> list:
+    """把哈希切成带段号的索引键，用于在数据库中查找近似哈希的候选"""
+    mask = (1 << BAND_BITS) - 1
+    return [(band << BAND_BITS) | ((value >> (band * BAND_BITS)) & mask) for band in range(HASH_BANDS)]
+
+
+def to_signed(value: int) -> int:
+    """SQLite 整数是有符号 64 位，存储前转换"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
@@ -0,0 +1,166 @@
+import asyncio
+import math
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger("astrbot")
+
+
+class ImageSourceError(Exception):
+    """图片来源返回了无法使用的数据，异常信息可以直接展示给用户"""
+
+
+class ImagePool:
+    """单个来源 + 变体的预取图片池
+
+    池中保存已经下载好的图片文件，指令取图时直接弹出，随后在后台补充。
+    目标深度根据该指令的请求速率和补充耗时自适应调整。
+    """
+
+    def __init__(
+        self,
+        key: str,
+        fetch,
+        min_depth: int = 1,
+        max_depth: int = 6,
+        alpha: float = 0.3,
+    ) -> None:
+        self.key = key
+        self.fetch = fetch
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.alpha = alpha
+        self.items = deque()
+        self.bytes = 0
+        # 请求间隔与单次下载耗时的 EWMA（秒）
+        self.interval = 60.0
+        self.fetch_time = 1.0
+        self.last_request = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.refill_task = None
+        self.failures = 0
+
+    @property
+    def target_depth(self) -> int:
+        """补充一张图期间预计到达的请求数，再留一张余量"""
+        rate = 1.0 / max(self.interval, 0.1)
+        depth = math.ceil(rate * self.fetch_time) + 1
+        return max(self.min_depth, min(self.max_depth, depth))
+
+    def record_request(self):
+        now = time.monotonic()
+        if self.last_request:
+            # 长时间无人使用时间隔上限为 10 分钟，避免冷门指令常驻大量图片
+            gap = min(now - self.last_request, 600.0)
+            self.interval += self.alpha * (gap - self.interval)
+        self.last_request = now
+
+    def record_fetch(self, elapsed: float):
+        self.fetch_time += self.alpha * (elapsed - self.fetch_time)
+
+
+class ImagePoolManager:
+    """管理所有随机图片指令的预取池，并限制池内图片总字节数
+
+    图片保存在 MediaStore 中，池内尚未发出的图片会被 pin 住，取出后交由存储按 LRU 清理。
+    """
+
+    def __init__(self, store, byte_budget: int = 64 * 1024 * 1024, postprocess=None) -> None:
+        self.store = store
+        # 入池前对图片的处理（例如重新编码），接收并返回存储中的路径
+        self.postprocess = postprocess
+        self.byte_budget = byte_budget
+        self.fetchers: dict = {}
+        self.pools: dict = {}
+        self.closed = False
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(pool.bytes for pool in self.pools.values())
+
+    def register(self, source: str, fetch):
+        """注册图片来源，fetch(variant) 把图片写入存储并返回路径，失败时抛出异常"""
+        self.fetchers[source] = fetch
+
+    def get_pool(self, source: str, variant: str = "") -> ImagePool:
+        key = f"{source}:{variant}" if variant else source
+        pool = self.pools.get(key)
+        if pool is None:
+            fetcher = self.fetchers[source]
+            pool = ImagePool(key, lambda: fetcher(variant))
+            self.pools[key] = pool
+        return pool
+
+    async def take(self, source: str, variant: str = "") -> str:
+        """取出一张图片并返回文件路径；池为空时当场下载"""
+        pool = self.get_pool(source, variant)
+        pool.record_request()
+        if pool.items:
+            path, size = pool.items.popleft()
+            pool.bytes -= size
+            pool.hits += 1
+            self.store.unpin(path)
+            self.schedule_refill(pool)
+            return path
+
+        pool.misses += 1
+        path, _ = await self._fetch_to_file(pool)
+        self.schedule_refill(pool)
+        return path
+
+    def schedule_refill(self, pool: ImagePool):
+        if self.closed:
+            return
+        if pool.refill_task is None or pool.refill_task.done():
+            pool.refill_task = asyncio.ensure_future(self._refill(pool))
+
+    async def _refill(self, pool: ImagePool):
+        while not self.closed and len(pool.items) < pool.target_depth:
+            if self.total_bytes >= self.byte_budget:
+                logger.debug(f"图片池总大小已达上限，暂停补充 {pool.key}")
+                return
+            try:
+                path, size = await self._fetch_to_file(pool)
+            except Exception as e:
+                pool.failures += 1
+                logger.warning(f"预取 {pool.key} 图片失败: {e}")
+                # 失败后退避，下一次取图时再重新补充
+                await asyncio.sleep(min(2 ** pool.failures, 60))
+                return
+            pool.failures = 0
+            self.store.pin(path)
+            pool.items.append((path, size))
+            pool.bytes += size
+
+    async def _fetch_to_file(self, pool: ImagePool):
+        start = time.monotonic()
+        path = await pool.fetch()
+        if self.postprocess is not None:
+            path = await self.postprocess(path)
+        pool.record_fetch(time.monotonic() - start)
+        return path, self.store.size_of(path)
+
+    def describe(self) -> str:
+        """返回各图片池状态的可读文本"""
+        if not self.pools:
+            return "暂无请求记录"
+        lines = []
+        for key, pool in sorted(self.pools.items()):
+            lines.append(
+                f"{key}：{len(pool.items)}/{pool.target_depth} 张，{pool.bytes / 1024:.0f}KB，"
+                f"命中 {pool.hits} 次，未命中 {pool.misses} 次"
+            )
+        lines.append(f"总计 {self.total_bytes / 1024 / 1024:.1f}MB / {self.byte_budget / 1024 / 1024:.0f}MB")
+        return "\n".join(lines)
+
+    async def close(self):
+        self.closed = True
+        for pool in self.pools.values():
+            if pool.refill_task is not None and not pool.refill_task.done():
+                pool.refill_task.cancel()
+            for path, _ in pool.items:
+                self.store.unpin(path)
+            pool.items.clear()
+            pool.bytes = 0
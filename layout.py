@@ -0,0 +1,138 @@
+import threading
+
+from PIL import ImageFont as PILImageFont
+
+
+class GlyphMetrics:
+    """单个字号的字形宽度缓存，每个字符只向 FreeType 查询一次"""
+
+    def __init__(self, font) -> None:
+        self.font = font
+        ascent, descent = font.getmetrics()
+        self.line_height = ascent + descent
+        self.advances: dict = {}
+
+    def advance(self, ch: str) -> float:
+        width = self.advances.get(ch)
+        if width is None:
+            width = self.font.getlength(ch)
+            self.advances[ch] = width
+        return width
+
+    def width(self, text: str) -> float:
+        return sum(self.advance(ch) for ch in text)
+
+
+class TextLayout:
+    """海报文字排版
+
+    按字形实际宽度断行（中英文混排不会溢出），英文单词尽量不拆开；
+    文字放不下时逐步缩小字号，直到所有行都能放进给定区域。
+    同一字体的各字号度量会被缓存，多个模板共用一个实例即可。
+    """
+
+    def __init__(
+        self,
+        font_path: str,
+        max_size: int = 65,
+        min_size: int = 24,
+        line_spacing: float = 1.15,
+        stroke_width: int = 3,
+    ) -> None:
+        self.font_path = font_path
+        self.max_size = max_size
+        self.min_size = min_size
+        self.line_spacing = line_spacing
+        self.stroke_width = stroke_width
+        self._metrics: dict = {}
+        self._lock = threading.Lock()
+
+    def metrics(self, size: int) -> GlyphMetrics:
+        metrics = self._metrics.get(size)
+        if metrics is None:
+            with self._lock:
+                metrics = self._metrics.get(size)
+                if metrics is None:
+                    metrics = GlyphMetrics(PILImageFont.truetype(self.font_path, size))
+                    self._metrics[size] = metrics
+        return metrics
+
+    def break_lines(self, text: str, metrics: GlyphMetrics, max_width: float) -> list:
+        """线性时间断行，返回 (行文字, 行宽) 列表"""
+        max_width -= self.stroke_width * 2
+        lines = []
+        for paragraph in text.split("\n"):
+            line = []
+            width = 0.0
+            # 行内最后一个空格之后的位置及该处的宽度，用于在单词边界断行
+            space_at = -1
+            width_at_space = 0.0
+            for ch in paragraph:
+                advance = metrics.advance(ch)
+                if line and width + advance > max_width:
+                    if ch == " ":
+                        lines.append(("".join(line), width))
+                        line, width, space_at = [], 0.0, -1
+                        continue
+                    prefix = "".join(line[: space_at - 1]) if space_at > 0 else ""
+                    if prefix.strip() and ch.isascii() and line[-1].isascii():
+                        # 把被截断的英文单词整体移到下一行
+                        lines.append((prefix, width_at_space - metrics.advance(" ")))
+                        line = line[space_at:]
+                        width -= width_at_space
+                    else:
+                        lines.append(("".join(line), width))
+                        line, width = [], 0.0
+                    space_at = -1
+                    if line and width + advance > max_width:
+                        # 单词本身比一行还长，在当前字符处硬断开
+                        lines.append(("".join(line), width))
+                        line, width = [], 0.0
+                line.append(ch)
+                width += advance
+                if ch == " ":
+                    space_at = len(line)
+                    width_at_space = width
+            lines.append(("".join(line), width))
+        return lines
+
+    def block_height(self, metrics: GlyphMetrics, line_count: int) -> float:
+        return metrics.line_height * (1 + (line_count - 1) * self.line_spacing)
+
+    def fit(self, text: str, box_width: float, box_height: float):
+        """二分查找能放进区域的最大字号，返回 (字号, 行列表)"""
+        low, high = self.min_size, self.max_size
+        best = None
+        while low <= high:
+            size = (low + high) // 2
+            metrics = self.metrics(size)
+            lines = self.break_lines(text, metrics, box_width)
+            if self.block_height(metrics, len(lines)) <= box_height:
+                best = (size, lines)
+                low = size + 1
+            else:
+                high = size - 1
+        if best is None:
+            # 最小字号也放不下时仍按最小字号排版，超出部分被裁掉
+            metrics = self.metrics(self.min_size)
+            best = (self.min_size, self.break_lines(text, metrics, box_width))
+        return best
+
+    def draw(self, draw, box: tuple, text: str, fill, stroke_fill):
+        """在 box=(x, y, 宽, 高) 内居中绘制文字"""
+        x0, y0, box_width, box_height = box
+        size, lines = self.fit(text, box_width, box_height)
+        metrics = self.metrics(size)
+        step = metrics.line_height * self.line_spacing
+        y = y0 + (box_height - self.block_height(metrics, len(lines))) / 2
+        for line, width in lines:
+            draw.text(
+                (x0 + (box_width - width) / 2, y),
+                line,
+                font=metrics.font,
+                fill=fill,
+                stroke_width=self.stroke_width,
+                stroke_fill=stroke_fill,
+            )
+            y += step
+        return size
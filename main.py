@@ -5,22 +5,46 @@ import json
 import datetime
 import time
 import aiohttp
-import urllib.parse
 import logging
-from PIL import Image as PILImage
-from PIL import ImageDraw as PILImageDraw
-from PIL import ImageFont as PILImageFont
 from astrbot.api.all import AstrMessageEvent, CommandResult, Context, Image, Video, Plain, MessageChain
 import astrbot.api.event.filter as filter
 from astrbot.api.star import register, Star
 
+from .http_client import PluginHttpClient
+from .endpoints import UpstreamError, build_default_registry, has_data
+from .mirrors import MirrorSet
+from .image_pool import ImagePoolManager, ImageSourceError
+from .media_store import MediaStore, MediaError, MediaTypeError
+from .poster import PosterRenderer
+from .encoder import ImageEncoder
+from .storage import PluginStore
+from .expiring import ExpiringMap, TimerWheel
+from .search_cache import AnimeSearchCache, RecognitionCache
+from .mc_ping import MinecraftPinger, MinecraftPingError, parse_address
+from .mc_card import McCardRenderer
+
 logger = logging.getLogger("astrbot")
 
+# trace.moe 返回的预览图链接有效期较短，缓存超过这个时间后不再发送预览图
+TRACE_MOE_PREVIEW_TTL = 300
+
+# MC 服务器状态缓存时间、单次批量查询和每个群关注列表的服务器数量上限
+MC_STATUS_TTL = 30
+MC_BATCH_LIMIT = 50
+MC_WATCHLIST_LIMIT = 50
+
+# 不带日期的车票查询先返回有效结果时，最多再等带日期的查询这么多秒
+TICKET_DATED_GRACE = 1.0
+
+# 搜番群消息监听每处理这么多条消息计时一次，统计开销本身不影响每条消息
+LISTENER_SAMPLE_EVERY = 64
+
 
 @register("D-G-N-C-J", "Tinyxi", "", "", "")
 class Main(Star):
-    def __init__(self, context: Context) -> None:
+    def __init__(self, context: Context, config: dict = None) -> None:
         super().__init__(context)
+        self.config = config or {}
         self.PLUGIN_NAME = "astrbot_plugin_essential"
         PLUGIN_NAME = self.PLUGIN_NAME
         path = os.path.abspath(os.path.dirname(__file__))
@@ -31,12 +55,14 @@ class Main(Star):
             open(path + "/resources/food.json", "r", encoding="utf-8").read()
         )["data"]
 
-        if not os.path.exists(f"data/{PLUGIN_NAME}_data.json"):
-            with open(f"data/{PLUGIN_NAME}_data.json", "w", encoding="utf-8") as f:
-                f.write(json.dumps({}, ensure_ascii=False, indent=2))
-        with open(f"data/{PLUGIN_NAME}_data.json", "r", encoding="utf-8") as f:
-            self.data = json.loads(f.read())
-        self.good_morning_data = self.data.get("good_morning", {})
+        # 早晚安等持久化数据保存在 SQLite 中，首次启动时自动导入旧版 JSON 数据
+        self.store = PluginStore(
+            f"data/{PLUGIN_NAME}/data.db", legacy_json_path=f"data/{PLUGIN_NAME}_data.json"
+        )
+        # 按图片 dHash 缓存 trace.moe 的搜番结果
+        self.anime_search_cache = AnimeSearchCache(self.store)
+        # 按图片内容哈希缓存 AI 识图结果
+        self.recognition_cache = RecognitionCache(self.store)
 
         # moe
         self.moe_urls = [
@@ -45,136 +71,201 @@ class Main(Star):
             "https://www.loliapi.com/acg/",
             "https://www.loliapi.com/acg/pc/",
         ]
+        # 按 EWMA 延迟与成功率排序的对冲镜像
+        self.moe_mirrors = MirrorSet(self.moe_urls)
+
+        # 用户的临时状态，由同一个时间轮统一清理过期的键
+        self.timer_wheel = TimerWheel()
+        # 等待发送搜番图片的用户 -> 会话，30 秒未发图则自动取消并提醒
+        self.search_anmime_demand_users = ExpiringMap(
+            self.timer_wheel, 30, on_expire=self.on_search_anime_timeout
+        )
+        # 早晚安 CD，硬编码 30 分钟
+        self.good_morning_cd = ExpiringMap(self.timer_wheel, 1800)
+        # 搜番群消息监听的开销统计
+        self.listener_stats = {"messages": 0, "sampled": 0, "sample_ns": 0}
+
+        # 所有指令共享的 HTTP 连接池
+        self.http = PluginHttpClient()
+        # 所有生成和下载的图片按内容哈希保存，并发请求互不覆盖；
+        # 图片流式写入磁盘，超过大小上限的响应会被中止
+        max_image_mb = self.config.get("max_image_size_mb", 20)
+        self.media = MediaStore(
+            f"data/{PLUGIN_NAME}/media", max_download_bytes=int(max_image_mb * 1024 * 1024)
+        )
 
-        self.search_anmime_demand_users = {}
-        self.daily_sleep_cache = {}
-        self.good_morning_cd = {} 
+        # 按指令配置的输出编码（格式、质量、最大边长），在独立线程池中执行
+        self.encoder = ImageEncoder(self.media, self.config.get("image_encoding", {}))
+
+        # 喜报 / 悲报渲染器，背景和字体常驻内存，在线程池中绘制
+        self.posters = PosterRenderer(path, f"data/{PLUGIN_NAME}/posters", encoder=self.encoder)
+
+        # 上游接口注册表，统一处理超时、重试、缓存和解析
+        self.api = build_default_registry(self.http, self.media)
+        # mcs 直接使用服务器列表协议查询，mcsrvstat 只作为备用
+        self.mc_pinger = MinecraftPinger()
+        # 服务器状态短时缓存，批量查询时限制同时进行的查询数
+        self.mc_status_cache = ExpiringMap(self.timer_wheel, MC_STATUS_TTL)
+        self.mc_status_inflight: dict = {}
+        self.mc_query_limit = asyncio.Semaphore(16)
+        # 按 templates/mcs.html 在本地绘制的状态卡片，与状态数据缓存同样的时间
+        self.mc_cards = McCardRenderer(self.mc_html_tmpl, os.path.join(path, "simhei.ttf"), encoder=self.encoder)
+        self.mc_card_cache = ExpiringMap(self.timer_wheel, MC_STATUS_TTL)
+
+        # 随机图片预取池，按来源和变体分别预先下载
+        self.image_pools = ImagePoolManager(
+            self.media, postprocess=lambda p: self.encoder.encode_file("random_image", p)
+        )
+        self.image_pools.register("moe", self.fetch_random_moe)
+        self.image_pools.register("genshin", self.fetch_genshin_image)
+        self.image_pools.register("blue_archive", self.fetch_blue_archive_image)
+        self.image_pools.register("random_game", self.fetch_random_game_image)
+        self.image_pools.register("arknights", self.fetch_arknights_image)
+
+    async def terminate(self):
+        """插件卸载时停止后台预取并关闭共享连接池"""
+        self.timer_wheel.close()
+        await self.image_pools.close()
+        await self.media.close()
+        self.posters.close()
+        self.mc_cards.close()
+        self.encoder.close()
+        await self.store.close()
+        await self.http.close()
 
     def time_convert(self, t):
         m, s = divmod(t, 60)
         return f"{int(m)}分{int(s)}秒"
     
-    def get_cached_sleep_count(self, umo_id: str, date_str: str) -> int:
-        """获取缓存的睡觉人数"""
-        if umo_id not in self.daily_sleep_cache:
-            self.daily_sleep_cache[umo_id] = {}
-        return self.daily_sleep_cache[umo_id].get(date_str, -1)
-
-    def update_sleep_cache(self, umo_id: str, date_str: str, count: int):
-        """更新睡觉人数缓存"""
-        if umo_id not in self.daily_sleep_cache:
-            self.daily_sleep_cache[umo_id] = {}
-        self.daily_sleep_cache[umo_id][date_str] = count
-
-    def invalidate_sleep_cache(self, umo_id: str, date_str: str):
-            """使缓存失效"""
-            if umo_id in self.daily_sleep_cache and date_str in self.daily_sleep_cache[umo_id]:
-                del self.daily_sleep_cache[umo_id][date_str]
-
-    def check_good_morning_cd(self, user_id: str, current_time: datetime.datetime) -> bool:
+    def check_good_morning_cd(self, user_id: str) -> bool:
         """检查用户是否在CD中，返回True表示在CD中"""
-        if user_id not in self.good_morning_cd:
-            return False
-        
-        last_time = self.good_morning_cd[user_id]
-        time_diff = (current_time - last_time).total_seconds()
-        return time_diff < 1800  # 硬编码30分钟
+        return user_id in self.good_morning_cd
 
-    def update_good_morning_cd(self, user_id: str, current_time: datetime.datetime):
+    def update_good_morning_cd(self, user_id: str):
         """更新用户的CD时间"""
-        self.good_morning_cd[user_id] = current_time
+        self.good_morning_cd.set(user_id)
+
+    async def on_search_anime_timeout(self, sender: str, umo: str):
+        """搜番请求超时未收到图片"""
+        try:
+            await self.context.send_message(
+                umo, MessageChain().message("🧐你没有发送图片，搜番请求已取消了喵")
+            )
+        except Exception as e:
+            logger.warning(f"发送搜番超时提醒失败: {e}")
+
+    @staticmethod
+    def find_image(message: AstrMessageEvent):
+        for i in message.message_obj.message:
+            if isinstance(i, Image):
+                return i
+        return None
 
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
     async def handle_search_anime(self, message: AstrMessageEvent):
         """检查是否有搜番请求"""
+        # 每条群消息都会经过这里，没人在等发图时只做一次长度判断就返回
+        stats = self.listener_stats
+        stats["messages"] += 1
+        sampled = stats["messages"] % LISTENER_SAMPLE_EVERY == 0
+        if sampled:
+            start = time.perf_counter_ns()
+        waiting = bool(self.search_anmime_demand_users) and (
+            message.get_sender_id() in self.search_anmime_demand_users
+        )
+        if sampled:
+            stats["sampled"] += 1
+            stats["sample_ns"] += time.perf_counter_ns() - start
+        if not waiting:
+            return
+
+        if message.message_str.strip().lstrip("/").startswith("搜番"):
+            # “搜番”指令本身由指令处理，带图时已在那里识别，避免重复回复
+            return
         sender = message.get_sender_id()
-        if sender in self.search_anmime_demand_users:
-            message_obj = message.message_obj
-            url = "https://api.trace.moe/search?anilistInfo&url="
-            image_obj = None
-            for i in message_obj.message:
-                if isinstance(i, Image):
-                    image_obj = i
-                    break
-            try:
-                try:
-                    # 需要经过url encode
-                    image_url = urllib.parse.quote(image_obj.url)
-                    url += image_url
-                except BaseException as _:
-                    if sender in self.search_anmime_demand_users:
-                        del self.search_anmime_demand_users[sender]
-                    return CommandResult().error(
-                        f"发现不受本插件支持的图片数据：{type(image_obj)}，插件无法解析。"
-                    )
+        image_obj = self.find_image(message)
+        if image_obj is None:
+            # 不带图片的消息（包括“搜番”指令本身）继续等待
+            return
+        self.search_anmime_demand_users.pop(sender)
+        return await self.search_anime_by_image(image_obj)
+
+    async def search_anime_by_image(self, image_obj):
+        """用 trace.moe 识别图片出自哪部番剧"""
+        try:
+            image_url = image_obj.url
+        except BaseException as _:
+            return CommandResult().error(
+                f"发现不受本插件支持的图片数据：{type(image_obj)}，插件无法解析。"
+            )
 
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as resp:
-                        if resp.status != 200:
-                            if sender in self.search_anmime_demand_users:
-                                del self.search_anmime_demand_users[sender]
-                            return CommandResult().error("请求失败")
-                        data = await resp.json()
-
-                if data["result"] and len(data["result"]) > 0:
-                    # 番剧时间转换为x分x秒
-                    data["result"][0]["from"] = self.time_convert(
-                        data["result"][0]["from"]
-                    )
-                    data["result"][0]["to"] = self.time_convert(data["result"][0]["to"])
-
-                    warn = ""
-                    if float(data["result"][0]["similarity"]) < 0.8:
-                        warn = "相似度过低，可能不是同一番剧。建议：相同尺寸大小的截图; 去除四周的黑边\n\n"
-                    if sender in self.search_anmime_demand_users:
-                        del self.search_anmime_demand_users[sender]
-                    return CommandResult(
-                        chain=[
-                            Plain(
-                                f"{warn}番名: {data['result'][0]['anilist']['title']['native']}\n相似度: {data['result'][0]['similarity']}\n剧集: 第{data['result'][0]['episode']}集\n时间: {data['result'][0]['from']} - {data['result'][0]['to']}\n精准空降截图:"
-                            ),
-                            Image.fromURL(data["result"][0]["image"]),
-                        ],
-                        use_t2i_=False,
-                    )
-                else:
-                    if sender in self.search_anmime_demand_users:
-                        del self.search_anmime_demand_users[sender]
-                    return CommandResult(True, False, [Plain("没有找到番剧")], "sf")
-            except Exception as e:
-                raise e
+        # 先下载图片计算 dHash，相似的截图直接使用缓存的结果；下载失败时按原来的方式查询
+        phash = None
+        try:
+            if not image_url:
+                raise ImageSourceError("图片没有链接")
+            path = image_url if os.path.isfile(image_url) else await self.download_image(image_url)
+            phash = await self.anime_search_cache.hash_file(path)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ImageSourceError, MediaError) as e:
+            logger.warning(f"下载搜番图片失败，跳过缓存: {e}")
+        if phash is not None:
+            hit, top, created_ts = await self.anime_search_cache.get(phash)
+            if hit:
+                # trace.moe 的预览图链接是临时的，过期后只发送文字结果
+                preview = time.time() - created_ts < TRACE_MOE_PREVIEW_TTL
+                return self.format_anime_result(top, preview)
+
+        try:
+            data = await self.api.call("trace_moe", url=image_url)
+        except (UpstreamError, aiohttp.ClientError, asyncio.TimeoutError):
+            return CommandResult().error("请求失败")
+
+        top = data["result"][0] if data.get("result") else None
+        # 接口返回错误时不缓存，“没有找到”的结果由缓存按较短的时间过期
+        if phash is not None and (top or not data.get("error")):
+            await self.anime_search_cache.put(phash, top)
+        return self.format_anime_result(top, True)
+
+    def format_anime_result(self, top, preview: bool) -> CommandResult:
+        if not top:
+            return CommandResult(True, False, [Plain("没有找到番剧")], "sf")
+        # 番剧时间转换为x分x秒
+        time_from = self.time_convert(top["from"])
+        time_to = self.time_convert(top["to"])
+
+        warn = ""
+        if float(top["similarity"]) < 0.8:
+            warn = "相似度过低，可能不是同一番剧。建议：相同尺寸大小的截图; 去除四周的黑边\n\n"
+        text = f"{warn}番名: {top['anilist']['title']['native']}\n相似度: {top['similarity']}\n剧集: 第{top['episode']}集\n时间: {time_from} - {time_to}"
+        if not preview:
+            return CommandResult(chain=[Plain(text)], use_t2i_=False)
+        return CommandResult(
+            chain=[
+                Plain(text + "\n精准空降截图:"),
+                Image.fromURL(top["image"]),
+            ],
+            use_t2i_=False,
+        )
+
+    def describe_listener(self) -> str:
+        stats = self.listener_stats
+        if stats["sampled"]:
+            avg_ns = stats["sample_ns"] / stats["sampled"]
+            timing = f"抽样 {stats['sampled']} 条平均判断耗时 {avg_ns / 1000:.2f}µs，"
+        else:
+            timing = ""
+        return (
+            f"已处理 {stats['messages']} 条群消息，{timing}"
+            f"当前等待发图 {len(self.search_anmime_demand_users)} 人"
+        )
 
     @filter.command("喜报")
     async def congrats(self, message: AstrMessageEvent):
         """喜报生成器"""
         msg = message.message_str.replace("喜报", "").strip()
-        for i in range(20, len(msg), 20):
-            msg = msg[:i] + "\n" + msg[i:]
-
-        path = os.path.abspath(os.path.dirname(__file__))
-        bg = path + "/congrats.jpg"
-        img = PILImage.open(bg)
-        draw = PILImageDraw.Draw(img)
-        font = PILImageFont.truetype(path + "/simhei.ttf", 65)
-
-        # Calculate the width and height of the text
-        text_width, text_height = draw.textbbox((0, 0), msg, font=font)[2:4]
-
-        # Calculate the starting position of the text to center it.
-        x = (img.size[0] - text_width) / 2
-        y = (img.size[1] - text_height) / 2
-
-        draw.text(
-            (x, y),
-            msg,
-            font=font,
-            fill=(255, 0, 0),
-            stroke_width=3,
-            stroke_fill=(255, 255, 0),
-        )
-
-        img.save("congrats_result.jpg")
-        return CommandResult().file_image("congrats_result.jpg")
+        data = await self.posters.render("congrats", msg)
+        result_path = await self.media.put(data, self.posters.ext)
+        return CommandResult().file_image(result_path)
 
     @filter.command("查询天气")
     async def weather_query(self, message: AstrMessageEvent):
@@ -187,15 +278,12 @@ class Main(Star):
         city = message_str
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"http://api.yuxli.cn/api/tianqi.php?msg={urllib.parse.quote(city)}&b=1") as resp:
-                    if resp.status == 200:
-                        result = await resp.text()
-                        # 解析API返回的天气信息
-                        weather_data = self.parse_weather_data(result)
-                        return CommandResult(chain=[Plain(weather_data)])
-                    else:
-                        return CommandResult().error(f"获取天气信息失败，错误码：{resp.status}")
+            result = await self.api.call("weather", msg=city)
+            # 解析API返回的天气信息
+            weather_data = self.parse_weather_data(result)
+            return CommandResult(chain=[Plain(weather_data)])
+        except UpstreamError as e:
+            return CommandResult().error(f"获取天气信息失败，错误码：{e.status}")
         except Exception as e:
             return CommandResult().error(f"查询天气信息时出现错误：{str(e)}")
     
@@ -237,16 +325,13 @@ class Main(Star):
     async def lunar_calendar_query(self, message: AstrMessageEvent):
         """农历查询功能"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get("http://api.yuxli.cn/api/nongli.php") as resp:
-                    if resp.status == 200:
-                        result = await resp.text()
-                        # 将结果按行分割，然后在一行信息后添加一个空行
-                        lines = result.strip().split('\n')
-                        formatted_result = '\n\n'.join(lines)
-                        return CommandResult(chain=[Plain(formatted_result)])
-                    else:
-                        return CommandResult().error(f"获取农历信息失败，错误码：{resp.status}")
+            result = await self.api.call("lunar")
+            # 将结果按行分割，然后在一行信息后添加一个空行
+            lines = result.strip().split('\n')
+            formatted_result = '\n\n'.join(lines)
+            return CommandResult(chain=[Plain(formatted_result)])
+        except UpstreamError as e:
+            return CommandResult().error(f"获取农历信息失败，错误码：{e.status}")
         except Exception as e:
             return CommandResult().error(f"查询农历信息时出现错误：{str(e)}")
 
@@ -254,90 +339,157 @@ class Main(Star):
     async def uncongrats(self, message: AstrMessageEvent):
         """悲报生成器"""
         msg = message.message_str.replace("悲报", "").strip()
-        for i in range(20, len(msg), 20):
-            msg = msg[:i] + "\n" + msg[i:]
-
-        path = os.path.abspath(os.path.dirname(__file__))
-        bg = path + "/uncongrats.jpg"
-        img = PILImage.open(bg)
-        draw = PILImageDraw.Draw(img)
-        font = PILImageFont.truetype(path + "/simhei.ttf", 65)
-
-        # Calculate the width and height of the text
-        text_width, text_height = draw.textbbox((0, 0), msg, font=font)[2:4]
-
-        # Calculate the starting position of the text to center it.
-        x = (img.size[0] - text_width) / 2
-        y = (img.size[1] - text_height) / 2
-
-        draw.text(
-            (x, y),
-            msg,
-            font=font,
-            fill=(0, 0, 0),
-            stroke_width=3,
-            stroke_fill=(255, 255, 255),
-        )
-
-        img.save("uncongrats_result.jpg")
-        return CommandResult().file_image("uncongrats_result.jpg")
+        data = await self.posters.render("uncongrats", msg)
+        result_path = await self.media.put(data, self.posters.ext)
+        return CommandResult().file_image(result_path)
+
+    async def fetch_moe_image(self, url: str) -> str:
+        """从单个镜像下载随机动漫图片，非 200 视为失败"""
+        timeout = aiohttp.ClientTimeout(total=15, connect=5)
+        async with self.http.session.get(url, timeout=timeout) as resp:
+            if resp.status != 200:
+                raise UpstreamError(url, resp.status)
+            return await self.media.put_stream(resp)
+
+    async def fetch_random_moe(self, variant: str = "") -> str:
+        """对冲请求各镜像，取最先成功返回的图片"""
+        _, path = await self.moe_mirrors.fetch(self.fetch_moe_image)
+        return path
+
+    async def fetch_genshin_image(self, variant: str = "") -> str:
+        return await self.api.call("genshin_image")
+
+    async def fetch_blue_archive_image(self, variant: str) -> str:
+        return await self.api.call("blue_archive_image", type=variant)
+
+    async def fetch_arknights_image(self, variant: str) -> str:
+        return await self.api.call("arknights_headhunt", pool=variant)
+
+    def passthrough_enabled(self, message: AstrMessageEvent, command: str) -> bool:
+        """该指令是否直接发送图片链接；平台无法拉取网络图片时自动改为下载"""
+        if not self.config.get("image_passthrough", {}).get(command, True):
+            return False
+        return message.get_platform_name() not in self.config.get("download_image_platforms", [])
+
+    async def download_image(self, url: str) -> str:
+        """下载网络图片到图片存储，返回本地路径"""
+        async with self.http.session.get(url) as img_resp:
+            if img_resp.status != 200:
+                raise ImageSourceError(f"下载图片失败：HTTP {img_resp.status}")
+            return await self.media.put_stream(img_resp)
+
+    async def remote_image(self, message: AstrMessageEvent, command: str, url: str) -> Image:
+        """按直链模式设置构造图片消息段"""
+        if self.passthrough_enabled(message, command):
+            return Image.fromURL(url)
+        return Image(await self.download_image(url))
+
+    async def fetch_random_game_url(self) -> str:
+        data = await self.api.call("random_game_image")
+        
+        # 检查API响应
+        if data.get("code") != 200:
+            msg = data.get("msg", "未知错误")
+            raise ImageSourceError(f"获取游戏图片失败：{msg}")
+        
+        # 获取图片URL
+        image_url = data.get("url")
+        if not image_url:
+            raise ImageSourceError("获取游戏图片失败：未获取到图片URL")
+        return image_url
+
+    async def fetch_random_game_image(self, variant: str = "") -> str:
+        """先获取随机游戏图片的地址，再下载图片"""
+        return await self.download_image(await self.fetch_random_game_url())
 
     @filter.command("随机动漫图片")
     async def get_moe(self, message: AstrMessageEvent):
         """随机动漫图片"""
-        shuffle = random.sample(self.moe_urls, len(self.moe_urls))
-        for url in shuffle:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as resp:
-                        if resp.status != 200:
-                            return CommandResult().error(f"获取图片失败: {resp.status}")
-                        data = await resp.read()
-                        break
-            except Exception as e:
-                logger.error(f"从 {url} 获取图片失败: {e}。正在尝试下一个API。")
-                continue
-        # 保存图片到本地
         try:
-            with open("moe.jpg", "wb") as f:
-                f.write(data)
-            return CommandResult().file_image("moe.jpg")
-
+            path = await self.image_pools.take("moe")
         except Exception as e:
-            return CommandResult().error(f"保存图片失败: {e}")
+            logger.error(f"所有随机动漫图片镜像均获取失败: {e}")
+            return CommandResult().error(f"获取图片失败: {e}")
+        return CommandResult().file_image(path)
 
     @filter.command("搜番")
     async def get_search_anime(self, message: AstrMessageEvent):
         """以图搜番"""
+        # “搜番”和图片在同一条消息里时直接识别
+        image_obj = self.find_image(message)
         sender = message.get_sender_id()
+        if image_obj is not None:
+            # 之前在等发图的用户直接带图发送了“搜番”，不再继续等待
+            self.search_anmime_demand_users.pop(sender)
+            yield await self.search_anime_by_image(image_obj)
+            return
         if sender in self.search_anmime_demand_users:
             yield message.plain_result("正在等你发图喵，请不要重复发送")
-        self.search_anmime_demand_users[sender] = False
+            return
+        # 超时提醒由时间轮在过期时发送，不再为每个请求挂起一个等待中的协程
+        self.search_anmime_demand_users.set(sender, message.unified_msg_origin)
         yield message.plain_result("请在 30 喵内发送一张图片让我识别喵")
-        await asyncio.sleep(30)
-        if sender in self.search_anmime_demand_users:
-            if self.search_anmime_demand_users[sender]:
-                del self.search_anmime_demand_users[sender]
-                return
-            del self.search_anmime_demand_users[sender]
-            yield message.plain_result("🧐你没有发送图片，搜番请求已取消了喵")
+
+    async def query_mc_server(self, address: str) -> dict:
+        """查询服务器状态，MC_STATUS_TTL 秒内重复查询同一地址直接使用缓存，同时查询同一地址只请求一次"""
+        key = address.lower()
+        data = self.mc_status_cache.get(key)
+        if data is not None:
+            return data
+        task = self.mc_status_inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._query_mc_server(key, address))
+            self.mc_status_inflight[key] = task
+            task.add_done_callback(lambda _: self.mc_status_inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _query_mc_server(self, key: str, address: str) -> dict:
+        async with self.mc_query_limit:
+            # 优先直接向服务器查询状态，连接失败时再使用 mcsrvstat.us
+            try:
+                data = await self.mc_pinger.status(address)
+            except MinecraftPingError as e:
+                logger.info(f"直连查询 {address} 失败，改用 mcsrvstat: {e}")
+                data = await self.api.call("mcsrvstat", ip=address)
+        self.mc_status_cache.set(key, data)
+        return data
 
     @filter.command("mcs")
     async def mcs(self, message: AstrMessageEvent):
         """查mc服务器"""
-        message_str = message.message_str
-        if message_str == "mcs":
-            return CommandResult().error("查 Minecraft 服务器。格式: /mcs [服务器地址]")
-        ip = message_str.replace("mcs", "").strip()
-        url = f"https://api.mcsrvstat.us/2/{ip}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                if resp.status != 200:
-                    return CommandResult().error("请求失败")
-                data = await resp.json()
-                logger.info(f"获取到 {ip} 的服务器信息。")
-
-        # result = await context.image_renderer.render_custom_template(self.mc_html_tmpl, data, return_url=True)
+        args = message.message_str.replace("mcs", "", 1).split()
+        umo_id = message.unified_msg_origin
+        if args and args[0] in ("添加", "删除"):
+            return await self.edit_mc_watchlist(umo_id, args[0], args[1:])
+
+        if args:
+            # 去重并保持顺序
+            addresses = list(dict.fromkeys(args))
+            if len(addresses) > MC_BATCH_LIMIT:
+                return CommandResult().error(f"一次最多查询 {MC_BATCH_LIMIT} 个服务器")
+        else:
+            addresses = await self.store.mc_watchlist(umo_id)
+            if not addresses:
+                return CommandResult().error(
+                    "查 Minecraft 服务器。格式: /mcs [服务器地址...]\n"
+                    "/mcs 添加 [服务器地址...] 或 /mcs 删除 [服务器地址...] 管理本群关注的服务器，"
+                    "之后直接发送 /mcs 即可查询全部"
+                )
+
+        if len(addresses) > 1:
+            return await self.mcs_batch(addresses)
+
+        ip = addresses[0]
+        try:
+            data = await self.query_mc_server(ip)
+        except ValueError as e:
+            return CommandResult().error(f"服务器地址无效：{e}")
+        except (UpstreamError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # 直连和 mcsrvstat 都失败（熔断的 CircuitOpenError 也是 ClientError）
+            logger.warning(f"查询 {ip} 失败: {e!r}")
+            return CommandResult().error("请求失败")
+        logger.info(f"获取到 {ip} 的服务器信息。")
+
         motd = "查询失败"
         if (
             "motd" in data
@@ -356,6 +508,12 @@ class Main(Star):
         if "error" in data:
             return CommandResult().error(f"查询失败: {data['error']}")
 
+        if self.config.get("mcs_status_card", True):
+            try:
+                return CommandResult().file_image(await self.render_mc_card(ip, data))
+            except Exception as e:
+                logger.warning(f"绘制服务器状态卡片失败，改为发送文字: {e}")
+
         name_list = []
 
         if "players" in data:
@@ -368,6 +526,9 @@ class Main(Star):
             version = str(data["version"])
 
         status = "🟢" if data["online"] else "🔴"
+        latency = data.get("debug", {}).get("latency")
+        if latency is not None:
+            status += f" {latency:.0f}ms"
 
         name_list_str = ""
         if name_list:
@@ -380,36 +541,80 @@ class Main(Star):
             f"状态: {status}\n"
             f"服务器IP: {ip}\n"
             f"版本: {version}\n"
-            f"MOTD: {motd}"
+            f"MOTD: {motd}\n"
             f"玩家人数: {players}\n"
             f"在线玩家: \n{name_list_str}"
         )
 
         return CommandResult().message(result_text).use_t2i(False)
 
+    async def render_mc_card(self, address: str, data: dict) -> str:
+        """绘制服务器状态卡片并返回图片路径，状态缓存未更新时直接复用上次的卡片"""
+        key = address.lower()
+        cached = self.mc_card_cache.get(key)
+        if cached is not None and cached[0] is data:
+            return cached[1]
+        card = await self.mc_cards.render(data, address)
+        path = await self.media.put(card, self.mc_cards.ext)
+        self.mc_card_cache.set(key, (data, path))
+        return path
+
+    async def mcs_batch(self, addresses: list) -> CommandResult:
+        """并发查询多个服务器，汇总为一条消息"""
+        results = await asyncio.gather(
+            *(self.query_mc_server(address) for address in addresses), return_exceptions=True
+        )
+        lines = []
+        online = 0
+        for address, data in zip(addresses, results):
+            if isinstance(data, ValueError):
+                lines.append(f"⚠️ {address}：地址无效")
+            elif isinstance(data, BaseException) or "error" in data:
+                lines.append(f"⚠️ {address}：查询失败")
+            elif not data.get("online"):
+                lines.append(f"🔴 {address}：离线")
+            else:
+                online += 1
+                line = f"🟢 {address}"
+                if "players" in data:
+                    line += f" | 玩家 {data['players']['online']}/{data['players']['max']}"
+                if "version" in data:
+                    line += f" | {data['version']}"
+                latency = data.get("debug", {}).get("latency")
+                if latency is not None:
+                    line += f" | {latency:.0f}ms"
+                lines.append(line)
+        header = f"【查询结果】共 {len(addresses)} 个服务器，{online} 个在线\n"
+        return CommandResult().message(header + "\n".join(lines)).use_t2i(False)
+
+    async def edit_mc_watchlist(self, umo_id: str, action: str, addresses: list) -> CommandResult:
+        """添加或删除本群关注的服务器"""
+        addresses = list(dict.fromkeys(addresses))
+        if not addresses:
+            return CommandResult().error(f"格式: /mcs {action} [服务器地址...]")
+        for address in addresses:
+            try:
+                parse_address(address)
+            except ValueError as e:
+                return CommandResult().error(f"服务器地址无效：{address}，{e}")
+        if action == "删除":
+            removed = await self.store.remove_mc_watch(umo_id, addresses)
+            return CommandResult().message(f"已取消关注 {removed} 个服务器")
+        added, count = await self.store.add_mc_watch(umo_id, addresses, int(time.time()), MC_WATCHLIST_LIMIT)
+        output = f"已关注 {len(added)} 个服务器，本群共关注 {count} 个"
+        if len(added) < len(addresses) and count >= MC_WATCHLIST_LIMIT:
+            output += f"（每个群最多关注 {MC_WATCHLIST_LIMIT} 个）"
+        return CommandResult().message(output)
+
     @filter.command("原神随机图片")
     async def genshin_random_image(self, message: AstrMessageEvent):
         """原神随机图片"""
         try:
-            # 设置User-Agent模拟浏览器访问
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get("http://api.xiaomei520.sbs/api/元神/?", headers=headers) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error(f"获取图片失败: {resp.status}")
-                    
-                    data = await resp.read()
-            
-            # 保存图片到本地
             try:
-                with open("genshin_image.jpg", "wb") as f:
-                    f.write(data)
-                return CommandResult().file_image("genshin_image.jpg")
-            except Exception as e:
-                return CommandResult().error(f"保存图片失败: {e}")
+                path = await self.image_pools.take("genshin")
+            except UpstreamError as e:
+                return CommandResult().error(f"获取图片失败: {e.status}")
+            return CommandResult().file_image(path)
                 
         except Exception as e:
             return CommandResult().error(f"请求失败: {e}")
@@ -436,28 +641,13 @@ class Main(Star):
         }
         
         api_param = param_mapping[message_str]
-        url = f"https://rba.kanostar.top/adapt?type={api_param}"
         
         try:
-            # 设置User-Agent模拟浏览器访问
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error(f"获取图片失败: {resp.status}")
-                    
-                    data = await resp.read()
-            
-            # 保存图片到本地
             try:
-                with open("blue_archive_image.jpg", "wb") as f:
-                    f.write(data)
-                return CommandResult().file_image("blue_archive_image.jpg")
-            except Exception as e:
-                return CommandResult().error(f"保存图片失败: {e}")
+                path = await self.image_pools.take("blue_archive", api_param)
+            except UpstreamError as e:
+                return CommandResult().error(f"获取图片失败: {e.status}")
+            return CommandResult().file_image(path)
                 
         except Exception as e:
             return CommandResult().error(f"请求失败: {e}")
@@ -465,12 +655,10 @@ class Main(Star):
     @filter.command("一言")
     async def hitokoto(self, message: AstrMessageEvent):
         """来一条一言"""
-        url = "https://v1.hitokoto.cn"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                if resp.status != 200:
-                    return CommandResult().error("请求失败")
-                data = await resp.json()
+        try:
+            data = await self.api.call("hitokoto")
+        except (UpstreamError, aiohttp.ClientError, asyncio.TimeoutError):
+            return CommandResult().error("请求失败")
         return CommandResult().message(data["hitokoto"] + " —— " + data["from"])
 
     async def save_what_eat_data(self):
@@ -514,13 +702,10 @@ class Main(Star):
     @filter.command("喜加一")
     async def epic_free_game(self, message: AstrMessageEvent):
         """EPIC 喜加一"""
-        url = "https://store-site-backend-static-ipv4.ak.epicgames.com/freeGamesPromotions"
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                if resp.status != 200:
-                    return CommandResult().error("请求失败")
-                data = await resp.json()
+        try:
+            data = await self.api.call("epic_free_games")
+        except (UpstreamError, aiohttp.ClientError, asyncio.TimeoutError):
+            return CommandResult().error("请求失败")
 
         games = []
         upcoming = []
@@ -610,37 +795,26 @@ class Main(Star):
         if len(title) > 9:
             return CommandResult().error("奖项名不能超过9位字符")
         
-        # 构建请求URL
-        base_url = "https://api.pearktrue.cn/api/certcommend/"
-        params = f"name={name}&title={title}&classname={classname}"
-        url = f"{base_url}?{params}"
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error("请求奖状生成API失败")
-                    
-                    # 检查响应内容类型
-                    content_type = resp.headers.get('Content-Type', '')
-                    if 'image' in content_type:
-                        # 如果直接返回图片数据
-                        image_data = await resp.read()
-                        # 保存图片到临时文件
-                        temp_path = "certificate_result.jpg"
-                        with open(temp_path, "wb") as f:
-                            f.write(image_data)
-                        return CommandResult().file_image(temp_path)
-                    else:
-                        # 如果返回JSON，检查错误信息
-                        try:
-                            data = await resp.json()
-                            if data.get("code") != 200:
-                                return CommandResult().error(f"生成奖状失败：{data.get('msg', '未知错误')}")
-                        except:
-                            pass
-                        return CommandResult().error("奖状生成API返回格式异常")
-                        
+            try:
+                # 直接返回图片时流式写入图片存储
+                temp_path = await self.api.call(
+                    "certificate", name=name, title=title, classname=classname
+                )
+                temp_path = await self.encoder.encode_file("certificate", temp_path)
+                return CommandResult().file_image(temp_path)
+            except UpstreamError:
+                return CommandResult().error("请求奖状生成API失败")
+            except MediaTypeError as e:
+                # 如果返回JSON，检查错误信息
+                try:
+                    data = json.loads(e.preview)
+                    if data.get("code") != 200:
+                        return CommandResult().error(f"生成奖状失败：{data.get('msg', '未知错误')}")
+                except:
+                    pass
+                return CommandResult().error("奖状生成API返回格式异常")
+                
         except Exception as e:
             logger.error(f"生成奖状时发生错误：{e}")
             return CommandResult().error(f"生成奖状时发生错误：{str(e)}")
@@ -663,104 +837,102 @@ class Main(Star):
         to_city = parts[1]
         time_param = parts[2] if len(parts) > 2 else ""
         
-        api_url = "https://api.pearktrue.cn/api/highspeedticket"
-        params = f"from={urllib.parse.quote(from_city)}&to={urllib.parse.quote(to_city)}"
-        if time_param:
-            params += f"&time={urllib.parse.quote(time_param)}"
-        url = f"{api_url}?{params}"
-        
         try:
-            logger.info(f"正在查询车票信息，URL：{url}")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    logger.info(f"API响应状态码：{resp.status}")
-                    if resp.status != 200:
-                        return CommandResult().error(f"查询车票信息失败，服务器状态码：{resp.status}")
-                    
-                    data = await resp.json()
-                    logger.info(f"API返回数据：{data}")
-                    
-                    if data.get("code") == 200 and "data" in data and len(data["data"]) > 0:
-                        # 取第一个结果
-                        result = data["data"][0]
-                        ticket_info = result.get("ticket_info", [{}])[0] if result.get("ticket_info") else {}
-                        
-                        # 构建输出结果
-                        output = f"状态信息：{data.get('msg', '')}\n"
-                        output += f"出发地：{data.get('from', '')}\n"
-                        output += f"终点地：{data.get('to', '')}\n"
-                        output += f"查询时间：{data.get('time', '')}\n"
-                        output += f"获取数量：{data.get('count', '')}\n"
-                        output += f"返回内容：{data.get('data', '')}\n"
-                        output += f"车辆类型：{result.get('traintype', '')}\n"
-                        output += f"车辆代码：{result.get('trainumber', '')}\n"
-                        output += f"出发点：{result.get('departstation', '')}\n"
-                        output += f"终点站：{result.get('arrivestation', '')}\n"
-                        output += f"出发时间：{result.get('departtime', '')}\n"
-                        output += f"到达时间：{result.get('arrivetime', '')}\n"
-                        output += f"过程时间：{result.get('runtime', '')}\n"
-                        output += f"车辆车票信息：{result.get('ticket_info', '')}\n"
-                        output += f"座次等级：{ticket_info.get('seatname', '')}\n"
-                        output += f"车票状态：{ticket_info.get('bookable', '')}\n"
-                        output += f"车票价格：{ticket_info.get('seatprice', '')}\n"
-                        output += f"剩余车票数量：{ticket_info.get('seatinventory', '')}"
-                        
-                        return CommandResult().message(output)
-                    else:
-                        # 如果带日期参数查询失败，尝试不带日期的查询
-                        if time_param:
-                            logger.info("带日期参数查询失败，尝试不带日期的查询")
-                            fallback_url = f"{api_url}?from={urllib.parse.quote(from_city)}&to={urllib.parse.quote(to_city)}"
-                            logger.info(f"重试URL：{fallback_url}")
-                            
-                            async with session.get(fallback_url) as fallback_resp:
-                                if fallback_resp.status != 200:
-                                    error_msg = data.get('msg', '未知错误')
-                                    logger.error(f"API返回错误：code={data.get('code')}, msg={error_msg}")
-                                    return CommandResult().error(f"未找到车票信息：{error_msg}")
-                                
-                                fallback_data = await fallback_resp.json()
-                                logger.info(f"重试API返回数据：{fallback_data}")
-                                
-                                if fallback_data.get("code") == 200 and "data" in fallback_data and len(fallback_data["data"]) > 0:
-                                    # 取第一个结果
-                                    result = fallback_data["data"][0]
-                                    ticket_info = result.get("ticket_info", [{}])[0] if result.get("ticket_info") else {}
-                                    
-                                    # 构建输出结果
-                                    output = f"状态信息：{fallback_data.get('msg', '')}\n"
-                                    output += f"出发地：{fallback_data.get('from', '')}\n"
-                                    output += f"终点地：{fallback_data.get('to', '')}\n"
-                                    output += f"查询时间：{fallback_data.get('time', '')}\n"
-                                    output += f"获取数量：{fallback_data.get('count', '')}\n"
-                                    output += f"返回内容：{fallback_data.get('data', '')}\n"
-                                    output += f"车辆类型：{result.get('traintype', '')}\n"
-                                    output += f"车辆代码：{result.get('trainumber', '')}\n"
-                                    output += f"出发点：{result.get('departstation', '')}\n"
-                                    output += f"终点站：{result.get('arrivestation', '')}\n"
-                                    output += f"出发时间：{result.get('departtime', '')}\n"
-                                    output += f"到达时间：{result.get('arrivetime', '')}\n"
-                                    output += f"过程时间：{result.get('runtime', '')}\n"
-                                    output += f"车辆车票信息：{result.get('ticket_info', '')}\n"
-                                    output += f"座次等级：{ticket_info.get('seatname', '')}\n"
-                                    output += f"车票状态：{ticket_info.get('bookable', '')}\n"
-                                    output += f"车票价格：{ticket_info.get('seatprice', '')}\n"
-                                    output += f"剩余车票数量：{ticket_info.get('seatinventory', '')}"
-                                    
-                                    return CommandResult().message(output)
-                                else:
-                                    error_msg = fallback_data.get('msg', '未知错误')
-                                    logger.error(f"重试API返回错误：code={fallback_data.get('code')}, msg={error_msg}")
-                                    return CommandResult().error(f"未找到车票信息：{error_msg}")
-                        else:
-                            error_msg = data.get('msg', '未知错误')
-                            logger.error(f"API返回错误：code={data.get('code')}, msg={error_msg}")
-                            return CommandResult().error(f"未找到车票信息：{error_msg}")
-                        
+            logger.info(f"正在查询车票信息：{from_city} -> {to_city} {time_param}")
+            route = {"from": from_city, "to": to_city}
+            lookups = {
+                asyncio.ensure_future(self.api.call("highspeed_ticket", **route, time=time_param or None)): "dated",
+            }
+            if time_param:
+                # 带日期时同时发出不带日期的查询，带日期的查询没有结果时不用再等一次请求
+                lookups[asyncio.ensure_future(self.api.call("highspeed_ticket", **route))] = "undated"
+            results = await self.wait_ticket_lookups(lookups)
+
+            # 带日期的有效结果优先，其次是不带日期的有效结果
+            data = next(
+                (results[kind] for kind in ("dated", "undated") if self.ticket_result(results.get(kind)) is not None),
+                None,
+            )
+            if data is None:
+                answered = next((r for r in results.values() if isinstance(r, dict)), None)
+                if answered is None:
+                    error = results.get("dated")
+                    if isinstance(error, UpstreamError):
+                        return CommandResult().error(f"查询车票信息失败，服务器状态码：{error.status}")
+                    return CommandResult().error("无法连接到车票查询服务器，请稍后重试")
+                error_msg = answered.get('msg', '未知错误')
+                logger.error(f"API返回错误：code={answered.get('code')}, msg={error_msg}")
+                return CommandResult().error(f"未找到车票信息：{error_msg}")
+
+            logger.info(f"API返回数据：{data}")
+            return CommandResult().message(self.format_ticket(data, self.ticket_result(data)))
+
         except Exception as e:
             logger.error(f"查询车票信息时发生错误：{e}")
             return CommandResult().error(f"查询车票信息时发生错误：{str(e)}")
 
+    async def wait_ticket_lookups(self, lookups: dict) -> dict:
+        """等待车票查询，返回 类型 -> 响应字典或异常
+
+        任一查询失败（包括网络错误）都不影响另一个；带日期的有效结果到达后立即返回，
+        只有不带日期的结果有效时再给带日期的查询 TICKET_DATED_GRACE 秒，之后取消剩下的等待。
+        上游请求本身由接口注册表合并，取消等待不会中断请求，返回的有效结果仍会写入缓存。
+        """
+        results = {}
+        pending = set(lookups)
+        timeout = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    try:
+                        results[lookups[task]] = task.result()
+                    except (UpstreamError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        logger.warning(f"车票查询（{lookups[task]}）失败：{e!r}")
+                        results[lookups[task]] = e
+                if self.ticket_result(results.get("dated")) is not None:
+                    break
+                if self.ticket_result(results.get("undated")) is not None:
+                    timeout = TICKET_DATED_GRACE
+        finally:
+            for task in pending:
+                task.cancel()
+        return results
+
+    @staticmethod
+    def ticket_result(data):
+        """接口返回了车次时取第一个结果，否则返回 None"""
+        if has_data(data):
+            return data["data"][0]
+        return None
+
+    @staticmethod
+    def format_ticket(data: dict, result: dict) -> str:
+        ticket_info = result.get("ticket_info", [{}])[0] if result.get("ticket_info") else {}
+
+        # 构建输出结果
+        output = f"状态信息：{data.get('msg', '')}\n"
+        output += f"出发地：{data.get('from', '')}\n"
+        output += f"终点地：{data.get('to', '')}\n"
+        output += f"查询时间：{data.get('time', '')}\n"
+        output += f"获取数量：{data.get('count', '')}\n"
+        output += f"返回内容：{data.get('data', '')}\n"
+        output += f"车辆类型：{result.get('traintype', '')}\n"
+        output += f"车辆代码：{result.get('trainumber', '')}\n"
+        output += f"出发点：{result.get('departstation', '')}\n"
+        output += f"终点站：{result.get('arrivestation', '')}\n"
+        output += f"出发时间：{result.get('departtime', '')}\n"
+        output += f"到达时间：{result.get('arrivetime', '')}\n"
+        output += f"过程时间：{result.get('runtime', '')}\n"
+        output += f"车辆车票信息：{result.get('ticket_info', '')}\n"
+        output += f"座次等级：{ticket_info.get('seatname', '')}\n"
+        output += f"车票状态：{ticket_info.get('bookable', '')}\n"
+        output += f"车票价格：{ticket_info.get('seatprice', '')}\n"
+        output += f"剩余车票数量：{ticket_info.get('seatinventory', '')}"
+        return output
+
     @filter.command("全国高校查询")
     async def college_query(self, message: AstrMessageEvent):
         """全国高校查询器"""
@@ -771,37 +943,32 @@ class Main(Star):
             return CommandResult().error("示例：全国高校查询 医科")
         
         keyword = msg
-        api_url = "https://api.pearktrue.cn/api/college/"
-        params = f"keyword={urllib.parse.quote(keyword)}"
-        url = f"{api_url}?{params}"
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error("查询高校信息失败")
-                    
-                    data = await resp.json()
-                    
-                    if data.get("code") == 200 and "data" in data and len(data["data"]) > 0:
-                        # 构建输出结果
-                        output = f"状态信息：{data.get('msg', '')}\n"
-                        output += f"获取数量：{data.get('count', '')}\n"
-                        output += f"返回内容：\n\n"
-                        
-                        # 遍历所有结果
-                        for i, result in enumerate(data["data"], 1):
-                            output += f"=== 学校 {i} ===\n"
-                            output += f"名称：{result.get('name', '')}\n"
-                            output += f"部门：{result.get('department', '')}\n"
-                            output += f"城市：{result.get('city', '')}\n"
-                            output += f"教育等级：{result.get('level', '')}\n"
-                            output += f"办学性质：{result.get('remark', '')}\n\n"
-                        
-                        return CommandResult().message(output)
-                    else:
-                        return CommandResult().error(f"未找到高校信息：{data.get('msg', '未知错误')}")
-                        
+            try:
+                data = await self.api.call("college", keyword=keyword)
+            except UpstreamError:
+                return CommandResult().error("查询高校信息失败")
+            
+            if data.get("code") == 200 and "data" in data and len(data["data"]) > 0:
+                # 构建输出结果
+                output = f"状态信息：{data.get('msg', '')}\n"
+                output += f"获取数量：{data.get('count', '')}\n"
+                output += f"返回内容：\n\n"
+                
+                # 遍历所有结果
+                for i, result in enumerate(data["data"], 1):
+                    output += f"=== 学校 {i} ===\n"
+                    output += f"名称：{result.get('name', '')}\n"
+                    output += f"部门：{result.get('department', '')}\n"
+                    output += f"城市：{result.get('city', '')}\n"
+                    output += f"教育等级：{result.get('level', '')}\n"
+                    output += f"办学性质：{result.get('remark', '')}\n\n"
+                
+                return CommandResult().message(output)
+            else:
+                return CommandResult().error(f"未找到高校信息：{data.get('msg', '未知错误')}")
+                
         except Exception as e:
             logger.error(f"查询高校信息时发生错误：{e}")
             return CommandResult().error(f"查询高校信息时发生错误：{str(e)}")
@@ -816,42 +983,37 @@ class Main(Star):
             return CommandResult().error("示例：商标信息查询 光头强")
         
         keyword = msg
-        api_url = "https://api.pearktrue.cn/api/trademark/"
-        params = f"keyword={urllib.parse.quote(keyword)}"
-        url = f"{api_url}?{params}"
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error("查询商标信息失败")
-                    
-                    data = await resp.json()
-                    
-                    if data.get("code") == 200 and "data" in data and len(data["data"]) > 0:
-                        # 构建输出结果
-                        output = f"状态信息：{data.get('msg', '')}\n"
-                        output += f"搜索商标：{data.get('keyword', '')}\n"
-                        output += f"返回数量：{data.get('count', '')}\n\n"
-                        
-                        # 遍历所有结果
-                        for i, result in enumerate(data["data"], 1):
-                            output += f"=== 商标 {i} ===\n"
-                            output += f"注册号：{result.get('regNo', '')}\n"
-                            output += f"办理机构：{result.get('agent', '')}\n"
-                            output += f"注册公告日期：{result.get('regDate', '')}\n"
-                            output += f"申请日期：{result.get('appDate', '')}\n"
-                            output += f"商标状态：{result.get('statusStr', '')}\n"
-                            output += f"国际分类值：{result.get('intCls', '')}\n"
-                            output += f"国际分类名：{result.get('clsStr', '')}\n"
-                            output += f"申请人名称：{result.get('applicantCn', '')}\n"
-                            output += f"商标名称：{result.get('tmName', '')}\n"
-                            output += f"商标图片：{result.get('tmImgOssPath', '')}\n\n"
-                        
-                        return CommandResult().message(output)
-                    else:
-                        return CommandResult().error(f"未找到商标信息：{data.get('msg', '未知错误')}")
-                        
+            try:
+                data = await self.api.call("trademark", keyword=keyword)
+            except UpstreamError:
+                return CommandResult().error("查询商标信息失败")
+            
+            if data.get("code") == 200 and "data" in data and len(data["data"]) > 0:
+                # 构建输出结果
+                output = f"状态信息：{data.get('msg', '')}\n"
+                output += f"搜索商标：{data.get('keyword', '')}\n"
+                output += f"返回数量：{data.get('count', '')}\n\n"
+                
+                # 遍历所有结果
+                for i, result in enumerate(data["data"], 1):
+                    output += f"=== 商标 {i} ===\n"
+                    output += f"注册号：{result.get('regNo', '')}\n"
+                    output += f"办理机构：{result.get('agent', '')}\n"
+                    output += f"注册公告日期：{result.get('regDate', '')}\n"
+                    output += f"申请日期：{result.get('appDate', '')}\n"
+                    output += f"商标状态：{result.get('statusStr', '')}\n"
+                    output += f"国际分类值：{result.get('intCls', '')}\n"
+                    output += f"国际分类名：{result.get('clsStr', '')}\n"
+                    output += f"申请人名称：{result.get('applicantCn', '')}\n"
+                    output += f"商标名称：{result.get('tmName', '')}\n"
+                    output += f"商标图片：{result.get('tmImgOssPath', '')}\n\n"
+                
+                return CommandResult().message(output)
+            else:
+                return CommandResult().error(f"未找到商标信息：{data.get('msg', '未知错误')}")
+                
         except Exception as e:
             logger.error(f"查询商标信息时发生错误：{e}")
             return CommandResult().error(f"查询商标信息时发生错误：{str(e)}")
@@ -886,8 +1048,6 @@ class Main(Star):
             'pwx': 'iwx'  # 苹果微信
         }
         
-        # 新API配置
-        api_url = 'https://api.wzryqz.cn/gethero'
         
         # 构建请求参数
         params = {
@@ -896,57 +1056,53 @@ class Main(Star):
         }
         
         try:
-            # 设置超时和重试机制
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
+            try:
                 try:
-                    async with session.get(api_url, params=params) as resp:
-                        if resp.status != 200:
-                            return CommandResult().error("查询王者战力失败，服务器返回错误状态码")
-                        
-                        data = await resp.json()
-                        
-                        if data.get("code") == 200 and "data" in data:
-                            hero_data = data["data"]
-                            
-                            # 构建输出结果
-                            output = f"英雄名称：{hero_data.get('name', '')}\n"
-                            output += f"英雄ID：{hero_data.get('heroId', '')}\n"
-                            output += f"英雄类型：{hero_data.get('hero_type', '')}\n"
-                            output += f"游戏平台：{platform}\n"
-                            output += f"前十最低战力：{hero_data.get('Top10', '')}\n"
-                            output += f"前100最低战力：{hero_data.get('Top100', '')}\n"
-                            
-                            # 显示省标信息（前3个）
-                            if 'province' in hero_data and hero_data['province']:
-                                output += "\n省标战力信息：\n"
-                                for i, province in enumerate(hero_data['province'][:3]):
-                                    output += f"  {i+1}. {province.get('loc', '')}: {province.get('val', '')}\n"
-                            
-                            # 显示市标信息（前3个）
-                            if 'city' in hero_data and hero_data['city']:
-                                output += "\n市标战力信息：\n"
-                                for i, city in enumerate(hero_data['city'][:3]):
-                                    output += f"  {i+1}. {city.get('loc', '')}: {city.get('val', '')}\n"
-                            
-                            # 显示区标信息（前3个）
-                            if 'county' in hero_data and hero_data['county']:
-                                output += "\n区标战力信息：\n"
-                                for i, county in enumerate(hero_data['county'][:3]):
-                                    output += f"  {i+1}. {county.get('loc', '')}: {county.get('val', '')}\n"
-                            
-                            output += f"\n更新时间：{hero_data.get('updatetime', '')}\n"
-                            
-                            return CommandResult().message(output)
-                        else:
-                            return CommandResult().error(f"未找到英雄战力信息：{data.get('msg', '未知错误')}")
-                except aiohttp.ClientError as e:
-                    logger.error(f"网络连接错误：{e}")
-                    return CommandResult().error("无法连接到王者战力查询服务器，请稍后重试或检查网络连接")
-                except asyncio.TimeoutError:
-                    logger.error("请求超时")
-                    return CommandResult().error("查询超时，请稍后重试")
-                        
+                    data = await self.api.call("king_glory", **params)
+                except UpstreamError:
+                    return CommandResult().error("查询王者战力失败，服务器返回错误状态码")
+                
+                if data.get("code") == 200 and "data" in data:
+                    hero_data = data["data"]
+                    
+                    # 构建输出结果
+                    output = f"英雄名称：{hero_data.get('name', '')}\n"
+                    output += f"英雄ID：{hero_data.get('heroId', '')}\n"
+                    output += f"英雄类型：{hero_data.get('hero_type', '')}\n"
+                    output += f"游戏平台：{platform}\n"
+                    output += f"前十最低战力：{hero_data.get('Top10', '')}\n"
+                    output += f"前100最低战力：{hero_data.get('Top100', '')}\n"
+                    
+                    # 显示省标信息（前3个）
+                    if 'province' in hero_data and hero_data['province']:
+                        output += "\n省标战力信息：\n"
+                        for i, province in enumerate(hero_data['province'][:3]):
+                            output += f"  {i+1}. {province.get('loc', '')}: {province.get('val', '')}\n"
+                    
+                    # 显示市标信息（前3个）
+                    if 'city' in hero_data and hero_data['city']:
+                        output += "\n市标战力信息：\n"
+                        for i, city in enumerate(hero_data['city'][:3]):
+                            output += f"  {i+1}. {city.get('loc', '')}: {city.get('val', '')}\n"
+                    
+                    # 显示区标信息（前3个）
+                    if 'county' in hero_data and hero_data['county']:
+                        output += "\n区标战力信息：\n"
+                        for i, county in enumerate(hero_data['county'][:3]):
+                            output += f"  {i+1}. {county.get('loc', '')}: {county.get('val', '')}\n"
+                    
+                    output += f"\n更新时间：{hero_data.get('updatetime', '')}\n"
+                    
+                    return CommandResult().message(output)
+                else:
+                    return CommandResult().error(f"未找到英雄战力信息：{data.get('msg', '未知错误')}")
+            except aiohttp.ClientError as e:
+                logger.error(f"网络连接错误：{e}")
+                return CommandResult().error("无法连接到王者战力查询服务器，请稍后重试或检查网络连接")
+            except asyncio.TimeoutError:
+                logger.error("请求超时")
+                return CommandResult().error("查询超时，请稍后重试")
+                    
         except Exception as e:
             logger.error(f"查询王者战力时发生错误：{e}")
             return CommandResult().error(f"查询王者战力时发生错误：{str(e)}")
@@ -954,30 +1110,24 @@ class Main(Star):
     @filter.command("脑筋急转弯")
     async def brain_teaser(self, message: AstrMessageEvent):
         """脑筋急转弯生成器"""
-        api_url = "https://api.pearktrue.cn/api/brainteasers/"
-        
         try:
-            # 设置超时
-            timeout = aiohttp.ClientTimeout(total=30, connect=10)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(api_url) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error("获取脑筋急转弯失败")
-                    
-                    data = await resp.json()
-                    
-                    if data.get("code") == 200 and "data" in data:
-                        question = data["data"].get("question", "")
-                        answer = data["data"].get("answer", "")
-                        
-                        if question and answer:
-                            result = f"脑筋急转弯来啦！！\n\n题目是：{question}\n\n答案：{answer}"
-                            return CommandResult().message(result)
-                        else:
-                            return CommandResult().error("获取到的脑筋急转弯数据不完整")
-                    else:
-                        return CommandResult().error(f"API返回错误：{data.get('msg', '未知错误')}")
-                        
+            try:
+                data = await self.api.call("brain_teaser")
+            except UpstreamError:
+                return CommandResult().error("获取脑筋急转弯失败")
+            
+            if data.get("code") == 200 and "data" in data:
+                question = data["data"].get("question", "")
+                answer = data["data"].get("answer", "")
+                
+                if question and answer:
+                    result = f"脑筋急转弯来啦！！\n\n题目是：{question}\n\n答案：{answer}"
+                    return CommandResult().message(result)
+                else:
+                    return CommandResult().error("获取到的脑筋急转弯数据不完整")
+            else:
+                return CommandResult().error(f"API返回错误：{data.get('msg', '未知错误')}")
+                
         except Exception as e:
             logger.error(f"获取脑筋急转弯时发生错误：{e}")
             return CommandResult().error(f"获取脑筋急转弯时发生错误：{str(e)}")
@@ -988,77 +1138,29 @@ class Main(Star):
         # CREDIT: 灵感部分借鉴自：https://github.com/MinatoAquaCrews/nonebot_plugin_morning
         umo_id = message.unified_msg_origin
         user_id = message.message_obj.sender.user_id
-        user_name = message.message_obj.sender.nickname
+        user_name = message.message_obj.sender.nickname or str(user_id)
         curr_utc8 = datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=8)))
         curr_human = curr_utc8.strftime("%Y-%m-%d %H:%M:%S")
 
         # 检查CD
-        if self.check_good_morning_cd(user_id, curr_utc8):
+        if self.check_good_morning_cd(user_id):
             return CommandResult().message("你刚刚已经说过早安/晚安了，请30分钟后再试喵~").use_t2i(False)
 
         is_night = "晚安" in message.message_str
 
-        if umo_id in self.good_morning_data:
-            umo = self.good_morning_data[umo_id]
-        else:
-            umo = {}
-        if user_id in umo:
-            user = umo[user_id]
-        else:
-            user = {
-                "daily": {
-                    "morning_time": "",
-                    "night_time": "",
-                }
-            }
-
-        if is_night:
-            user["daily"]["night_time"] = curr_human
-            user["daily"]["morning_time"] = ""  # 晚安后清空早安时间
-        else:
-            user["daily"]["morning_time"] = curr_human
-
-        umo[user_id] = user
-        self.good_morning_data[umo_id] = umo
+        # 根据日期判断今天是本群第几个睡觉的，计数随早晚安增量更新
+        record, curr_day_sleeping = await self.store.check_in(
+            umo_id, user_id, user_name, is_night, int(curr_utc8.timestamp())
+        )
 
-        with open(f"data/{self.PLUGIN_NAME}_data.json", "w", encoding="utf-8") as f:
-            f.write(json.dumps(self.good_morning_data, ensure_ascii=False, indent=2))
-            
         # 更新CD
-        self.update_good_morning_cd(user_id, curr_utc8)
-
-        # 根据 day 判断今天是本群第几个睡觉的
-        curr_day: int = curr_utc8.day
-        curr_date_str = curr_utc8.strftime("%Y-%m-%d")
-
-        self.invalidate_sleep_cache(umo_id, curr_date_str)
-        curr_day_sleeping = 0
-        for v in umo.values():
-            if v["daily"]["night_time"] and not v["daily"]["morning_time"]:
-                # he/she is sleeping
-                user_day = datetime.datetime.strptime(
-                    v["daily"]["night_time"], "%Y-%m-%d %H:%M:%S"
-                ).day
-                if user_day == curr_day:
-                    curr_day_sleeping += 1
-        
-        # 更新缓存为最新计算结果
-        self.update_sleep_cache(umo_id, curr_date_str, curr_day_sleeping)
+        self.update_good_morning_cd(user_id)
 
         if not is_night:
             # 计算睡眠时间: xx小时xx分
             sleep_duration_human = ""
-            if user["daily"]["night_time"]:
-                night_time = datetime.datetime.strptime(
-                    user["daily"]["night_time"], "%Y-%m-%d %H:%M:%S"
-                )
-                morning_time = datetime.datetime.strptime(
-                    user["daily"]["morning_time"], "%Y-%m-%d %H:%M:%S"
-                )
-                sleep_duration = (morning_time - night_time).total_seconds()
-                hrs = int(sleep_duration / 3600)
-                mins = int((sleep_duration % 3600) / 60)
-                sleep_duration_human = f"{hrs}小时{mins}分"
+            if record.night:
+                sleep_duration_human = self.format_duration(record.sleep_seconds)
 
             return (
                 CommandResult()
@@ -1076,6 +1178,81 @@ class Main(Star):
                 .use_t2i(False)
             )
 
+    @staticmethod
+    def format_duration(seconds: int) -> str:
+        return f"{int(seconds // 3600)}小时{int(seconds % 3600 // 60)}分"
+
+    @staticmethod
+    def format_bedtime(offset: int) -> str:
+        """把距离中午 12 点的秒数还原为 HH:MM"""
+        seconds = (offset + 43200) % 86400
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+
+    @filter.command("我的睡眠")
+    async def my_sleep_stats(self, message: AstrMessageEvent):
+        """查看自己在本群的睡眠统计"""
+        user_name = message.message_obj.sender.nickname or str(message.message_obj.sender.user_id)
+        now = int(time.time())
+        stats = await self.store.get_sleep_stats(
+            message.unified_msg_origin, message.message_obj.sender.user_id, now
+        )
+        if stats is None:
+            return CommandResult().message("你还没有在本群说过早安/晚安喵~").use_t2i(False)
+
+        lines = [f"【{user_name} 的睡眠统计】"]
+        if stats["week_sleeps"]:
+            lines.append(
+                f"本周平均睡眠：{self.format_duration(stats['week_sleep_total'] // stats['week_sleeps'])}"
+                f"（{stats['week_sleeps']} 晚）"
+            )
+        else:
+            lines.append("本周平均睡眠：暂无记录")
+        if stats["week_nights"]:
+            lines.append(f"本周平均入睡：{self.format_bedtime(stats['week_bed_total'] // stats['week_nights'])}")
+        if stats["month_sleeps"]:
+            lines.append(
+                f"本月平均睡眠：{self.format_duration(stats['month_sleep_total'] // stats['month_sleeps'])}"
+                f"（{stats['month_sleeps']} 晚）"
+            )
+        else:
+            lines.append("本月平均睡眠：暂无记录")
+        lines.append(f"连续晚安：{stats['streak']} 天（最长 {stats['best_streak']} 天）")
+        return CommandResult().message("\n".join(lines)).use_t2i(False)
+
+    @filter.command("睡眠排行")
+    async def sleep_leaderboard(self, message: AstrMessageEvent):
+        """查看本群的睡眠排行"""
+        board = await self.store.sleep_leaderboard(message.unified_msg_origin, int(time.time()))
+        sections = []
+
+        if board["first"] and board["first"][0]:
+            first_time = datetime.datetime.fromtimestamp(
+                board["first"][1], datetime.timezone(datetime.timedelta(hours=8))
+            ).strftime("%H:%M")
+            sections.append(f"🌙 今天第一个睡觉的：{board['first'][0]}（{first_time}）")
+
+        def section(title, rows, fmt):
+            if rows:
+                sections.append(title + "\n" + "\n".join(f"{i}. {fmt(row)}" for i, row in enumerate(rows, 1)))
+
+        section(
+            "😴 本周平均睡眠最长", board["week_avg"],
+            lambda r: f"{r[0]}：{self.format_duration(r[1])}（{r[2]} 晚）",
+        )
+        section(
+            "📅 本月平均睡眠最长", board["month_avg"],
+            lambda r: f"{r[0]}：{self.format_duration(r[1])}（{r[2]} 晚）",
+        )
+        section(
+            "🐦 本周平均入睡最早", board["early_bird"],
+            lambda r: f"{r[0]}：{self.format_bedtime(r[1])}（{r[2]} 晚）",
+        )
+        section("🔥 连续晚安天数", board["streak"], lambda r: f"{r[0]}：{r[1]} 天")
+
+        if not sections:
+            return CommandResult().message("本群还没有睡眠记录喵，快来说晚安吧~").use_t2i(False)
+        return CommandResult().message("\n\n".join(sections)).use_t2i(False)
+
     @filter.command("台词搜电影")
     async def search_movie_by_lines(self, message: AstrMessageEvent):
         """通过台词搜寻存在的电影"""
@@ -1103,50 +1280,44 @@ class Main(Star):
         except ValueError:
             return CommandResult().error("爬取页数必须是数字")
         
-        # API配置
-        api_url = "https://api.pearktrue.cn/api/media/lines.php"
         params = {
             'word': word,
             'page': page_int
         }
         
         try:
-            # 设置超时时间：连接超时10秒，总超时30秒
-            timeout = aiohttp.ClientTimeout(total=30, connect=10)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                logger.info(f"开始我的世界查询请求，参数：{params}")
-                async with session.get(api_url, params=params) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error("查询电影信息失败")
-                    
-                    data = await resp.json()
-                    
-                    if data.get("code") == 200 and "data" in data:
-                        # 构建基础信息输出
-                        output = f"状态信息：{data.get('msg', '')}\n"
-                        output += f"台词：{data.get('word', '')}\n"
-                        output += f"获取影视数量：{data.get('count', '')}\n"
-                        output += f"目前页数：{data.get('now_page', '')}\n"
-                        output += f"最终页数：{data.get('last_page', '')}\n"
-                        output += f"返回内容：\n\n"
-                        
-                        # 遍历所有电影结果
-                        for i, movie in enumerate(data["data"], 1):
-                            output += f"=== 电影 {i} ===\n"
-                            output += f"图片：{movie.get('local_img', '')}\n"
-                            output += f"更新时间：{movie.get('update_time', '')}\n"
-                            output += f"标题：{movie.get('title', '')}\n"
-                            output += f"国家：{movie.get('area', '')}\n"
-                            output += f"标签：{movie.get('tags', '')}\n"
-                            output += f"导演：{movie.get('directors', '')}\n"
-                            output += f"演员：{movie.get('actors', '')}\n"
-                            output += f"zh_word：{movie.get('zh_word', '')}\n"
-                            output += f"all_zh_word：{', '.join(movie.get('all_zh_word', []))}\n\n"
-                        
-                        return CommandResult().message(output)
-                    else:
-                        return CommandResult().error(f"未找到相关电影：{data.get('msg', '未知错误')}")
-                        
+            logger.info(f"开始台词搜电影请求，参数：{params}")
+            try:
+                data = await self.api.call("movie_lines", **params)
+            except UpstreamError:
+                return CommandResult().error("查询电影信息失败")
+            
+            if data.get("code") == 200 and "data" in data:
+                # 构建基础信息输出
+                output = f"状态信息：{data.get('msg', '')}\n"
+                output += f"台词：{data.get('word', '')}\n"
+                output += f"获取影视数量：{data.get('count', '')}\n"
+                output += f"目前页数：{data.get('now_page', '')}\n"
+                output += f"最终页数：{data.get('last_page', '')}\n"
+                output += f"返回内容：\n\n"
+                
+                # 遍历所有电影结果
+                for i, movie in enumerate(data["data"], 1):
+                    output += f"=== 电影 {i} ===\n"
+                    output += f"图片：{movie.get('local_img', '')}\n"
+                    output += f"更新时间：{movie.get('update_time', '')}\n"
+                    output += f"标题：{movie.get('title', '')}\n"
+                    output += f"国家：{movie.get('area', '')}\n"
+                    output += f"标签：{movie.get('tags', '')}\n"
+                    output += f"导演：{movie.get('directors', '')}\n"
+                    output += f"演员：{movie.get('actors', '')}\n"
+                    output += f"zh_word：{movie.get('zh_word', '')}\n"
+                    output += f"all_zh_word：{', '.join(movie.get('all_zh_word', []))}\n\n"
+                
+                return CommandResult().message(output)
+            else:
+                return CommandResult().error(f"未找到相关电影：{data.get('msg', '未知错误')}")
+                
         except Exception as e:
             logger.error(f"查询电影信息时发生错误：{e}")
             return CommandResult().error(f"查询电影信息时发生错误：{str(e)}")
@@ -1163,48 +1334,44 @@ class Main(Star):
         # 提取星座名
         constellation = msg
         
-        # API配置
-        api_url = "https://api.pearktrue.cn/api/xzys/"
         params = {
             'xz': constellation
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url, params=params) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error("查询星座运势失败")
-                    
-                    data = await resp.json()
-                    
-                    if data.get("code") == 200 and "data" in data:
-                        # 获取数据
-                        horoscope_data = data["data"]
-                        
-                        # 构建基础信息输出
-                        output = f"状态信息：{data.get('msg', '')}\n"
-                        output += f"星座：{data.get('xz', '')}\n"
-                        output += f"返回内容：\n\n"
-                        
-                        # 添加详细信息
-                        output += f"标题：{horoscope_data.get('title', '')}\n"
-                        output += f"时间：{horoscope_data.get('time', '')}\n"
-                        output += f"幸运色：{horoscope_data.get('luckycolor', '')}\n"
-                        output += f"幸运数字：{horoscope_data.get('luckynumber', '')}\n"
-                        output += f"幸运星座：{horoscope_data.get('luckyconstellation', '')}\n"
-                        output += f"简短的评论：{horoscope_data.get('shortcomment', '')}\n"
-                        output += f"全文：{horoscope_data.get('alltext', '')}\n\n"
-                        
-                        # 添加各方面运势
-                        output += f"爱情：\n{horoscope_data.get('lovetext', '')}\n\n"
-                        output += f"事业：\n{horoscope_data.get('worktext', '')}\n\n"
-                        output += f"金钱：\n{horoscope_data.get('moneytext', '')}\n\n"
-                        output += f"健康：\n{horoscope_data.get('healthtxt', '')}"
-                        
-                        return CommandResult().message(output)
-                    else:
-                        return CommandResult().error(f"未找到星座运势：{data.get('msg', '未知错误')}")
-                        
+            try:
+                data = await self.api.call("horoscope", **params)
+            except UpstreamError:
+                return CommandResult().error("查询星座运势失败")
+            
+            if data.get("code") == 200 and "data" in data:
+                # 获取数据
+                horoscope_data = data["data"]
+                
+                # 构建基础信息输出
+                output = f"状态信息：{data.get('msg', '')}\n"
+                output += f"星座：{data.get('xz', '')}\n"
+                output += f"返回内容：\n\n"
+                
+                # 添加详细信息
+                output += f"标题：{horoscope_data.get('title', '')}\n"
+                output += f"时间：{horoscope_data.get('time', '')}\n"
+                output += f"幸运色：{horoscope_data.get('luckycolor', '')}\n"
+                output += f"幸运数字：{horoscope_data.get('luckynumber', '')}\n"
+                output += f"幸运星座：{horoscope_data.get('luckyconstellation', '')}\n"
+                output += f"简短的评论：{horoscope_data.get('shortcomment', '')}\n"
+                output += f"全文：{horoscope_data.get('alltext', '')}\n\n"
+                
+                # 添加各方面运势
+                output += f"爱情：\n{horoscope_data.get('lovetext', '')}\n\n"
+                output += f"事业：\n{horoscope_data.get('worktext', '')}\n\n"
+                output += f"金钱：\n{horoscope_data.get('moneytext', '')}\n\n"
+                output += f"健康：\n{horoscope_data.get('healthtxt', '')}"
+                
+                return CommandResult().message(output)
+            else:
+                return CommandResult().error(f"未找到星座运势：{data.get('msg', '未知错误')}")
+                
         except Exception as e:
             logger.error(f"查询星座运势时发生错误：{e}")
             return CommandResult().error(f"查询星座运势时发生错误：{str(e)}")
@@ -1251,66 +1418,62 @@ class Main(Star):
         
         server_code = server_mapping[server_name]
         
-        # API配置
-        api_url = "https://api.nilou.moe/v1/bbs/genshin/BasicInfo"
         params = {
             'uid': uid_int,
             'server': server_code
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url, params=params) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error("查询失败！可能是服务器问题！\n提醒：用户必须注册米游社/HoYoLAB，且开启了\"在战绩页面是否展示角色详情\"否则也会查询失败！！！")
-                    
-                    data = await resp.json()
-                    
-                    # 检查API响应
-                    if "data" not in data:
-                        return CommandResult().error("查询失败！可能是服务器问题！\n提醒：用户必须注册米游社/HoYoLAB，且开启了\"在战绩页面是否展示角色详情\"否则也会查询失败！！！")
-                    
-                    game_data = data["data"]
-                    
-                    # 构建基本信息输出
-                    output = "原神基本信息整理（中文）\n"
-                    output += f"信息：{data.get('message', '成功')}\n"
-                    output += "数据详情：\n"
-                    
-                    # 角色信息
-                    characters = game_data.get('characters', [])
-                    if characters:
-                        output += "=== 角色信息 ===\n"
-                        for i, char in enumerate(characters[:5], 1):  # 只显示前5个角色
-                            output += f"角色{i}：{char.get('name', '')}（等级{char.get('level', '')}）\n"
-                        if len(characters) > 5:
-                            output += f"...还有{len(characters)-5}个角色\n"
-                    
-                    # 游戏统计数据
-                    stats = game_data.get('stats', {})
-                    if stats:
-                        output += "\n=== 游戏统计数据 ===\n"
-                        output += f"活跃天数：{stats.get('active_days', '')}\n"
-                        output += f"成就达成数：{stats.get('achievements', '')}\n"
-                        output += f"获得角色数：{stats.get('characters_number', '')}\n"
-                        output += f"深境螺旋：{stats.get('spiral_abyss', '')}\n"
-                    
-                    # 世界探索进度
-                    world_explorations = game_data.get('world_explorations', [])
-                    if world_explorations:
-                        output += "\n=== 世界探索进度 ===\n"
-                        for exploration in world_explorations:
-                            output += f"{exploration.get('name', '')}：{exploration.get('exploration_percentage', '')}%\n"
-                    
-                    # 尘歌壶信息
-                    homes = game_data.get('homes', [])
-                    if homes:
-                        output += "\n=== 尘歌壶信息 ===\n"
-                        for home in homes:
-                            output += f"{home.get('name', '')}：等级{home.get('level', '')}，访客数{home.get('visit_num', '')}\n"
-                    
-                    return CommandResult().message(output)
-                        
+            try:
+                data = await self.api.call("genshin_basic", **params)
+            except UpstreamError:
+                return CommandResult().error("查询失败！可能是服务器问题！\n提醒：用户必须注册米游社/HoYoLAB，且开启了\"在战绩页面是否展示角色详情\"否则也会查询失败！！！")
+            
+            # 检查API响应
+            if "data" not in data:
+                return CommandResult().error("查询失败！可能是服务器问题！\n提醒：用户必须注册米游社/HoYoLAB，且开启了\"在战绩页面是否展示角色详情\"否则也会查询失败！！！")
+            
+            game_data = data["data"]
+            
+            # 构建基本信息输出
+            output = "原神基本信息整理（中文）\n"
+            output += f"信息：{data.get('message', '成功')}\n"
+            output += "数据详情：\n"
+            
+            # 角色信息
+            characters = game_data.get('characters', [])
+            if characters:
+                output += "=== 角色信息 ===\n"
+                for i, char in enumerate(characters[:5], 1):  # 只显示前5个角色
+                    output += f"角色{i}：{char.get('name', '')}（等级{char.get('level', '')}）\n"
+                if len(characters) > 5:
+                    output += f"...还有{len(characters)-5}个角色\n"
+            
+            # 游戏统计数据
+            stats = game_data.get('stats', {})
+            if stats:
+                output += "\n=== 游戏统计数据 ===\n"
+                output += f"活跃天数：{stats.get('active_days', '')}\n"
+                output += f"成就达成数：{stats.get('achievements', '')}\n"
+                output += f"获得角色数：{stats.get('characters_number', '')}\n"
+                output += f"深境螺旋：{stats.get('spiral_abyss', '')}\n"
+            
+            # 世界探索进度
+            world_explorations = game_data.get('world_explorations', [])
+            if world_explorations:
+                output += "\n=== 世界探索进度 ===\n"
+                for exploration in world_explorations:
+                    output += f"{exploration.get('name', '')}：{exploration.get('exploration_percentage', '')}%\n"
+            
+            # 尘歌壶信息
+            homes = game_data.get('homes', [])
+            if homes:
+                output += "\n=== 尘歌壶信息 ===\n"
+                for home in homes:
+                    output += f"{home.get('name', '')}：等级{home.get('level', '')}，访客数{home.get('visit_num', '')}\n"
+            
+            return CommandResult().message(output)
+                
         except Exception as e:
             logger.error(f"查询原神基本信息时发生错误：{e}")
             return CommandResult().error("查询失败！可能是服务器问题！\n提醒：用户必须注册米游社/HoYoLAB，且开启了\"在战绩页面是否展示角色详情\"否则也会查询失败！！！")
@@ -1363,8 +1526,6 @@ class Main(Star):
         server_code = server_mapping[server_name]
         abyss_type_int = int(abyss_type)
         
-        # API配置
-        api_url = "https://api.nilou.moe/v1/bbs/genshin/AbyssInfo"
         params = {
             'uid': uid_int,
             'server': server_code,
@@ -1372,69 +1533,67 @@ class Main(Star):
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url, params=params) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error("查询失败！可能是服务器问题！\n提醒：用户必须注册米游社/HoYoLAB，且开启了\"在战绩页面是否展示角色详情\"否则也会查询失败！！！")
-                    
-                    data = await resp.json()
-                    
-                    # 检查API响应
-                    if "data" not in data:
-                        return CommandResult().error("查询失败！可能是服务器问题！\n提醒：用户必须注册米游社/HoYoLAB，且开启了\"在战绩页面是否展示角色详情\"否则也会查询失败！！！")
-                    
-                    game_data = data["data"]
-                    
-                    # 构建深渊数据输出
-                    output = "深境螺旋数据整理（中文）\n"
-                    output += f"信息：{data.get('message', '成功')}\n"
-                    output += "数据详情：\n"
-                    
-                    # 格式化时间戳
-                    start_time = game_data.get('start_time', '')
-                    end_time = game_data.get('end_time', '')
-                    
-                    def format_timestamp(timestamp):
-                        if not timestamp:
-                            return '无数据'
-                        try:
-                            import datetime
-                            dt = datetime.datetime.fromtimestamp(int(timestamp), datetime.timezone(datetime.timedelta(hours=8)))
-                            return dt.strftime('%Y 年 %m 月 %d 日 %H:%M:%S（时间戳：' + str(timestamp) + '，北京时间）')
-                        except:
-                            return f'时间戳：{timestamp}'
-                    
-                    output += f"期数 ID：{game_data.get('schedule_id', '')}\n"
-                    output += f"开始时间：{format_timestamp(start_time)}\n"
-                    output += f"结束时间：{format_timestamp(end_time)}\n"
-                    output += f"总战斗次数：{game_data.get('total_battle_times', '')}\n"
-                    output += f"总胜利次数：{game_data.get('total_win_times', '')}\n"
-                    output += f"最高层数：{game_data.get('max_floor', '')}\n"
-                    
-                    # 处理排名数据
-                    reveal_rank = game_data.get('reveal_rank', [])
-                    defeat_rank = game_data.get('defeat_rank', [])
-                    damage_rank = game_data.get('damage_rank', [])
-                    take_damage_rank = game_data.get('take_damage_rank', [])
-                    normal_skill_rank = game_data.get('normal_skill_rank', [])
-                    energy_skill_rank = game_data.get('energy_skill_rank', [])
-                    
-                    output += f"元素爆发排名：{reveal_rank if reveal_rank else '[]（无数据）'}\n"
-                    output += f"击败敌人排名：{defeat_rank if defeat_rank else '[]（无数据）'}\n"
-                    output += f"造成伤害排名：{damage_rank if damage_rank else '[]（无数据）'}\n"
-                    output += f"承受伤害排名：{take_damage_rank if take_damage_rank else '[]（无数据）'}\n"
-                    output += f"普通攻击排名：{normal_skill_rank if normal_skill_rank else '[]（无数据）'}\n"
-                    output += f"元素战技排名：{energy_skill_rank if energy_skill_rank else '[]（无数据）'}\n"
-                    
-                    floors = game_data.get('floors', [])
-                    output += f"楼层详情：{floors if floors else '[]（无数据）'}\n"
-                    output += f"总星数：{game_data.get('total_star', '')}\n"
-                    output += f"已解锁：{'是' if game_data.get('is_unlock', False) else '否'}\n"
-                    output += f"刚跳过的楼层：{'是' if game_data.get('is_just_skipped_floor', False) else '否'}\n"
-                    output += f"跳过的楼层：{game_data.get('skipped_floor', '')}"
-                    
-                    return CommandResult().message(output)
-                        
+            try:
+                data = await self.api.call("genshin_abyss", **params)
+            except UpstreamError:
+                return CommandResult().error("查询失败！可能是服务器问题！\n提醒：用户必须注册米游社/HoYoLAB，且开启了\"在战绩页面是否展示角色详情\"否则也会查询失败！！！")
+            
+            # 检查API响应
+            if "data" not in data:
+                return CommandResult().error("查询失败！可能是服务器问题！\n提醒：用户必须注册米游社/HoYoLAB，且开启了\"在战绩页面是否展示角色详情\"否则也会查询失败！！！")
+            
+            game_data = data["data"]
+            
+            # 构建深渊数据输出
+            output = "深境螺旋数据整理（中文）\n"
+            output += f"信息：{data.get('message', '成功')}\n"
+            output += "数据详情：\n"
+            
+            # 格式化时间戳
+            start_time = game_data.get('start_time', '')
+            end_time = game_data.get('end_time', '')
+            
+            def format_timestamp(timestamp):
+                if not timestamp:
+                    return '无数据'
+                try:
+                    import datetime
+                    dt = datetime.datetime.fromtimestamp(int(timestamp), datetime.timezone(datetime.timedelta(hours=8)))
+                    return dt.strftime('%Y 年 %m 月 %d 日 %H:%M:%S（时间戳：' + str(timestamp) + '，北京时间）')
+                except:
+                    return f'时间戳：{timestamp}'
+            
+            output += f"期数 ID：{game_data.get('schedule_id', '')}\n"
+            output += f"开始时间：{format_timestamp(start_time)}\n"
+            output += f"结束时间：{format_timestamp(end_time)}\n"
+            output += f"总战斗次数：{game_data.get('total_battle_times', '')}\n"
+            output += f"总胜利次数：{game_data.get('total_win_times', '')}\n"
+            output += f"最高层数：{game_data.get('max_floor', '')}\n"
+            
+            # 处理排名数据
+            reveal_rank = game_data.get('reveal_rank', [])
+            defeat_rank = game_data.get('defeat_rank', [])
+            damage_rank = game_data.get('damage_rank', [])
+            take_damage_rank = game_data.get('take_damage_rank', [])
+            normal_skill_rank = game_data.get('normal_skill_rank', [])
+            energy_skill_rank = game_data.get('energy_skill_rank', [])
+            
+            output += f"元素爆发排名：{reveal_rank if reveal_rank else '[]（无数据）'}\n"
+            output += f"击败敌人排名：{defeat_rank if defeat_rank else '[]（无数据）'}\n"
+            output += f"造成伤害排名：{damage_rank if damage_rank else '[]（无数据）'}\n"
+            output += f"承受伤害排名：{take_damage_rank if take_damage_rank else '[]（无数据）'}\n"
+            output += f"普通攻击排名：{normal_skill_rank if normal_skill_rank else '[]（无数据）'}\n"
+            output += f"元素战技排名：{energy_skill_rank if energy_skill_rank else '[]（无数据）'}\n"
+            
+            floors = game_data.get('floors', [])
+            output += f"楼层详情：{floors if floors else '[]（无数据）'}\n"
+            output += f"总星数：{game_data.get('total_star', '')}\n"
+            output += f"已解锁：{'是' if game_data.get('is_unlock', False) else '否'}\n"
+            output += f"刚跳过的楼层：{'是' if game_data.get('is_just_skipped_floor', False) else '否'}\n"
+            output += f"跳过的楼层：{game_data.get('skipped_floor', '')}"
+            
+            return CommandResult().message(output)
+                
         except Exception as e:
             logger.error(f"查询原神深渊数据时发生错误：{e}")
             return CommandResult().error("查询失败！可能是服务器问题！\n提醒：用户必须注册米游社/HoYoLAB，且开启了\"在战绩页面是否展示角色战绩\"否则也会查询失败！！！")
@@ -1455,8 +1614,6 @@ class Main(Star):
         if not msg.startswith(("http://", "https://")):
             return CommandResult().error("正确指令：123网盘解析 链接\n示例：123网盘解析 https://123.wq.cn")
         
-        # API配置
-        api_url = "https://api.pearktrue.cn/api/123panparse/"
         params = {
             "url": msg,
             "pwd": "",
@@ -1464,32 +1621,30 @@ class Main(Star):
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url, params=params) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error("解析失败：服务器错误")
-                    
-                    data = await resp.json()
-                    
-                    # 检查API响应
-                    if data.get("code") != 200:
-                        return CommandResult().error("文件信息获取失败！！！\n可能是服务器出现问题！\n如果文件超过100mb也会出现失败！")
-                    
-                    # 获取解析结果
-                    result_data = data.get("data", {})
-                    download_url = result_data.get("downloadurl", "")
-                    filename = result_data.get("filename", "未知文件")
-                    size = result_data.get("size", "未知大小")
-                    
-                    # 构建输出结果
-                    output = "解析成功！\n"
-                    output += f"文件名：{filename}\n"
-                    output += f"文件大小：{size}\n"
-                    output += "直链链接：\n"
-                    output += download_url
-                    
-                    return CommandResult().message(output)
-                        
+            try:
+                data = await self.api.call("pan123", **params)
+            except UpstreamError:
+                return CommandResult().error("解析失败：服务器错误")
+            
+            # 检查API响应
+            if data.get("code") != 200:
+                return CommandResult().error("文件信息获取失败！！！\n可能是服务器出现问题！\n如果文件超过100mb也会出现失败！")
+            
+            # 获取解析结果
+            result_data = data.get("data", {})
+            download_url = result_data.get("downloadurl", "")
+            filename = result_data.get("filename", "未知文件")
+            size = result_data.get("size", "未知大小")
+            
+            # 构建输出结果
+            output = "解析成功！\n"
+            output += f"文件名：{filename}\n"
+            output += f"文件大小：{size}\n"
+            output += "直链链接：\n"
+            output += download_url
+            
+            return CommandResult().message(output)
+                
         except aiohttp.ClientError as e:
             logger.error(f"网络连接错误：{e}")
             return CommandResult().error("无法连接到解析服务器，请稍后重试或检查网络连接")
@@ -1517,37 +1672,39 @@ class Main(Star):
         if not image_obj:
             return CommandResult().error("正确指令：识图 你发的图片")
         
-        # API配置
-        api_url = "https://api.pearktrue.cn/api/airecognizeimg/"
-        
         try:
-            # 设置超时
-            timeout = aiohttp.ClientTimeout(total=30)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                # 准备请求数据
-                payload = {
-                    "file": image_obj.url
-                }
+            # 图片下载到按 sha256 命名的存储中，相同内容的图片直接使用缓存的识别结果
+            digest = None
+            try:
+                if image_obj.url and not os.path.isfile(image_obj.url):
+                    digest = self.media.digest_of(await self.download_image(image_obj.url))
+            except (aiohttp.ClientError, asyncio.TimeoutError, ImageSourceError, MediaError) as e:
+                logger.warning(f"下载识图图片失败，跳过缓存: {e}")
+            cached = await self.recognition_cache.get(digest) if digest else None
+            if cached is not None:
+                msg, result = cached
+            else:
+                try:
+                    data = await self.api.call("ai_recognition", file=image_obj.url)
+                except UpstreamError:
+                    return CommandResult().error("识图失败：服务器错误")
+
+                # 检查API响应
+                if data.get("code") != 200:
+                    msg = data.get("msg", "未知错误")
+                    return CommandResult().error(f"识图失败：{msg}")
+                msg, result = data.get("msg", ""), data.get("result", "")
+                if digest:
+                    await self.recognition_cache.put(digest, msg, result)
+
+            # 构建输出结果
+            output = "状态信息：\n"
+            output += f"{msg}\n\n"
+            output += "识别结果：\n"
+            output += f"{result}"
+            
+            return CommandResult().message(output)
                 
-                async with session.post(api_url, json=payload) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error("识图失败：服务器错误")
-                    
-                    data = await resp.json()
-                    
-                    # 检查API响应
-                    if data.get("code") != 200:
-                        msg = data.get("msg", "未知错误")
-                        return CommandResult().error(f"识图失败：{msg}")
-                    
-                    # 构建输出结果
-                    output = "状态信息：\n"
-                    output += f"{data.get('msg', '')}\n\n"
-                    output += "识别结果：\n"
-                    output += f"{data.get('result', '')}"
-                    
-                    return CommandResult().message(output)
-                        
         except aiohttp.ClientError as e:
             logger.error(f"网络连接错误：{e}")
             return CommandResult().error("无法连接到识图服务器，请稍后重试或检查网络连接")
@@ -1579,30 +1736,14 @@ class Main(Star):
             else:
                 return CommandResult().error(f"卡池选择错误，可选：\n1：不归花火\n2：指令·重构\n3：自火中归还\n4：她们渡船而来")
         
-        # API配置 - 直接获取图片
-        api_url = "https://app.zichen.zone/api/headhunts/api.php"
-        params = {
-            "type": "img",
-            "pool": pool
-        }
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url, params=params) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error(f"方舟寻访失败：服务器错误 (HTTP {resp.status})")
-                    
-                    # 直接读取图片数据
-                    image_data = await resp.read()
-                    
-                    # 保存图片到本地
-                    try:
-                        with open("arknights_recruitment.jpg", "wb") as f:
-                            f.write(image_data)
-                        return CommandResult().file_image("arknights_recruitment.jpg")
-                    except Exception as e:
-                        return CommandResult().error(f"保存图片失败: {e}")
-                        
+            # 从预取池取出寻访结果图片
+            try:
+                path = await self.image_pools.take("arknights", pool)
+            except UpstreamError as e:
+                return CommandResult().error(f"方舟寻访失败：服务器错误 (HTTP {e.status})")
+            return CommandResult().file_image(path)
+                
         except aiohttp.ClientError as e:
             logger.error(f"网络连接错误：{e}")
             return CommandResult().error("无法连接到方舟寻访服务器，请稍后重试或检查网络连接")
@@ -1616,49 +1757,20 @@ class Main(Star):
     @filter.command("随机游戏图片")
     async def get_random_game_image(self, message: AstrMessageEvent):
         """随机游戏图片"""
-        api_url = "https://api.52vmy.cn/api/img/tu/game"
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error(f"获取游戏图片失败: {resp.status}")
-                    
-                    # 解析JSON响应
-                    try:
-                        data = await resp.json()
-                    except json.JSONDecodeError as e:
-                        logger.error(f"JSON解析错误：{e}")
-                        return CommandResult().error("获取游戏图片失败：服务器返回了无效的JSON格式")
-                    
-                    # 检查API响应
-                    if data.get("code") != 200:
-                        msg = data.get("msg", "未知错误")
-                        return CommandResult().error(f"获取游戏图片失败：{msg}")
-                    
-                    # 获取图片URL
-                    image_url = data.get("url")
-                    if not image_url:
-                        return CommandResult().error("获取游戏图片失败：未获取到图片URL")
-                    
-                    # 下载图片
-                    try:
-                        async with session.get(image_url) as img_resp:
-                            if img_resp.status != 200:
-                                return CommandResult().error(f"下载图片失败：HTTP {img_resp.status}")
-                            
-                            # 读取图片数据
-                            image_data = await img_resp.read()
-                            
-                            # 保存图片到本地
-                            with open("random_game_image.jpg", "wb") as f:
-                                f.write(image_data)
-                            
-                            return CommandResult().file_image("random_game_image.jpg")
-                    
-                    except Exception as e:
-                        return CommandResult().error(f"下载或保存图片失败: {e}")
-                        
+            try:
+                if self.passthrough_enabled(message, "random_game"):
+                    return CommandResult(chain=[Image.fromURL(await self.fetch_random_game_url())])
+                path = await self.image_pools.take("random_game")
+            except UpstreamError as e:
+                return CommandResult().error(f"获取游戏图片失败: {e.status}")
+            except json.JSONDecodeError as e:
+                logger.error(f"JSON解析错误：{e}")
+                return CommandResult().error("获取游戏图片失败：服务器返回了无效的JSON格式")
+            except ImageSourceError as e:
+                return CommandResult().error(str(e))
+            return CommandResult().file_image(path)
+                
         except aiohttp.ClientError as e:
             logger.error(f"网络连接错误：{e}")
             return CommandResult().error("无法连接到游戏图片服务器，请稍后重试或检查网络连接")
@@ -1679,54 +1791,39 @@ class Main(Star):
         if not keyword:
             return CommandResult().error("正确指令：搜图 关键词")
         
-        # API配置
-        api_url = "https://api.52vmy.cn/api/img/360"
-        params = {
-            "msg": keyword
-        }
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url, params=params) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error(f"搜图失败：服务器错误 (HTTP {resp.status})")
-                    
-                    # 解析JSON响应
-                    try:
-                        data = await resp.json()
-                    except json.JSONDecodeError as e:
-                        logger.error(f"JSON解析错误：{e}")
-                        return CommandResult().error("搜图失败：服务器返回了无效的JSON格式")
-                    
-                    # 检查API响应
-                    if data.get("code") != 200:
-                        msg = data.get("msg", "未知错误")
-                        return CommandResult().error(f"搜图失败：{msg}")
-                    
-                    # 获取图片URL
-                    if "data" not in data or "url" not in data["data"]:
-                        return CommandResult().error("搜图失败：未获取到图片URL")
-                    
-                    image_url = data["data"]["url"]
-                    
-                    # 下载图片
-                    try:
-                        async with session.get(image_url) as img_resp:
-                            if img_resp.status != 200:
-                                return CommandResult().error(f"下载图片失败：HTTP {img_resp.status}")
-                            
-                            # 读取图片数据
-                            image_data = await img_resp.read()
-                            
-                            # 保存图片到本地
-                            with open("360_search_image.jpg", "wb") as f:
-                                f.write(image_data)
-                            
-                            return CommandResult().file_image("360_search_image.jpg")
-                    
-                    except Exception as e:
-                        return CommandResult().error(f"下载或保存图片失败: {e}")
-                        
+            try:
+                data = await self.api.call("search_360", msg=keyword)
+            except UpstreamError as e:
+                return CommandResult().error(f"搜图失败：服务器错误 (HTTP {e.status})")
+            except json.JSONDecodeError as e:
+                logger.error(f"JSON解析错误：{e}")
+                return CommandResult().error("搜图失败：服务器返回了无效的JSON格式")
+            
+            # 检查API响应
+            if data.get("code") != 200:
+                msg = data.get("msg", "未知错误")
+                return CommandResult().error(f"搜图失败：{msg}")
+            
+            # 获取图片URL
+            if "data" not in data or "url" not in data["data"]:
+                return CommandResult().error("搜图失败：未获取到图片URL")
+            
+            image_url = data["data"]["url"]
+            
+            if self.passthrough_enabled(message, "search_360"):
+                return CommandResult(chain=[Image.fromURL(image_url)])
+            
+            # 下载图片
+            try:
+                image_path = await self.download_image(image_url)
+                image_path = await self.encoder.encode_file("search_360", image_path)
+                return CommandResult().file_image(image_path)
+            except ImageSourceError as e:
+                return CommandResult().error(str(e))
+            except Exception as e:
+                return CommandResult().error(f"下载或保存图片失败: {e}")
+                
         except aiohttp.ClientError as e:
             logger.error(f"网络连接错误：{e}")
             return CommandResult().error("无法连接到搜图服务器，请稍后重试或检查网络连接")
@@ -1756,43 +1853,39 @@ class Main(Star):
         if len(parts) == 1:
             software_name = parts[0]
             # 调用API获取软件列表
-            api_url = "https://wwm.34bc.com/API/hlx_ruanjian.php"
-            params = {"msg": software_name}
-            
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(api_url, params=params) as resp:
-                        if resp.status != 200:
-                            return CommandResult().error(f"搜索软件失败：服务器错误 (HTTP {resp.status})")
-                        
-                        result = await resp.text()
-                        # 解析结果，格式化输出
-                        lines = []
-                        # 按数字分割软件信息
-                        import re
-                        software_items = re.split(r'\d+\.', result)
-                        # 移除第一个空元素
-                        if software_items and software_items[0].strip() == "":
-                            software_items = software_items[1:]
-                        
-                        for i, item in enumerate(software_items, 1):
-                            if item.strip():
-                                lines.append(f"{i}号软件：{item.strip()}")
-                        
-                        # 添加统计信息
-                        if "共搜索到" in result and "个" in result:
-                            match = re.search(r'共搜索到(\d+)个', result)
-                            if match:
-                                total_count = match.group(1)
-                                lines.append(f"\n共搜索到{total_count}个软件！！")
-                        else:
-                            lines.append("\n共搜索到多个软件！！")
-                        
-                        # 添加提示信息
-                        lines.append("\n加入序号发下载链接！！")
-                        
-                        return CommandResult(chain=[Plain("\n".join(lines))])
-                        
+                try:
+                    result = await self.api.call("huluxia", msg=software_name)
+                except UpstreamError as e:
+                    return CommandResult().error(f"搜索软件失败：服务器错误 (HTTP {e.status})")
+                
+                # 解析结果，格式化输出
+                lines = []
+                # 按数字分割软件信息
+                import re
+                software_items = re.split(r'\d+\.', result)
+                # 移除第一个空元素
+                if software_items and software_items[0].strip() == "":
+                    software_items = software_items[1:]
+                
+                for i, item in enumerate(software_items, 1):
+                    if item.strip():
+                        lines.append(f"{i}号软件：{item.strip()}")
+                
+                # 添加统计信息
+                if "共搜索到" in result and "个" in result:
+                    match = re.search(r'共搜索到(\d+)个', result)
+                    if match:
+                        total_count = match.group(1)
+                        lines.append(f"\n共搜索到{total_count}个软件！！")
+                else:
+                    lines.append("\n共搜索到多个软件！！")
+                
+                # 添加提示信息
+                lines.append("\n加入序号发下载链接！！")
+                
+                return CommandResult(chain=[Plain("\n".join(lines))])
+                
             except aiohttp.ClientError as e:
                 logger.error(f"网络连接错误：{e}")
                 return CommandResult().error("无法连接到葫芦侠软件搜索服务器，请稍后重试或检查网络连接")
@@ -1812,23 +1905,20 @@ class Main(Star):
                 return CommandResult().error("正确指令：葫芦侠软件搜索 软件名 下载序号链接")
             
             # 调用API获取下载链接
-            api_url = "https://wwm.34bc.com/API/hlx_ruanjian.php"
-            params = {"msg": software_name, "n": str(sequence_number)}
-            
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(api_url, params=params) as resp:
-                        if resp.status != 200:
-                            return CommandResult().error(f"获取下载链接失败：服务器错误 (HTTP {resp.status})")
-                        
-                        download_link = await resp.text()
-                        
-                        # 检查是否是有效的下载链接
-                        if download_link.startswith("http"):
-                            return CommandResult(chain=[Plain(f"下载链接：\n\n{download_link}")])
-                        else:
-                            return CommandResult().error("获取下载链接失败：返回了无效的链接格式")
-                        
+                try:
+                    download_link = await self.api.call(
+                        "huluxia", msg=software_name, n=sequence_number
+                    )
+                except UpstreamError as e:
+                    return CommandResult().error(f"获取下载链接失败：服务器错误 (HTTP {e.status})")
+                
+                # 检查是否是有效的下载链接
+                if download_link.startswith("http"):
+                    return CommandResult(chain=[Plain(f"下载链接：\n\n{download_link}")])
+                else:
+                    return CommandResult().error("获取下载链接失败：返回了无效的链接格式")
+                
             except aiohttp.ClientError as e:
                 logger.error(f"网络连接错误：{e}")
                 return CommandResult().error("无法连接到葫芦侠软件搜索服务器，请稍后重试或检查网络连接")
@@ -1853,57 +1943,37 @@ class Main(Star):
         if not user_input:
             return CommandResult().error("正确指令：饥荒查询 物品")
         
-        # 构建api请求url
-        api_url = "https://api.tangdouz.com/a/jhwiki.php"
-        params = {
-            "nr": user_input,
-            "return": "json"
-        }
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url, params=params) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error(f"饥荒查询失败：服务器错误 (HTTP {resp.status})")
-                    
-                    # 解析json响应
-                    try:
-                        data = await resp.json()
-                    except json.JSONDecodeError as e:
-                        logger.error(f"JSON解析错误：{e}")
-                        return CommandResult().error("饥荒查询失败：服务器返回了无效的JSON格式")
-                    
-                    # 获取查询内容
-                    content = data.get("content", "")
-                    img_url = data.get("img", "")
-                    cache_time = data.get("cache_time", "")
-                    
-                    # 构建输出文本
-                    output = f"查询内容: {content}\n\n内容修改时间：{cache_time}"
-                    
-                    # 如果有图片，同时发送文本和图片
-                    if img_url and img_url.startswith("http"):
-                        try:
-                            # 下载图片
-                            async with session.get(img_url) as img_resp:
-                                if img_resp.status == 200:
-                                    image_data = await img_resp.read()
-                                    # 保存图片到本地
-                                    with open("dont_starve_image.jpg", "wb") as f:
-                                        f.write(image_data)
-                                    # 同时发送文本和图片
-                                    return CommandResult(chain=[Plain(output), Image("dont_starve_image.jpg")])
-                                else:
-                                    # 如果图片下载失败，返回文本信息
-                                    return CommandResult(chain=[Plain(output)])
-                        except Exception as e:
-                            logger.error(f"下载图片失败：{e}")
-                            # 如果图片下载失败，返回文本信息
-                            return CommandResult(chain=[Plain(output)])
-                    else:
-                        # 如果没有图片，返回文本信息
-                        return CommandResult(chain=[Plain(output)])
-                        
+            try:
+                data = await self.api.call("dont_starve_wiki", nr=user_input)
+            except UpstreamError as e:
+                return CommandResult().error(f"饥荒查询失败：服务器错误 (HTTP {e.status})")
+            except json.JSONDecodeError as e:
+                logger.error(f"JSON解析错误：{e}")
+                return CommandResult().error("饥荒查询失败：服务器返回了无效的JSON格式")
+            
+            # 获取查询内容
+            content = data.get("content", "")
+            img_url = data.get("img", "")
+            cache_time = data.get("cache_time", "")
+            
+            # 构建输出文本
+            output = f"查询内容: {content}\n\n内容修改时间：{cache_time}"
+            
+            # 如果有图片，同时发送文本和图片
+            if img_url and img_url.startswith("http"):
+                try:
+                    image = await self.remote_image(message, "dont_starve", img_url)
+                    # 同时发送文本和图片
+                    return CommandResult(chain=[Plain(output), image])
+                except Exception as e:
+                    logger.error(f"下载图片失败：{e}")
+                    # 如果图片下载失败，返回文本信息
+                    return CommandResult(chain=[Plain(output)])
+            else:
+                # 如果没有图片，返回文本信息
+                return CommandResult(chain=[Plain(output)])
+                
         except aiohttp.ClientError as e:
             logger.error(f"网络连接错误：{e}")
             return CommandResult().error("无法连接到饥荒查询服务器，请稍后重试或检查网络连接")
@@ -1924,59 +1994,38 @@ class Main(Star):
         if not user_input:
             return CommandResult().error("正确指令：我的世界查询 物品")
         
-        # 构建api请求url
-        api_url = "https://api.tangdouz.com/mcwiki.php"
-        params = {
-            "nr": user_input,
-            "return": "json"
-        }
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url, params=params) as resp:
-                    if resp.status != 200:
-                        error_text = await resp.text()
-                        logger.error(f"我的世界查询API返回错误状态码 {resp.status}，响应内容：{error_text}")
-                        return CommandResult().error(f"我的世界查询失败：服务器错误 (HTTP {resp.status})")
-                    
-                    # 解析json响应
-                    try:
-                        data = await resp.json()
-                        logger.info(f"我的世界查询API响应成功，数据：{data}")
-                    except json.JSONDecodeError as e:
-                        logger.error(f"json解析错误：{e}")
-                        return CommandResult().error("我的世界查询失败：服务器返回了无效的json格式")
-                    
-                    # 获取查询内容
-                    allcontent = data.get("allcontent", "")
-                    img_url = data.get("img", "")
-                    
-                    # 构建输出文本
-                    output = f"查询内容: {allcontent}"
-                    
-                    # 如果有图片，同时发送文本和图片
-                    if img_url and img_url.startswith("http"):
-                        try:
-                            # 下载图片
-                            async with session.get(img_url) as img_resp:
-                                if img_resp.status == 200:
-                                    image_data = await img_resp.read()
-                                    # 保存图片到本地
-                                    with open("minecraft_image.jpg", "wb") as f:
-                                        f.write(image_data)
-                                    # 同时发送文本和图片
-                                    return CommandResult(chain=[Plain(output), Image("minecraft_image.jpg")])
-                                else:
-                                    # 如果图片下载失败，返回文本信息
-                                    return CommandResult(chain=[Plain(output)])
-                        except Exception as e:
-                            logger.error(f"下载图片失败：{e}")
-                            # 如果图片下载失败，返回文本信息
-                            return CommandResult(chain=[Plain(output)])
-                    else:
-                        # 如果没有图片，返回文本信息
-                        return CommandResult(chain=[Plain(output)])
-                        
+            try:
+                data = await self.api.call("minecraft_wiki", nr=user_input)
+                logger.info(f"我的世界查询API响应成功，数据：{data}")
+            except UpstreamError as e:
+                logger.error(f"我的世界查询API返回错误状态码 {e.status}，响应内容：{e.body}")
+                return CommandResult().error(f"我的世界查询失败：服务器错误 (HTTP {e.status})")
+            except json.JSONDecodeError as e:
+                logger.error(f"json解析错误：{e}")
+                return CommandResult().error("我的世界查询失败：服务器返回了无效的json格式")
+            
+            # 获取查询内容
+            allcontent = data.get("allcontent", "")
+            img_url = data.get("img", "")
+            
+            # 构建输出文本
+            output = f"查询内容: {allcontent}"
+            
+            # 如果有图片，同时发送文本和图片
+            if img_url and img_url.startswith("http"):
+                try:
+                    image = await self.remote_image(message, "minecraft", img_url)
+                    # 同时发送文本和图片
+                    return CommandResult(chain=[Plain(output), image])
+                except Exception as e:
+                    logger.error(f"下载图片失败：{e}")
+                    # 如果图片下载失败，返回文本信息
+                    return CommandResult(chain=[Plain(output)])
+            else:
+                # 如果没有图片，返回文本信息
+                return CommandResult(chain=[Plain(output)])
+                
         except aiohttp.ClientError as e:
             logger.error(f"网络连接错误：{e}")
             return CommandResult().error("无法连接到我的世界查询服务器，请稍后重试或检查网络连接")
@@ -1990,33 +2039,29 @@ class Main(Star):
     @filter.command("好游快爆热搜榜")
     async def haoyou_hot_search(self, message: AstrMessageEvent):
         """好游快爆热搜榜功能"""
-        # API配置
-        api_url = "https://wwm.34bc.com/API/Haoyou_Quick_Hot_Search.php"
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url) as resp:
-                    if resp.status != 200:
-                        return CommandResult().error(f"获取好游快爆热搜榜失败：服务器错误 (HTTP {resp.status})")
-                    
-                    # 获取响应文本
-                    result = await resp.text()
-                    
-                    # 检查是否包含有效数据
-                    if "----好游快爆热搜榜----" not in result:
-                        return CommandResult().error("获取好游快爆热搜榜失败：服务器返回了无效数据")
-                    
-                    # 过滤掉PHP警告信息，只保留热搜榜内容
-                    # 查找热搜榜开始标记
-                    start_marker = "----好游快爆热搜榜----"
-                    start_index = result.find(start_marker)
-                    if start_index != -1:
-                        # 从开始标记处截取内容
-                        filtered_result = result[start_index:]
-                        return CommandResult().message(filtered_result)
-                    else:
-                        return CommandResult().error("获取好游快爆热搜榜失败：数据格式异常")
-                        
+            # 获取响应文本
+            try:
+                result = await self.api.call("haoyou_hot")
+            except UpstreamError as e:
+                return CommandResult().error(f"获取好游快爆热搜榜失败：服务器错误 (HTTP {e.status})")
+            
+            # 检查是否包含有效数据
+            if "----好游快爆热搜榜----" not in result:
+                return CommandResult().error("获取好游快爆热搜榜失败：服务器返回了无效数据")
+            
+            # 过滤掉PHP警告信息，只保留热搜榜内容
+            # 查找热搜榜开始标记
+            start_marker = "----好游快爆热搜榜----"
+            start_index = result.find(start_marker)
+            if start_index != -1:
+                # 从开始标记处截取内容
+                filtered_result = result[start_index:]
+                return CommandResult().message(filtered_result)
+            else:
+                return CommandResult().error("获取好游快爆热搜榜失败：数据格式异常")
+                
         except aiohttp.ClientError as e:
             logger.error(f"网络连接错误：{e}")
             return CommandResult().error("无法连接到好游快爆热搜榜服务器，请稍后重试或检查网络连接")
@@ -2106,53 +2151,33 @@ class Main(Star):
         if seed:
             params["seed"] = seed
         
-        # 构建API请求URL
-        api_url = "https://api.lvlong.xyz/api/ai_image"
-        
         try:
-            # 设置超时时间：连接超时10秒，总超时180秒（AI绘画可能需要更长时间）
-            timeout = aiohttp.ClientTimeout(total=180, connect=10)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                # 记录请求开始时间
-                start_time = time.time()
-                logger.info(f"开始AI绘画请求，参数：{params}")
+            # 记录请求开始时间（超时时间由接口声明：AI绘画总超时180秒）
+            start_time = time.time()
+            logger.info(f"开始AI绘画请求，参数：{params}")
+            
+            try:
+                # 图片按块写入图片存储，不在内存中缓存整张图片
+                image_path = await self.api.call("ai_image", **params)
+            except UpstreamError as e:
+                logger.error(f"AI绘画API返回错误状态码 {e.status}，响应内容：{e.body}")
+                return CommandResult().error(f"AI绘画失败：服务器错误 (HTTP {e.status})")
+            except MediaTypeError as e:
+                error_text = e.preview.decode("utf-8", errors="replace")
+                logger.error(f"AI绘画API返回了非图片内容，Content-Type: {e.content_type}，响应内容：{error_text}")
+                return CommandResult().error(f"AI绘画失败：服务器返回了无效的数据格式")
+            except MediaError as e:
+                logger.error(f"AI绘画图片下载失败：{e}")
+                return CommandResult().error(f"AI绘画失败：{e}")
+            
+            # 记录响应时间
+            response_time = time.time() - start_time
+            logger.info(f"AI绘画API响应时间：{response_time:.2f}秒")
+            logger.info(f"AI绘画成功，图片大小：{self.media.size_of(image_path)} 字节")
+            image_path = await self.encoder.encode_file("ai_image", image_path)
+            
+            return CommandResult().file_image(image_path)
                 
-                async with session.get(api_url, params=params) as resp:
-                    # 记录响应时间
-                    response_time = time.time() - start_time
-                    logger.info(f"AI绘画API响应时间：{response_time:.2f}秒，状态码：{resp.status}")
-                    
-                    if resp.status != 200:
-                        error_text = await resp.text()
-                        logger.error(f"AI绘画API返回错误状态码 {resp.status}，响应内容：{error_text}")
-                        return CommandResult().error(f"AI绘画失败：服务器错误 (HTTP {resp.status})")
-                    
-                    # 检查响应内容类型
-                    content_type = resp.headers.get('content-type', '')
-                    if 'image' not in content_type:
-                        error_text = await resp.text()
-                        logger.error(f"AI绘画API返回了非图片内容，Content-Type: {content_type}，响应内容：{error_text}")
-                        return CommandResult().error(f"AI绘画失败：服务器返回了无效的数据格式")
-                    
-                    # 直接读取图片数据
-                    image_data = await resp.read()
-                    
-                    # 检查图片数据大小
-                    if len(image_data) == 0:
-                        logger.error("AI绘画API返回了空的图片数据")
-                        return CommandResult().error("AI绘画失败：服务器返回了空的图片数据")
-                    
-                    logger.info(f"AI绘画成功，图片大小：{len(image_data)} 字节")
-                    
-                    # 保存图片到本地
-                    try:
-                        with open("ai_generated_image.jpg", "wb") as f:
-                            f.write(image_data)
-                        return CommandResult().file_image("ai_generated_image.jpg")
-                    except Exception as e:
-                        logger.error(f"保存AI绘画图片失败：{e}")
-                        return CommandResult().error(f"保存AI绘画图片失败: {e}")
-                        
         except aiohttp.ClientError as e:
             logger.error(f"网络连接错误：{e}")
             return CommandResult().error("无法连接到AI绘画服务器，请稍后重试或检查网络连接")
@@ -2162,3 +2187,27 @@ class Main(Star):
         except Exception as e:
             logger.error(f"AI绘画时发生错误：{e}")
             return CommandResult().error(f"AI绘画失败：{str(e)}")
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("插件状态")
+    async def plugin_status(self, message: AstrMessageEvent):
+        """查看插件网络请求统计与熔断状态（管理员）"""
+        output = "【上游接口】\n"
+        output += self.api.describe_stats()
+        output += "\n\n【熔断状态】\n"
+        output += self.api.breakers.describe()
+        output += "\n\n【搜番消息监听】\n" + self.describe_listener()
+        output += "\n\n【搜番缓存】\n" + self.anime_search_cache.describe()
+        output += "\n\n【识图缓存】\n" + self.recognition_cache.describe()
+        output += "\n\n【MC 服务器查询】\n" + self.mc_pinger.describe()
+        output += "\n\n【随机动漫图片镜像】\n"
+        output += self.moe_mirrors.describe()
+        output += "\n\n【随机图片预取池】\n"
+        output += self.image_pools.describe()
+        output += "\n\n【喜报/悲报缓存】\n"
+        output += self.posters.cache.describe()
+        output += "\n\n【图片编码】\n"
+        output += self.encoder.describe()
+        output += "\n\n【图片存储】\n"
+        output += self.media.describe()
+        return CommandResult().message(output).use_t2i(False)
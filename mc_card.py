@@ -0,0 +1,276 @@
+import asyncio
+import base64
+import io
+import re
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image as PILImage
+from PIL import ImageColor as PILImageColor
+from PIL import ImageDraw as PILImageDraw
+from PIL import ImageFilter as PILImageFilter
+
+from .layout import TextLayout
+from .encoder import FORMAT_EXTS, ImageEncoder
+
+logger = logging.getLogger("astrbot")
+
+CSS_RULE = re.compile(r"([^{}]+)\{([^{}]*)\}")
+CSS_RGBA = re.compile(r"rgba\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*([\d.]+)\s*\)")
+
+# 卡片各元素的样式，取自 templates/mcs.html 中的 CSS
+CardStyle = namedtuple(
+    "CardStyle",
+    [
+        "page_background", "card_background", "radius", "padding", "shadow",
+        "title_size", "title_margin", "text_size", "text_margin", "text_color",
+        "motd_background", "motd_padding", "motd_radius", "motd_margin", "motd_size",
+        "row_size", "row_padding", "icon_size", "icon_margin",
+        "status_size", "online_color", "offline_color",
+    ],
+)
+
+
+def parse_css(html: str) -> dict:
+    """解析模板 <style> 中的规则，返回 选择器 -> {属性: 值}"""
+    match = re.search(r"<style[^>]*>(.*?)</style>", html, re.S)
+    rules: dict = {}
+    for selectors, body in CSS_RULE.findall(match.group(1) if match else ""):
+        props = {}
+        for declaration in body.split(";"):
+            name, sep, value = declaration.partition(":")
+            if sep:
+                props[name.strip()] = value.strip()
+        for selector in selectors.split(","):
+            rules.setdefault(" ".join(selector.split()), {}).update(props)
+    return rules
+
+
+def _px(value, default: int) -> int:
+    """取 CSS 长度的第一个 px 值，其余单位按默认值处理"""
+    match = re.match(r"\s*(-?\d+(?:\.\d+)?)px", value or "")
+    return round(float(match.group(1))) if match else default
+
+
+def _side(value, index: int, default: int) -> int:
+    """取 margin / padding 简写中的一边，index 依次为上、右、下、左"""
+    parts = (value or "").split()
+    if not parts:
+        return default
+    expanded = {1: parts * 4, 2: parts * 2, 3: parts + parts[1:2]}.get(len(parts), parts[:4])
+    return _px(expanded[index], default)
+
+
+def _color(value, default):
+    try:
+        return PILImageColor.getrgb(value) if value else default
+    except ValueError:
+        return default
+
+
+def _shadow(value):
+    """box-shadow: x y blur rgba(...)，返回 (y 偏移, 模糊半径, RGBA 颜色)"""
+    lengths = re.findall(r"-?\d+", (value or "").split("rgba")[0])
+    rgba = CSS_RGBA.search(value or "")
+    if len(lengths) < 3 or rgba is None:
+        return None
+    r, g, b, a = rgba.groups()
+    return int(lengths[1]), int(lengths[2]), (int(r), int(g), int(b), round(float(a) * 255))
+
+
+def load_card_style(html: str) -> CardStyle:
+    rules = parse_css(html)
+
+    def get(selector, prop):
+        return rules.get(selector, {}).get(prop)
+
+    return CardStyle(
+        page_background=_color(get("body", "background-color"), (244, 244, 244)),
+        card_background=_color(get(".card", "background"), (255, 255, 255)),
+        radius=_px(get(".card", "border-radius"), 8),
+        padding=_side(get(".card", "padding"), 0, 20),
+        shadow=_shadow(get(".card", "box-shadow")),
+        title_size=_px(get(".card h1", "font-size"), 32),
+        # margin: 0 0 20px，取下边距
+        title_margin=_side(get(".card h1", "margin"), 2, 20),
+        text_size=_px(get(".card p", "font-size"), 18),
+        text_margin=_side(get(".card p", "margin"), 0, 10),
+        text_color=(0, 0, 0),
+        motd_background=_color(get(".card .motd", "background"), (249, 249, 249)),
+        motd_padding=_side(get(".card .motd", "padding"), 0, 20),
+        motd_radius=_px(get(".card .motd", "border-radius"), 4),
+        motd_margin=_side(get(".card .motd", "margin"), 0, 20),
+        motd_size=_px(get(".card .motd", "font-size"), 20),
+        row_size=_px(get(".card .players", "font-size"), 18),
+        row_padding=_side(get(".card .players", "padding"), 1, 20),
+        icon_size=_px(get(".card .icon img", "max-width"), 150),
+        icon_margin=_px(get(".card .icon", "margin-bottom"), 20),
+        status_size=_px(get(".status", "font-size"), 20),
+        online_color=_color(get(".status.online", "color"), (0, 128, 0)),
+        offline_color=_color(get(".status.offline", "color"), (255, 0, 0)),
+    )
+
+
+class McCardRenderer:
+    """MC 服务器状态卡片渲染器
+
+    按 templates/mcs.html 的布局和样式在本地用 Pillow 绘制状态卡片，不需要远程文转图服务。
+    模板样式只在创建时解析一次，字体、圆形遮罩和默认图标常驻内存；绘制在独立线程中进行。
+    """
+
+    def __init__(
+        self,
+        template_html: str,
+        font_path: str,
+        width: int = 800,
+        max_workers: int = 1,
+        encoder: ImageEncoder = None,
+    ) -> None:
+        self.style = load_card_style(template_html)
+        self.layout = TextLayout(font_path, stroke_width=0)
+        self.width = width
+        self.encoder = encoder
+        # 卡片颜色较少，未配置时保存为 PNG
+        self.profile = encoder.profile("mc_card") if encoder else None
+        self.ext = FORMAT_EXTS[self.profile.format] if self.profile else "png"
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mc-card")
+        size = self.style.icon_size
+        # 4 倍超采样的圆形遮罩，缩小后边缘平滑
+        mask = PILImage.new("L", (size * 4, size * 4), 0)
+        PILImageDraw.Draw(mask).ellipse((0, 0, size * 4 - 1, size * 4 - 1), fill=255)
+        self.icon_mask = mask.resize((size, size), PILImage.LANCZOS)
+        self.default_icon = PILImage.new("RGBA", (size, size), (200, 200, 200, 255))
+
+    def _icon(self, data: dict):
+        icon = data.get("icon")
+        if isinstance(icon, str) and icon.startswith("data:image"):
+            try:
+                raw = base64.b64decode(icon.split(",", 1)[1])
+                with PILImage.open(io.BytesIO(raw)) as img:
+                    return img.convert("RGBA").resize((self.style.icon_size,) * 2, PILImage.LANCZOS)
+            except Exception as e:
+                logger.debug(f"服务器图标解析失败: {e}")
+        return self.default_icon
+
+    def _lines(self, text: str, size: int, max_width: float):
+        metrics = self.layout.metrics(size)
+        return metrics, self.layout.break_lines(text, metrics, max_width)
+
+    def _render(self, data: dict, address: str) -> bytes:
+        style = self.style
+        margin = round(self.width * 0.05)
+        card_width = self.width - margin * 2
+        inner = card_width - style.padding * 2
+        motd = [line.strip() for line in (data.get("motd") or {}).get("clean") or [] if isinstance(line, str)]
+        players = data.get("players") or {}
+        online = bool(data.get("online"))
+        protocol = data.get("protocol_name") or data.get("protocol") or "未知"
+        status = "在线" if online else "离线"
+        latency = (data.get("debug") or {}).get("latency")
+        if online and latency is not None:
+            status += f" {latency:.0f}ms"
+        names = players.get("list") or []
+
+        # 先排版得到每个元素的高度，再一次性绘制
+        blocks = [("icon", style.icon_size + style.icon_margin)]
+        title = self._lines(motd[0] if motd else address, style.title_size, inner)
+        blocks.append(("title", title[0].line_height * len(title[1]) + style.title_margin))
+        motd_lines = self._lines("\n".join(motd[1:]) or " ", style.motd_size, inner - style.motd_padding * 2)
+        motd_height = motd_lines[0].line_height * len(motd_lines[1]) + (style.motd_padding + style.text_margin) * 2
+        blocks.append(("motd", motd_height + style.motd_margin * 2))
+        row_metrics = self.layout.metrics(style.row_size)
+        row_height = row_metrics.line_height + style.text_margin * 2
+        blocks += [("players", row_height), ("version", row_height)]
+        ip_lines = self._lines(f"IP: {data.get('ip', address)}:{data.get('port', '')}".rstrip(":"), style.text_size, inner)
+        blocks.append(("ip", ip_lines[0].line_height * len(ip_lines[1]) + style.text_margin * 2))
+        if names:
+            name_lines = self._lines("在线玩家: " + "、".join(names), style.text_size, inner)
+            blocks.append(("names", name_lines[0].line_height * len(name_lines[1]) + style.text_margin * 2))
+        status_metrics = self.layout.metrics(style.status_size)
+        blocks.append(("status", status_metrics.line_height + style.text_margin * 2))
+
+        card_height = sum(height for _, height in blocks) + style.padding * 2
+        img = PILImage.new("RGB", (self.width, card_height + margin * 2), style.page_background)
+        card_box = (margin, margin, margin + card_width, margin + card_height)
+        if style.shadow:
+            offset, blur, color = style.shadow
+            shadow = PILImage.new("RGBA", img.size, (0, 0, 0, 0))
+            PILImageDraw.Draw(shadow).rounded_rectangle(
+                (card_box[0], card_box[1] + offset, card_box[2], card_box[3] + offset), style.radius, fill=color
+            )
+            shadow = shadow.filter(PILImageFilter.GaussianBlur(blur / 2))
+            img.paste(shadow, (0, 0), shadow)
+        draw = PILImageDraw.Draw(img)
+        draw.rounded_rectangle(card_box, style.radius, fill=style.card_background)
+
+        def centered(lines, metrics, y, fill=style.text_color):
+            for line, width in lines:
+                draw.text((margin + (card_width - width) / 2, y), line, font=metrics.font, fill=fill)
+                y += metrics.line_height
+            return y
+
+        left = margin + style.padding
+        y = margin + style.padding
+        for kind, height in blocks:
+            if kind == "icon":
+                x = margin + (card_width - style.icon_size) // 2
+                img.paste(self._icon(data), (x, y), self.icon_mask)
+            elif kind == "title":
+                centered(title[1], title[0], y)
+            elif kind == "motd":
+                draw.rounded_rectangle(
+                    (left, y + style.motd_margin, left + inner, y + height - style.motd_margin),
+                    style.motd_radius,
+                    fill=style.motd_background,
+                )
+                centered(motd_lines[1], motd_lines[0], y + style.motd_margin + style.motd_padding + style.text_margin)
+            elif kind in ("players", "version"):
+                if kind == "players":
+                    pair = (f"在线玩家: {players.get('online', '-')}", f"最大玩家: {players.get('max', '-')}")
+                else:
+                    pair = (f"版本: {data.get('version', '未知')}", f"协议: {protocol}")
+                text_y = y + style.text_margin
+                draw.text((left + style.row_padding, text_y), pair[0], font=row_metrics.font, fill=style.text_color)
+                right_width = row_metrics.width(pair[1])
+                draw.text(
+                    (left + inner - style.row_padding - right_width, text_y),
+                    pair[1],
+                    font=row_metrics.font,
+                    fill=style.text_color,
+                )
+            elif kind == "ip":
+                centered(ip_lines[1], ip_lines[0], y + style.text_margin)
+            elif kind == "names":
+                centered(name_lines[1], name_lines[0], y + style.text_margin)
+            elif kind == "status":
+                color = style.online_color if online else style.offline_color
+                width = status_metrics.width(status)
+                # font-weight: bold，用同色描边加粗
+                draw.text(
+                    (margin + (card_width - width) / 2, y + style.text_margin),
+                    status,
+                    font=status_metrics.font,
+                    fill=color,
+                    stroke_width=1,
+                    stroke_fill=color,
+                )
+            y += height
+
+        if self.profile is None:
+            buf = io.BytesIO()
+            img.save(buf, format="PNG", optimize=True)
+            result = buf.getvalue()
+        else:
+            result = ImageEncoder.encode_image(img, self.profile)
+        if self.encoder:
+            self.encoder.record("mc_card", 0, len(result))
+        return result
+
+    async def render(self, data: dict, address: str) -> bytes:
+        """绘制服务器状态卡片，返回图片字节"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._render, data, address)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import re
+import struct
+import time
+import logging
+
+logger = logging.getLogger("astrbot")
+
+# SRV 解析是可选功能：优先使用 aiodns，其次 dnspython，都没有安装时直接连接默认端口
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
+try:
+    import dns.asyncresolver as dns_asyncresolver
+except ImportError:
+    dns_asyncresolver = None
+
+DEFAULT_PORT = 25565
+# 握手时使用的协议号，-1 表示只查询状态，服务器会返回自己的协议号
+STATUS_PROTOCOL = -1
+# 状态 JSON 的长度上限，整合包的模组列表可能较长，图标约几十 KB
+MAX_PACKET_SIZE = 2 * 1024 * 1024
+
+FORMAT_CODE = re.compile("§.", re.S)
+
+
+class MinecraftPingError(Exception):
+    """服务器没有按协议返回状态，调用方可以改用第三方接口查询"""
+
+
+def parse_address(address: str):
+    """解析 host[:port]，支持 [IPv6]:port；没有端口时返回 None"""
+    address = address.strip()
+    if address.startswith("["):
+        host, _, rest = address[1:].partition("]")
+        port = rest[1:] if rest.startswith(":") else ""
+    elif address.count(":") == 1:
+        host, port = address.split(":")
+    else:
+        host, port = address, ""
+    if not host:
+        raise ValueError("服务器地址为空")
+    if port:
+        if not port.isdigit() or not 0 < int(port) < 65536:
+            raise ValueError(f"端口无效：{port}")
+        return host, int(port)
+    return host, None
+
+
+def pack_varint(value: int) -> bytes:
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def pack_string(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return pack_varint(len(data)) + data
+
+
+def pack_packet(packet_id: int, payload: bytes = b"") -> bytes:
+    body = pack_varint(packet_id) + payload
+    return pack_varint(len(body)) + body
+
+
+def unpack_varint(data: bytes, offset: int = 0):
+    """从 data[offset:] 读取 VarInt，返回 (值, 新偏移)"""
+    value = 0
+    for shift in range(0, 35, 7):
+        if offset >= len(data):
+            raise MinecraftPingError("数据包不完整")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            if value & 0x80000000:
+                value -= 1 << 32
+            return value, offset
+    raise MinecraftPingError("VarInt 过长")
+
+
+async def read_varint(reader: asyncio.StreamReader) -> int:
+    value = 0
+    for shift in range(0, 35, 7):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value
+    raise MinecraftPingError("VarInt 过长")
+
+
+async def read_packet(reader: asyncio.StreamReader):
+    """读取一个未压缩的数据包，返回 (包 ID, 包体)"""
+    length = await read_varint(reader)
+    if not 0 < length <= MAX_PACKET_SIZE:
+        raise MinecraftPingError(f"数据包长度异常：{length}")
+    data = await reader.readexactly(length)
+    packet_id, offset = unpack_varint(data)
+    return packet_id, data[offset:]
+
+
+def chat_to_text(component) -> str:
+    """把 MOTD 的聊天组件展开成带 § 格式码的文本"""
+    if isinstance(component, str):
+        return component
+    if isinstance(component, list):
+        return "".join(chat_to_text(c) for c in component)
+    if not isinstance(component, dict):
+        return ""
+    text = str(component.get("text", ""))
+    for extra in component.get("extra", []):
+        text += chat_to_text(extra)
+    return text
+
+
+def to_mcsrvstat(status: dict, host: str, port: int, hostname: str, latency: float, srv: bool) -> dict:
+    """转换为与 mcsrvstat.us v2 接口相同的结构，指令和模板不需要区分数据来源"""
+    raw = chat_to_text(status.get("description", ""))
+    raw_lines = raw.split("\n")
+    clean_lines = [FORMAT_CODE.sub("", line) for line in raw_lines]
+    players = status.get("players") or {}
+    version = status.get("version") or {}
+    data = {
+        "online": True,
+        "ip": host,
+        "port": port,
+        "hostname": hostname,
+        "motd": {"raw": raw_lines, "clean": clean_lines},
+        "players": {
+            "online": int(players.get("online", 0)),
+            "max": int(players.get("max", 0)),
+        },
+        "version": FORMAT_CODE.sub("", str(version.get("name", ""))),
+        "protocol": version.get("protocol"),
+        "debug": {"ping": True, "srv": srv, "latency": round(latency, 1), "source": "native"},
+    }
+    names = [
+        p["name"] for p in players.get("sample") or []
+        if isinstance(p, dict) and isinstance(p.get("name"), str)
+    ]
+    if names:
+        data["players"]["list"] = names
+    if isinstance(status.get("favicon"), str):
+        data["icon"] = status["favicon"]
+    return data
+
+
+class MinecraftPinger:
+    """Minecraft Java 版服务器列表协议（Server List Ping）客户端
+
+    直接与服务器握手并请求状态，再发送一次 Ping 测量延迟，不经过第三方接口。
+    没有指定端口时先查询 _minecraft._tcp SRV 记录（需要安装 aiodns 或 dnspython）。
+    """
+
+    def __init__(self, timeout: float = 5.0, srv_timeout: float = 2.0) -> None:
+        self.timeout = timeout
+        self.srv_timeout = srv_timeout
+        self.queries = 0
+        self.failures = 0
+        self.total_latency = 0.0
+        self._resolver = None
+
+    async def resolve_srv(self, host: str):
+        """返回 SRV 记录指向的 (主机, 端口)，没有记录或无法解析时返回 None"""
+        name = f"_minecraft._tcp.{host}"
+        try:
+            if aiodns is not None:
+                if self._resolver is None:
+                    self._resolver = aiodns.DNSResolver()
+                records = await asyncio.wait_for(self._resolver.query(name, "SRV"), self.srv_timeout)
+                if records:
+                    best = min(records, key=lambda r: (r.priority, -r.weight))
+                    return best.host.rstrip("."), best.port
+            elif dns_asyncresolver is not None:
+                answer = await asyncio.wait_for(dns_asyncresolver.resolve(name, "SRV"), self.srv_timeout)
+                best = min(answer, key=lambda r: (r.priority, -r.weight))
+                return best.target.to_text().rstrip("."), best.port
+        except Exception:
+            # 没有 SRV 记录是最常见的情况，直接使用默认端口
+            pass
+        return None
+
+    async def status(self, address: str) -> dict:
+        """查询服务器状态，返回 mcsrvstat 格式的字典
+
+        地址格式错误时抛出 ValueError，服务器无法连接或返回的数据不符合协议时抛出 MinecraftPingError。
+        """
+        hostname, port = parse_address(address)
+        self.queries += 1
+        try:
+            host, srv = hostname, False
+            if port is None:
+                target = await self.resolve_srv(hostname)
+                if target is not None:
+                    (host, port), srv = target, True
+                else:
+                    port = DEFAULT_PORT
+            status, latency = await asyncio.wait_for(self._query(host, port, hostname), self.timeout)
+            data = to_mcsrvstat(status, host, port, hostname, latency, srv)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            raise MinecraftPingError("连接超时")
+        except (OSError, asyncio.IncompleteReadError, ValueError, TypeError) as e:
+            self.failures += 1
+            raise MinecraftPingError(f"连接失败：{e}")
+        except MinecraftPingError:
+            self.failures += 1
+            raise
+        self.total_latency += latency
+        return data
+
+    async def _query(self, host: str, port: int, hostname: str):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            handshake = (
+                pack_varint(STATUS_PROTOCOL) + pack_string(hostname) + struct.pack(">H", port) + pack_varint(1)
+            )
+            start = time.perf_counter()
+            writer.write(pack_packet(0x00, handshake) + pack_packet(0x00))
+            await writer.drain()
+            packet_id, body = await read_packet(reader)
+            latency = (time.perf_counter() - start) * 1000
+            if packet_id != 0x00:
+                raise MinecraftPingError(f"意外的数据包：{packet_id}")
+            length, offset = unpack_varint(body)
+            status = json.loads(body[offset:offset + length].decode("utf-8"))
+            if not isinstance(status, dict):
+                raise MinecraftPingError("状态数据格式错误")
+
+            # 状态已经拿到，Ping 失败（部分代理服务器不响应）时用状态请求的耗时作为延迟
+            start = time.perf_counter()
+            try:
+                payload = struct.pack(">q", int(time.time() * 1000))
+                writer.write(pack_packet(0x01, payload))
+                await writer.drain()
+                packet_id, body = await asyncio.wait_for(read_packet(reader), self.timeout / 2)
+                if packet_id != 0x01 or body != payload:
+                    raise MinecraftPingError("Pong 数据不匹配")
+                latency = (time.perf_counter() - start) * 1000
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, MinecraftPingError) as e:
+                logger.debug(f"{hostname} 未响应 Ping: {e}")
+            return status, latency
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def describe(self) -> str:
+        if not self.queries:
+            return "暂无查询"
+        succeeded = self.queries - self.failures
+        avg = self.total_latency / succeeded if succeeded else 0
+        return (
+            f"直连查询 {self.queries} 次，失败 {self.failures} 次（已改用 mcsrvstat），"
+            f"平均延迟 {avg:.0f}ms"
+        )
@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger("astrbot")
+
+# 流式下载时允许的 Content-Type，部分图床不返回类型或返回 octet-stream
+ALLOWED_CONTENT_TYPES = ("image/", "application/octet-stream", "binary/octet-stream")
+
+
+class MediaError(Exception):
+    """下载的内容不是可用的图片，异常信息可以直接展示给用户"""
+
+
+class MediaTypeError(MediaError):
+    """响应不是图片，preview 为响应体开头部分，便于解析接口返回的错误 JSON"""
+
+    def __init__(self, content_type: str, preview: bytes = b"") -> None:
+        super().__init__(f"服务器返回的不是图片（{content_type or '未知类型'}）")
+        self.content_type = content_type
+        self.preview = preview
+
+
+class MediaTooLargeError(MediaError):
+    def __init__(self, limit: int) -> None:
+        super().__init__(f"图片超过 {limit / 1024 / 1024:.0f}MB 大小限制")
+        self.limit = limit
+
+
+class MediaStore:
+    """按内容哈希命名的图片存储
+
+    文件名为内容的 sha256，相同图片在磁盘上只保存一份，并发请求之间不会互相覆盖。
+    按最近使用顺序记录文件，超过总字节上限时由后台 GC 删除最久未使用的文件。
+    交给消息平台的文件在 grace_period 秒内不会被删除，保证发送完成前文件仍然存在；
+    被 pin 的文件（例如预取池中尚未发出的图片）不会被删除。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        byte_budget: int = 128 * 1024 * 1024,
+        grace_period: float = 300,
+        gc_interval: float = 300,
+        max_download_bytes: int = 20 * 1024 * 1024,
+        chunk_size: int = 64 * 1024,
+    ) -> None:
+        self.directory = os.path.abspath(directory)
+        self.byte_budget = byte_budget
+        self.grace_period = grace_period
+        self.gc_interval = gc_interval
+        self.max_download_bytes = max_download_bytes
+        self.chunk_size = chunk_size
+        # 文件名 -> [大小, 最近使用时间]，按最近使用排序
+        self.entries: OrderedDict = OrderedDict()
+        self.pins: dict = {}
+        self.bytes = 0
+        self.writes = 0
+        self.dedup_hits = 0
+        self.evicted = 0
+        self.downloaded_bytes = 0
+        self.download_time = 0.0
+        self._gc_task = None
+        self._closed = False
+        os.makedirs(self.directory, exist_ok=True)
+        # 接管上次运行留下的文件，按修改时间恢复使用顺序
+        existing = []
+        for name in os.listdir(self.directory):
+            file_path = self.path_of(name)
+            if name.endswith(".tmp"):
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+                continue
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            existing.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(existing):
+            # 旧文件不需要发送保护期
+            self.entries[name] = [size, -grace_period]
+            self.bytes += size
+
+    def path_of(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def digest_of(path: str) -> str:
+        """存储中文件的内容 sha256，即去掉扩展名的文件名"""
+        return os.path.splitext(os.path.basename(path))[0]
+
+    async def put(self, data: bytes, ext: str = "jpg") -> str:
+        """保存图片并返回绝对路径；内容相同的图片直接复用已有文件"""
+        name = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        entry = self.entries.get(name)
+        if entry is not None and os.path.exists(self.path_of(name)):
+            self.dedup_hits += 1
+            self.touch(name)
+            return self.path_of(name)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_file, self.path_of(name), data)
+        return self._add_entry(name, len(data))
+
+    def _add_entry(self, name: str, size: int) -> str:
+        if name not in self.entries:
+            self.bytes += size
+        self.entries[name] = [size, time.monotonic()]
+        self.entries.move_to_end(name)
+        self.writes += 1
+        self._ensure_gc()
+        if self.bytes > self.byte_budget * 1.5:
+            # 短时间内写入过多时不等后台 GC，立即清理
+            self.collect()
+        return self.path_of(name)
+
+    async def put_stream(self, resp, ext: str = "jpg") -> str:
+        """把 aiohttp 响应体按块写入存储并返回路径
+
+        边下载边计算哈希，内存占用只有一个块的大小；先检查 Content-Type，
+        超过 max_download_bytes 时立即中止，写完后才以哈希名提交。
+        """
+        content_type = resp.headers.get("Content-Type", "")
+        if content_type and not content_type.lower().startswith(ALLOWED_CONTENT_TYPES):
+            raise MediaTypeError(content_type, await resp.content.read(4096))
+        limit = self.max_download_bytes
+        if resp.content_length is not None and resp.content_length > limit:
+            raise MediaTooLargeError(limit)
+
+        loop = asyncio.get_running_loop()
+        digest = hashlib.sha256()
+        tmp_path = self.path_of(f"{uuid.uuid4().hex}.tmp")
+        f = await loop.run_in_executor(None, open, tmp_path, "wb")
+        size = 0
+        start = time.monotonic()
+        try:
+            try:
+                async for chunk in resp.content.iter_chunked(self.chunk_size):
+                    size += len(chunk)
+                    if size > limit:
+                        raise MediaTooLargeError(limit)
+                    digest.update(chunk)
+                    await loop.run_in_executor(None, f.write, chunk)
+            finally:
+                f.close()
+            if size == 0:
+                raise MediaError("服务器返回了空的图片数据")
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        elapsed = time.monotonic() - start
+        self.downloaded_bytes += size
+        self.download_time += elapsed
+        logger.info(
+            f"下载图片 {size / 1024:.0f}KB，耗时 {elapsed:.2f}s，"
+            f"{size / 1024 / max(elapsed, 0.001):.0f}KB/s"
+        )
+
+        name = f"{digest.hexdigest()}.{ext}"
+        if name in self.entries and os.path.exists(self.path_of(name)):
+            os.remove(tmp_path)
+            self.dedup_hits += 1
+            self.touch(name)
+            return self.path_of(name)
+        os.replace(tmp_path, self.path_of(name))
+        return self._add_entry(name, size)
+
+    def size_of(self, name_or_path: str) -> int:
+        entry = self.entries.get(os.path.basename(name_or_path))
+        return entry[0] if entry is not None else 0
+
+    @staticmethod
+    def _write_file(file_path: str, data: bytes):
+        # 先写临时文件再改名，避免其他请求读到写了一半的文件
+        tmp_path = f"{file_path}.{os.getpid()}.{id(data)}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+
+    def touch(self, name_or_path: str):
+        """标记文件刚被使用，重新开始发送保护期"""
+        name = os.path.basename(name_or_path)
+        entry = self.entries.get(name)
+        if entry is not None:
+            entry[1] = time.monotonic()
+            self.entries.move_to_end(name)
+
+    def pin(self, name_or_path: str):
+        name = os.path.basename(name_or_path)
+        self.pins[name] = self.pins.get(name, 0) + 1
+
+    def unpin(self, name_or_path: str):
+        """取消 pin，并从此刻开始计算发送保护期"""
+        name = os.path.basename(name_or_path)
+        count = self.pins.get(name, 0) - 1
+        if count > 0:
+            self.pins[name] = count
+        else:
+            self.pins.pop(name, None)
+        self.touch(name)
+
+    def _ensure_gc(self):
+        if self._closed:
+            return
+        if self._gc_task is None or self._gc_task.done():
+            self._gc_task = asyncio.ensure_future(self._gc_loop())
+
+    async def _gc_loop(self):
+        while not self._closed:
+            await asyncio.sleep(self.gc_interval)
+            try:
+                self.collect()
+            except Exception as e:
+                logger.warning(f"清理图片缓存失败: {e}")
+
+    def collect(self) -> int:
+        """按最近使用顺序删除文件直到低于字节上限，返回删除的文件数"""
+        if self.bytes <= self.byte_budget:
+            return 0
+        now = time.monotonic()
+        removed = 0
+        for name in list(self.entries):
+            if self.bytes <= self.byte_budget:
+                break
+            size, last_used = self.entries[name]
+            if name in self.pins or now - last_used < self.grace_period:
+                continue
+            try:
+                os.remove(self.path_of(name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除缓存图片 {name} 失败: {e}")
+                continue
+            del self.entries[name]
+            self.bytes -= size
+            removed += 1
+        self.evicted += removed
+        return removed
+
+    def describe(self) -> str:
+        """返回存储状态的可读文本"""
+        return (
+            f"{len(self.entries)} 个文件，{self.bytes / 1024 / 1024:.1f}MB / {self.byte_budget / 1024 / 1024:.0f}MB，"
+            f"写入 {self.writes} 次，去重命中 {self.dedup_hits} 次，已清理 {self.evicted} 个\n"
+            f"流式下载 {self.downloaded_bytes / 1024 / 1024:.1f}MB，"
+            f"平均 {self.downloaded_bytes / 1024 / max(self.download_time, 0.001):.0f}KB/s"
+        )
+
+    async def close(self):
+        self._closed = True
+        if self._gc_task is not None and not self._gc_task.done():
+            self._gc_task.cancel()
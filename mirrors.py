@@ -0,0 +1,142 @@
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger("astrbot")
+
+
+class MirrorStats:
+    """单个镜像的 EWMA 延迟与成功率"""
+
+    __slots__ = ("url", "latency", "success", "samples")
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.latency = 0.0
+        self.success = 1.0
+        self.samples = 0
+
+    @property
+    def score(self) -> float:
+        # 越小越好：延迟按成功率放大，从未请求过的镜像优先尝试一次
+        if self.samples == 0:
+            return 0.0
+        return (self.latency + 0.05) / max(self.success, 0.05)
+
+
+class MirrorSet:
+    """一组等价镜像的对冲请求
+
+    按 EWMA 排名先请求最快的镜像，若 hedge_delay 内没有返回则再并发请求下一个，
+    任一镜像失败也会立即换下一个；取最先成功的结果并取消其余请求。
+    """
+
+    def __init__(
+        self,
+        urls: list,
+        alpha: float = 0.3,
+        hedge_delay: float = 0.8,
+        min_hedge_delay: float = 0.3,
+        max_hedge_delay: float = 2.0,
+    ) -> None:
+        self.stats = {url: MirrorStats(url) for url in urls}
+        self.alpha = alpha
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+
+    def ranked(self) -> list:
+        return sorted(self.stats.values(), key=lambda s: s.score)
+
+    def record(self, url: str, ok: bool, elapsed: float):
+        stats = self.stats[url]
+        if stats.samples == 0:
+            stats.latency = elapsed
+            stats.success = 1.0 if ok else 0.0
+        else:
+            if ok:
+                stats.latency += self.alpha * (elapsed - stats.latency)
+            stats.success += self.alpha * ((1.0 if ok else 0.0) - stats.success)
+        stats.samples += 1
+
+    def record_cancelled(self, url: str, elapsed: float):
+        """被对冲取消的请求只知道延迟下界，仅在比当前估计更慢时计入延迟"""
+        stats = self.stats[url]
+        if stats.samples == 0:
+            stats.latency = elapsed
+            stats.samples = 1
+        elif elapsed > stats.latency:
+            stats.latency += self.alpha * (elapsed - stats.latency)
+
+    def describe(self) -> str:
+        """返回镜像排名的可读文本"""
+        lines = []
+        for stats in self.ranked():
+            if stats.samples == 0:
+                lines.append(f"{stats.url}：暂无数据")
+            else:
+                lines.append(
+                    f"{stats.url}：延迟 {stats.latency * 1000:.0f}ms，成功率 {stats.success:.0%}"
+                )
+        return "\n".join(lines)
+
+    def current_hedge_delay(self, best: MirrorStats) -> float:
+        """对冲延迟跟随最快镜像的 EWMA 延迟"""
+        if best.samples == 0:
+            return self.hedge_delay
+        return min(max(best.latency * 1.5, self.min_hedge_delay), self.max_hedge_delay)
+
+    async def _timed(self, url: str, fetch_one):
+        start = time.monotonic()
+        try:
+            result = await fetch_one(url)
+        except asyncio.CancelledError:
+            self.record_cancelled(url, time.monotonic() - start)
+            raise
+        except Exception:
+            self.record(url, False, time.monotonic() - start)
+            raise
+        self.record(url, True, time.monotonic() - start)
+        return result
+
+    async def fetch(self, fetch_one):
+        """对冲请求所有镜像，fetch_one(url) 失败时应抛出异常
+
+        返回 (url, 结果)；全部失败时抛出最后一个异常。
+        """
+        order = self.ranked()
+        hedge_delay = self.current_hedge_delay(order[0])
+        pending = {}
+        next_index = 0
+        last_error = None
+
+        def launch():
+            nonlocal next_index
+            url = order[next_index].url
+            next_index += 1
+            task = asyncio.ensure_future(self._timed(url, fetch_one))
+            pending[task] = url
+
+        try:
+            launch()
+            while pending:
+                timeout = hedge_delay if next_index < len(order) else None
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # 当前镜像太慢，对冲请求下一个
+                    launch()
+                    continue
+                for task in done:
+                    url = pending.pop(task)
+                    if task.exception() is None:
+                        return url, task.result()
+                    last_error = task.exception()
+                    logger.warning(f"从 {url} 获取失败: {last_error}，正在尝试下一个镜像。")
+                    if next_index < len(order):
+                        launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error
@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import logging
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image as PILImage
+from PIL import ImageDraw as PILImageDraw
+
+from .layout import TextLayout
+from .encoder import FORMAT_EXTS, ImageEncoder
+
+logger = logging.getLogger("astrbot")
+
+# 喜报 / 悲报模板：背景图文件名、文字颜色、描边颜色、文字区域 (x, y, 宽, 高)
+PosterStyle = namedtuple("PosterStyle", ["background", "fill", "stroke_fill", "box"])
+
+POSTER_STYLES = {
+    "congrats": PosterStyle("congrats.jpg", (255, 0, 0), (255, 255, 0), (40, 200, 1305, 700)),
+    "uncongrats": PosterStyle("uncongrats.jpg", (0, 0, 0), (255, 255, 255), (40, 200, 1305, 700)),
+}
+
+
+class PosterCache:
+    """渲染结果的两级 LRU 缓存
+
+    内存中保存最近使用的 JPEG 字节，磁盘上按缓存键的哈希保存文件，插件重启后仍然有效；
+    两级分别按字节上限淘汰最久未使用的条目。磁盘读写由调用方放到线程池中执行。
+    """
+
+    def __init__(self, directory: str, memory_budget: int = 16 * 1024 * 1024, disk_budget: int = 64 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.memory: OrderedDict = OrderedDict()
+        self.memory_bytes = 0
+        # 文件名 -> 大小，按最近使用排序
+        self.disk: OrderedDict = OrderedDict()
+        self.disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        existing = []
+        for name in os.listdir(directory):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                st = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            existing.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(existing):
+            self.disk[name] = size
+            self.disk_bytes += size
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+    def get_memory(self, key: str):
+        with self._lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+            return data
+
+    def get_disk(self, key: str):
+        """读取磁盘缓存，命中时提升到内存"""
+        name = f"{key}.jpg"
+        with self._lock:
+            if name not in self.disk:
+                self.misses += 1
+                return None
+            self.disk.move_to_end(name)
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.disk_bytes -= self.disk.pop(name, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        self._put_memory(key, data)
+        return data
+
+    def _put_memory(self, key: str, data: bytes):
+        with self._lock:
+            if key in self.memory:
+                return
+            self.memory[key] = data
+            self.memory_bytes += len(data)
+            while self.memory_bytes > self.memory_budget and len(self.memory) > 1:
+                _, old = self.memory.popitem(last=False)
+                self.memory_bytes -= len(old)
+
+    def put(self, key: str, data: bytes):
+        self._put_memory(key, data)
+        name = f"{key}.jpg"
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.disk_bytes += len(data) - self.disk.get(name, 0)
+            self.disk[name] = len(data)
+            self.disk.move_to_end(name)
+            evict = []
+            while self.disk_bytes > self.disk_budget and len(self.disk) > 1:
+                old, size = self.disk.popitem(last=False)
+                self.disk_bytes -= size
+                evict.append(old)
+        for old in evict:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except OSError:
+                pass
+
+    def describe(self) -> str:
+        total = self.memory_hits + self.disk_hits + self.misses
+        hit_rate = (self.memory_hits + self.disk_hits) / total if total else 0
+        return (
+            f"命中率 {hit_rate:.0%}（内存 {self.memory_hits} 次，磁盘 {self.disk_hits} 次，未命中 {self.misses} 次）\n"
+            f"内存 {len(self.memory)} 张 {self.memory_bytes / 1024 / 1024:.1f}MB，"
+            f"磁盘 {len(self.disk)} 张 {self.disk_bytes / 1024 / 1024:.1f}MB"
+        )
+
+
+class PosterRenderer:
+    """喜报 / 悲报渲染器
+
+    背景图和字体只解码一次并常驻内存，每次渲染复制背景后绘制；
+    绘制和 JPEG 编码在有界线程池中执行，不阻塞事件循环。
+    相同模板、文字和渲染参数的结果会被缓存，重复的内容不再重新绘制。
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        cache_dir: str,
+        font_file: str = "simhei.ttf",
+        font_size: int = 65,
+        min_font_size: int = 24,
+        max_workers: int = 2,
+        max_pending: int = 16,
+        encoder: ImageEncoder = None,
+    ) -> None:
+        self.base_dir = base_dir
+        self.font_file = font_file
+        self.font_size = font_size
+        self.min_font_size = min_font_size
+        self.encoder = encoder
+        # 输出编码配置，未配置时与以前一样保存为默认质量的 JPEG
+        self.profile = encoder.profile("poster") if encoder else None
+        self.ext = FORMAT_EXTS[self.profile.format] if self.profile else "jpg"
+        self.layout = TextLayout(
+            os.path.join(base_dir, font_file), max_size=font_size, min_size=min_font_size
+        )
+        self.cache = PosterCache(cache_dir)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="poster")
+        # 限制排队中的渲染任务数，突发请求在事件循环上等待而不是堆积在线程池队列里
+        self.pending = asyncio.Semaphore(max_pending)
+        self._backgrounds: dict = {}
+        self._load_lock = threading.Lock()
+        # 缓存键 -> 正在渲染的任务，刷屏时相同内容只渲染一次
+        self._inflight: dict = {}
+        # 在线程池中预加载，加载失败时留到渲染时再报错
+        self.executor.submit(self._warm_up)
+
+    def _warm_up(self):
+        try:
+            self.layout.metrics(self.font_size)
+            for name in POSTER_STYLES:
+                self._get_background(name)
+        except Exception as e:
+            logger.warning(f"预加载喜报资源失败: {e}")
+
+    def _get_background(self, name: str):
+        bg = self._backgrounds.get(name)
+        if bg is None:
+            with self._load_lock:
+                bg = self._backgrounds.get(name)
+                if bg is None:
+                    bg = PILImage.open(os.path.join(self.base_dir, POSTER_STYLES[name].background))
+                    bg.load()
+                    self._backgrounds[name] = bg
+        return bg
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """去掉首尾空白，把每行内连续的空白合并为一个空格，保留换行"""
+        return "\n".join(" ".join(line.split()) for line in text.strip().splitlines())
+
+    def _render(self, name: str, text: str) -> bytes:
+        style = POSTER_STYLES[name]
+        img = self._get_background(name).copy()
+        draw = PILImageDraw.Draw(img)
+        self.layout.draw(draw, style.box, text, style.fill, style.stroke_fill)
+
+        if self.profile is None:
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG")
+            data = buf.getvalue()
+        else:
+            data = ImageEncoder.encode_image(img, self.profile)
+        if self.encoder:
+            self.encoder.record("poster", 0, len(data))
+        return data
+
+    def _render_cached(self, name: str, text: str, key: str) -> bytes:
+        data = self.cache.get_disk(key)
+        if data is None:
+            data = self._render(name, text)
+            self.cache.put(key, data)
+        return data
+
+    async def render(self, name: str, text: str) -> bytes:
+        """渲染指定模板并返回 JPEG 字节"""
+        text = self.normalize(text)
+        key = PosterCache.make_key(
+            name, POSTER_STYLES[name], self.font_file, self.font_size, self.min_font_size, self.profile, text
+        )
+        data = self.cache.get_memory(key)
+        if data is not None:
+            return data
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render_in_pool(name, text, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _render_in_pool(self, name: str, text: str, key: str) -> bytes:
+        async with self.pending:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._render_cached, name, text, key)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import time
+import logging
+
+from .image_hash import dhash_file
+
+logger = logging.getLogger("astrbot")
+
+
+class AnimeSearchCache:
+    """以图搜番结果缓存
+
+    图片按 dHash 索引，汉明距离不超过 max_distance 的截图视为同一张图，
+    直接返回之前 trace.moe 的结果，只有真正没见过的图片才会请求接口。
+    缓存保存在插件数据库中，重启后仍然有效，超过 max_entries 条时淘汰最久未使用的。
+    “没有找到番剧”的结果只在 negative_ttl 秒内有效，之后重新请求接口。
+    """
+
+    def __init__(self, store, max_distance: int = 6, max_entries: int = 5000, negative_ttl: int = 600) -> None:
+        self.store = store
+        self.negative_ttl = negative_ttl
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def hash_file(self, path: str):
+        """在线程池中计算图片 dHash，图片无法解码时返回 None"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, dhash_file, path)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"计算图片哈希失败: {e}")
+            return None
+
+    async def get(self, phash: int):
+        """返回 (命中, 结果, 缓存时间)；结果为 trace.moe 的最佳匹配，没有匹配时为 None"""
+        try:
+            found = await self.store.find_anime_search(phash, self.max_distance, int(time.time()))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"读取搜番缓存失败: {e}")
+            found = None
+        if found is not None and found[0] is None and time.time() - found[2] > self.negative_ttl:
+            found = None
+        if found is None:
+            self.misses += 1
+            return False, None, 0
+        self.hits += 1
+        result, distance, created_ts = found
+        logger.debug(f"搜番缓存命中，汉明距离 {distance}")
+        return True, json.loads(result) if result else None, created_ts
+
+    async def put(self, phash: int, top):
+        try:
+            await self.store.save_anime_search(
+                phash, json.dumps(top, ensure_ascii=False) if top else None, int(time.time()), self.max_entries
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"保存搜番缓存失败: {e}")
+
+    def describe(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0
+        return f"命中率 {hit_rate:.0%}（命中 {self.hits} 次，未命中 {self.misses} 次，出错 {self.errors} 次）"
+
+
+class RecognitionCache:
+    """AI 识图结果缓存
+
+    图片下载到按 sha256 命名的图片存储后，文件名就是内容哈希，
+    以此为键保存识图接口的结果；同一张图片再次识别时直接返回，不再请求接口。
+    缓存保存在插件数据库中，超过 max_entries 条时淘汰最久未使用的。
+    """
+
+    def __init__(self, store, max_entries: int = 2000) -> None:
+        self.store = store
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, digest: str):
+        """返回 (msg, result)，未命中返回 None"""
+        try:
+            found = await self.store.find_recognition(digest, int(time.time()))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"读取识图缓存失败: {e}")
+            found = None
+        if found is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return found
+
+    async def put(self, digest: str, msg: str, result: str):
+        try:
+            await self.store.save_recognition(digest, msg, result, int(time.time()), self.max_entries)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"保存识图缓存失败: {e}")
+
+    def describe(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0
+        return f"命中率 {hit_rate:.0%}（命中 {self.hits} 次，未命中 {self.misses} 次，出错 {self.errors} 次）"
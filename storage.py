@@ -0,0 +1,675 @@
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .image_hash import hamming, hash_bands, to_signed, to_unsigned
+
+logger = logging.getLogger("astrbot")
+
+# 早晚安按 UTC+8 划分日期
+UTC8_OFFSET = 8 * 3600
+
+
+# 认为合理的一次睡眠时长上限，超过的视为忘记说早安，不计入统计
+MAX_SLEEP_SECONDS = 16 * 3600
+
+
+def utc8_day(ts: int) -> int:
+    """时间戳对应的 UTC+8 日期序号（自 1970-01-01 起的天数）"""
+    return (ts + UTC8_OFFSET) // 86400
+
+
+def night_day(ts: int) -> int:
+    """晚安所属的“那一晚”：中午 12 点前说的晚安算作前一天晚上"""
+    return utc8_day(ts - 43200)
+
+
+def week_index(day: int) -> int:
+    # 1970-01-01 是周四，加 3 后以周一为一周的开始；
+    # 传入 night_day，周一中午前的早晚安仍算作上一周的最后一晚
+    return (day + 3) // 7
+
+
+def month_index(day: int) -> int:
+    # 与 week_index 一样传入 night_day，1 日中午前的早晚安仍算作上个月
+    date = datetime.date(1970, 1, 1) + datetime.timedelta(days=day)
+    return date.year * 12 + date.month - 1
+
+
+def bedtime_offset(ts: int) -> int:
+    """入睡时刻距离当天（UTC+8）中午 12 点的秒数，跨零点的入睡时间也能直接求平均"""
+    return (ts + UTC8_OFFSET - 43200) % 86400
+
+
+class SleepRecord:
+    """单个用户的早晚安记录，时间为 Unix 时间戳（秒），0 表示没有记录"""
+
+    __slots__ = ("night", "morning")
+
+    def __init__(self, night: int = 0, morning: int = 0) -> None:
+        self.night = night
+        self.morning = morning
+
+    @property
+    def sleeping(self) -> bool:
+        return bool(self.night) and not self.morning
+
+    @property
+    def sleep_seconds(self) -> int:
+        """最近一次晚安到早安的时长，没有晚安记录时为 0"""
+        if not self.night or not self.morning:
+            return 0
+        return self.morning - self.night
+
+
+def _migrate_v1(conn: sqlite3.Connection):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS good_morning (
+            umo_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            night_time TEXT NOT NULL DEFAULT '',
+            morning_time TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (umo_id, user_id)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_good_morning_night ON good_morning (umo_id, night_time)"
+    )
+
+
+def _migrate_v2(conn: sqlite3.Connection):
+    # 每个群每天“正在睡觉”的人数，随早晚安增量更新
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sleep_counters (
+            umo_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            sleeping INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (umo_id, date)
+        )
+        """
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_good_morning_night")
+    conn.execute(
+        "INSERT INTO sleep_counters (umo_id, date, sleeping) "
+        "SELECT umo_id, substr(night_time, 1, 10), COUNT(*) FROM good_morning "
+        "WHERE night_time != '' AND morning_time = '' GROUP BY umo_id, substr(night_time, 1, 10)"
+    )
+
+
+def _migrate_v3(conn: sqlite3.Connection):
+    # 时间改为整数时间戳、日期改为整数日期序号，读取时不再需要解析字符串
+    conn.execute(
+        """
+        CREATE TABLE good_morning_v3 (
+            umo_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            night_ts INTEGER NOT NULL DEFAULT 0,
+            morning_ts INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (umo_id, user_id)
+        ) WITHOUT ROWID
+        """
+    )
+    # 旧记录是 UTC+8 的本地时间字符串
+    conn.execute(
+        f"""
+        INSERT INTO good_morning_v3 (umo_id, user_id, night_ts, morning_ts)
+        SELECT umo_id, user_id,
+            CASE WHEN night_time = '' THEN 0
+                 ELSE CAST(strftime('%s', night_time) AS INTEGER) - {UTC8_OFFSET} END,
+            CASE WHEN morning_time = '' THEN 0
+                 ELSE CAST(strftime('%s', morning_time) AS INTEGER) - {UTC8_OFFSET} END
+        FROM good_morning
+        """
+    )
+    conn.execute("DROP TABLE good_morning")
+    conn.execute("ALTER TABLE good_morning_v3 RENAME TO good_morning")
+    conn.execute("DROP TABLE sleep_counters")
+    conn.execute(
+        """
+        CREATE TABLE sleep_counters (
+            umo_id TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            sleeping INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (umo_id, day)
+        ) WITHOUT ROWID
+        """
+    )
+    _rebuild_sleep_counters(conn)
+
+
+def _rebuild_sleep_counters(conn: sqlite3.Connection):
+    conn.execute("DELETE FROM sleep_counters")
+    conn.execute(
+        f"""
+        INSERT INTO sleep_counters (umo_id, day, sleeping)
+        SELECT umo_id, (night_ts + {UTC8_OFFSET}) / 86400 AS day, COUNT(*) FROM good_morning
+        WHERE night_ts != 0 AND morning_ts = 0 GROUP BY umo_id, day
+        """
+    )
+
+
+def _parse_legacy_time(text: str) -> int:
+    if not text:
+        return 0
+    tz = datetime.timezone(datetime.timedelta(seconds=UTC8_OFFSET))
+    return int(datetime.datetime.strptime(text, "%Y-%m-%d %H:%M:%S").replace(tzinfo=tz).timestamp())
+
+
+def _migrate_v4(conn: sqlite3.Connection):
+    # 每个用户的滚动统计，每次早晚安时增量更新，查询排行时不需要扫描历史记录
+    conn.execute(
+        """
+        CREATE TABLE sleep_stats (
+            umo_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            user_name TEXT NOT NULL DEFAULT '',
+            week INTEGER NOT NULL DEFAULT 0,
+            week_sleeps INTEGER NOT NULL DEFAULT 0,
+            week_sleep_total INTEGER NOT NULL DEFAULT 0,
+            week_nights INTEGER NOT NULL DEFAULT 0,
+            week_bed_total INTEGER NOT NULL DEFAULT 0,
+            month INTEGER NOT NULL DEFAULT 0,
+            month_sleeps INTEGER NOT NULL DEFAULT 0,
+            month_sleep_total INTEGER NOT NULL DEFAULT 0,
+            last_night_day INTEGER NOT NULL DEFAULT 0,
+            streak INTEGER NOT NULL DEFAULT 0,
+            best_streak INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (umo_id, user_id)
+        ) WITHOUT ROWID
+        """
+    )
+    # 记录每个群每天第一个说晚安的人
+    conn.execute("ALTER TABLE sleep_counters ADD COLUMN first_name TEXT NOT NULL DEFAULT ''")
+    conn.execute("ALTER TABLE sleep_counters ADD COLUMN first_ts INTEGER NOT NULL DEFAULT 0")
+
+
+def _migrate_v5(conn: sqlite3.Connection):
+    # 以图搜番结果缓存，按图片 dHash 保存 trace.moe 返回的最佳结果（没有结果时为 NULL）
+    conn.execute(
+        """
+        CREATE TABLE anime_search_cache (
+            phash INTEGER PRIMARY KEY,
+            result TEXT,
+            created_ts INTEGER NOT NULL,
+            last_used_ts INTEGER NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute("CREATE INDEX anime_search_cache_last_used ON anime_search_cache (last_used_ts)")
+    # 哈希分段索引：段号和段值合成一个键，近似哈希至少有一段相同
+    conn.execute(
+        """
+        CREATE TABLE anime_search_bands (
+            band_key INTEGER NOT NULL,
+            phash INTEGER NOT NULL,
+            PRIMARY KEY (band_key, phash)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _migrate_v6(conn: sqlite3.Connection):
+    # AI 识图结果缓存，按图片内容的 sha256 保存
+    conn.execute(
+        """
+        CREATE TABLE recognition_cache (
+            digest TEXT PRIMARY KEY,
+            msg TEXT NOT NULL DEFAULT '',
+            result TEXT NOT NULL DEFAULT '',
+            created_ts INTEGER NOT NULL,
+            last_used_ts INTEGER NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX recognition_cache_last_used ON recognition_cache (last_used_ts)")
+
+
+def _migrate_v7(conn: sqlite3.Connection):
+    # 每个群关注的 Minecraft 服务器
+    conn.execute(
+        """
+        CREATE TABLE mc_watchlist (
+            umo_id TEXT NOT NULL,
+            address TEXT NOT NULL,
+            created_ts INTEGER NOT NULL,
+            PRIMARY KEY (umo_id, address)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+# 按顺序执行的表结构迁移，PRAGMA user_version 记录已执行到第几个
+MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4, _migrate_v5, _migrate_v6, _migrate_v7]
+
+
+class PluginStore:
+    """插件的 SQLite 存储
+
+    使用 WAL 模式，每次写入只更新一行并在事务中提交，进程崩溃不会损坏已有数据。
+    所有数据库操作都在同一个专用线程中串行执行，不阻塞事件循环，也不需要额外加锁。
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: str = "") -> None:
+        self.db_path = db_path
+        self.legacy_json_path = legacy_json_path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plugin-store")
+        self.conn = None
+        # 最近一次清理过期睡觉计数的日期
+        self._counter_day = 0
+        # 打开数据库排在线程队列的最前面，之后提交的操作都会等它完成
+        self._opened = self.executor.submit(self._open)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        self.conn = conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for index in range(version, len(MIGRATIONS)):
+            with self.transaction():
+                MIGRATIONS[index](conn)
+                conn.execute(f"PRAGMA user_version={index + 1}")
+        self._import_legacy_json()
+
+    def transaction(self):
+        return _Transaction(self.conn)
+
+    def _import_legacy_json(self):
+        """把旧版本整文件保存的 JSON 数据导入数据库，导入后改名保留备份"""
+        path = self.legacy_json_path
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.loads(f.read() or "{}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取旧版早晚安数据失败，跳过导入: {e}")
+            return
+        # 旧版本读取时用 good_morning 键，写入时却直接写在顶层，两种格式都兼容
+        groups = data.get("good_morning", data)
+        rows = []
+        for umo_id, users in groups.items():
+            if not isinstance(users, dict):
+                continue
+            for user_id, user in users.items():
+                daily = user.get("daily", {}) if isinstance(user, dict) else {}
+                try:
+                    night_ts = _parse_legacy_time(daily.get("night_time", ""))
+                    morning_ts = _parse_legacy_time(daily.get("morning_time", ""))
+                except ValueError:
+                    continue
+                rows.append((umo_id, str(user_id), night_ts, morning_ts))
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO good_morning (umo_id, user_id, night_ts, morning_ts) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            _rebuild_sleep_counters(self.conn)
+        os.replace(path, path + ".migrated")
+        logger.info(f"已将 {len(rows)} 条早晚安记录从 {path} 导入数据库")
+
+    async def run(self, fn, *args):
+        """在数据库线程中执行 fn(conn, *args)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._call, fn, args)
+
+    def _call(self, fn, args):
+        # 打开失败时每次调用都会抛出同一个异常
+        self._opened.result()
+        return fn(self.conn, *args)
+
+    # 早晚安
+
+    async def check_in(self, umo_id: str, user_id: str, user_name: str, is_night: bool, now: int):
+        """记录一次早安/晚安，返回 (SleepRecord, 本群今天正在睡觉的人数)
+
+        只按主键读写当前用户的记录、统计和两个计数器，耗时与群人数无关。
+        """
+        return await self.run(self._check_in, umo_id, str(user_id), user_name, is_night, now)
+
+    def _check_in(self, conn, umo_id, user_id, user_name, is_night, now):
+        # 昵称可能为空，而 first_name / user_name 列不允许 NULL
+        user_name = str(user_name or user_id)
+        today = utc8_day(now)
+        pruned = False
+        with self.transaction():
+            if today != self._counter_day:
+                # 跨天后之前日期的计数不会再被读取，顺便清理
+                conn.execute("DELETE FROM sleep_counters WHERE day < ?", (today,))
+                pruned = True
+            row = conn.execute(
+                "SELECT night_ts, morning_ts FROM good_morning WHERE umo_id = ? AND user_id = ?",
+                (umo_id, user_id),
+            ).fetchone()
+            record = SleepRecord(*row) if row else SleepRecord()
+            was_sleeping = record.sleeping
+            if record.sleeping:
+                # 之前处于睡觉状态，先从那天的计数中移除
+                conn.execute(
+                    "UPDATE sleep_counters SET sleeping = MAX(sleeping - 1, 0) WHERE umo_id = ? AND day = ?",
+                    (umo_id, utc8_day(record.night)),
+                )
+            if is_night:
+                record.night, record.morning = now, 0  # 晚安后清空早安时间
+                conn.execute(
+                    "INSERT INTO sleep_counters (umo_id, day, sleeping, first_name, first_ts) VALUES (?, ?, 1, ?, ?) "
+                    "ON CONFLICT (umo_id, day) DO UPDATE SET sleeping = sleeping + 1",
+                    (umo_id, today, user_name, now),
+                )
+            else:
+                record.morning = now
+            conn.execute(
+                "INSERT INTO good_morning (umo_id, user_id, night_ts, morning_ts) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (umo_id, user_id) DO UPDATE SET "
+                "night_ts = excluded.night_ts, morning_ts = excluded.morning_ts",
+                (umo_id, user_id, record.night, record.morning),
+            )
+            self._update_stats(conn, umo_id, user_id, user_name, is_night, was_sleeping, record, now)
+            counter = conn.execute(
+                "SELECT sleeping FROM sleep_counters WHERE umo_id = ? AND day = ?",
+                (umo_id, today),
+            ).fetchone()
+        if pruned:
+            # 事务提交成功后才记录，回滚时下次打卡会重新清理
+            self._counter_day = today
+        return record, counter[0] if counter else 0
+
+    def _update_stats(self, conn, umo_id, user_id, user_name, is_night, was_sleeping, record, now):
+        user_name = str(user_name or user_id)
+        row = conn.execute(
+            "SELECT week, week_sleeps, week_sleep_total, week_nights, week_bed_total, "
+            "month, month_sleeps, month_sleep_total, last_night_day, streak, best_streak "
+            "FROM sleep_stats WHERE umo_id = ? AND user_id = ?",
+            (umo_id, user_id),
+        ).fetchone()
+        (week, week_sleeps, week_sleep_total, week_nights, week_bed_total,
+         month, month_sleeps, month_sleep_total, last_night_day, streak, best_streak) = row or (0,) * 11
+
+        # 进入新的一周 / 一个月时重新累计
+        curr_week = week_index(night_day(now))
+        if week != curr_week:
+            week, week_sleeps, week_sleep_total, week_nights, week_bed_total = curr_week, 0, 0, 0, 0
+        curr_month = month_index(night_day(now))
+        if month != curr_month:
+            month, month_sleeps, month_sleep_total = curr_month, 0, 0
+
+        if is_night:
+            day = night_day(now)
+            if day != last_night_day:
+                # 同一晚重复说晚安只算一次
+                streak = streak + 1 if day == last_night_day + 1 else 1
+                best_streak = max(best_streak, streak)
+                week_nights += 1
+                week_bed_total += bedtime_offset(now)
+                last_night_day = day
+        elif was_sleeping and 0 < record.sleep_seconds <= MAX_SLEEP_SECONDS:
+            week_sleeps += 1
+            week_sleep_total += record.sleep_seconds
+            month_sleeps += 1
+            month_sleep_total += record.sleep_seconds
+
+        conn.execute(
+            "INSERT OR REPLACE INTO sleep_stats (umo_id, user_id, user_name, week, week_sleeps, week_sleep_total, "
+            "week_nights, week_bed_total, month, month_sleeps, month_sleep_total, last_night_day, streak, best_streak) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (umo_id, user_id, user_name, week, week_sleeps, week_sleep_total, week_nights, week_bed_total,
+             month, month_sleeps, month_sleep_total, last_night_day, streak, best_streak),
+        )
+
+    async def get_sleep_stats(self, umo_id: str, user_id: str, now: int):
+        """返回用户本周、本月的统计，已经过期的周期按 0 计算；没有记录时返回 None"""
+
+        def query(conn, umo_id, user_id):
+            return conn.execute(
+                "SELECT week, week_sleeps, week_sleep_total, week_nights, week_bed_total, "
+                "month, month_sleeps, month_sleep_total, last_night_day, streak, best_streak "
+                "FROM sleep_stats WHERE umo_id = ? AND user_id = ?",
+                (umo_id, user_id),
+            ).fetchone()
+
+        row = await self.run(query, umo_id, str(user_id))
+        if row is None:
+            return None
+        (week, week_sleeps, week_sleep_total, week_nights, week_bed_total,
+         month, month_sleeps, month_sleep_total, last_night_day, streak, best_streak) = row
+        if week != week_index(night_day(now)):
+            week_sleeps = week_sleep_total = week_nights = week_bed_total = 0
+        if month != month_index(night_day(now)):
+            month_sleeps = month_sleep_total = 0
+        if last_night_day < night_day(now) - 1:
+            # 昨晚没有说晚安，连续记录已经中断
+            streak = 0
+        return {
+            "week_sleeps": week_sleeps,
+            "week_sleep_total": week_sleep_total,
+            "week_nights": week_nights,
+            "week_bed_total": week_bed_total,
+            "month_sleeps": month_sleeps,
+            "month_sleep_total": month_sleep_total,
+            "streak": streak,
+            "best_streak": best_streak,
+        }
+
+    async def sleep_leaderboard(self, umo_id: str, now: int, limit: int = 5) -> dict:
+        """本群的睡眠排行：本周 / 本月平均睡眠时长、本周平均入睡最早、连续晚安天数、今天第一个睡觉的人"""
+        week = week_index(night_day(now))
+        month = month_index(night_day(now))
+        min_night_day = night_day(now) - 1
+
+        def query(conn):
+            result = {
+                "week_avg": conn.execute(
+                    "SELECT user_name, week_sleep_total / week_sleeps AS avg, week_sleeps FROM sleep_stats "
+                    "WHERE umo_id = ? AND week = ? AND week_sleeps > 0 ORDER BY avg DESC LIMIT ?",
+                    (umo_id, week, limit),
+                ).fetchall(),
+                "month_avg": conn.execute(
+                    "SELECT user_name, month_sleep_total / month_sleeps AS avg, month_sleeps FROM sleep_stats "
+                    "WHERE umo_id = ? AND month = ? AND month_sleeps > 0 ORDER BY avg DESC LIMIT ?",
+                    (umo_id, month, limit),
+                ).fetchall(),
+                "early_bird": conn.execute(
+                    "SELECT user_name, week_bed_total / week_nights AS avg, week_nights FROM sleep_stats "
+                    "WHERE umo_id = ? AND week = ? AND week_nights > 0 ORDER BY avg ASC LIMIT ?",
+                    (umo_id, week, limit),
+                ).fetchall(),
+                "streak": conn.execute(
+                    "SELECT user_name, streak FROM sleep_stats "
+                    "WHERE umo_id = ? AND last_night_day >= ? AND streak > 1 ORDER BY streak DESC LIMIT ?",
+                    (umo_id, min_night_day, limit),
+                ).fetchall(),
+                "first": conn.execute(
+                    "SELECT first_name, first_ts FROM sleep_counters WHERE umo_id = ? AND day = ?",
+                    (umo_id, utc8_day(now)),
+                ).fetchone(),
+            }
+            return result
+
+        return await self.run(query)
+
+    # 以图搜番缓存
+
+    async def find_anime_search(self, phash: int, max_distance: int, now: int):
+        """查找汉明距离不超过 max_distance 的最近缓存，返回 (结果 JSON, 距离, 缓存时间)，未命中返回 None"""
+
+        def query(conn):
+            keys = hash_bands(phash)
+            rows = conn.execute(
+                "SELECT c.phash, c.result, c.created_ts FROM anime_search_cache c WHERE c.phash IN ("
+                f"SELECT phash FROM anime_search_bands WHERE band_key IN ({', '.join('?' * len(keys))}))",
+                keys,
+            ).fetchall()
+            best = None
+            for candidate, result, created_ts in rows:
+                distance = hamming(phash, to_unsigned(candidate))
+                if distance <= max_distance and (best is None or distance < best[1]):
+                    best = (candidate, distance, result, created_ts)
+            if best is None:
+                return None
+            conn.execute(
+                "UPDATE anime_search_cache SET last_used_ts = ?, hits = hits + 1 WHERE phash = ?",
+                (now, best[0]),
+            )
+            return best[2], best[1], best[3]
+
+        return await self.run(query)
+
+    async def save_anime_search(self, phash: int, result: str, now: int, max_entries: int):
+        """保存一次 trace.moe 查询结果，超过 max_entries 条时删除最久未使用的缓存"""
+
+        def save(conn):
+            signed = to_signed(phash)
+            with self.transaction():
+                conn.execute(
+                    "INSERT INTO anime_search_cache (phash, result, created_ts, last_used_ts) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (phash) DO UPDATE SET result = excluded.result, "
+                    "created_ts = excluded.created_ts, last_used_ts = excluded.last_used_ts",
+                    (signed, result, now, now),
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO anime_search_bands (band_key, phash) VALUES (?, ?)",
+                    [(key, signed) for key in hash_bands(phash)],
+                )
+                count = conn.execute("SELECT COUNT(*) FROM anime_search_cache").fetchone()[0]
+                if count > max_entries:
+                    evicted = [
+                        row[0]
+                        for row in conn.execute(
+                            "SELECT phash FROM anime_search_cache WHERE phash != ? ORDER BY last_used_ts LIMIT ?",
+                            (signed, count - max_entries),
+                        )
+                    ]
+                    conn.executemany("DELETE FROM anime_search_cache WHERE phash = ?", [(p,) for p in evicted])
+                    conn.executemany(
+                        "DELETE FROM anime_search_bands WHERE band_key = ? AND phash = ?",
+                        [(key, p) for p in evicted for key in hash_bands(to_unsigned(p))],
+                    )
+
+        await self.run(save)
+
+    # 识图缓存
+
+    async def find_recognition(self, digest: str, now: int):
+        """按图片 sha256 查找识图结果，返回 (msg, result)，未命中返回 None"""
+
+        def query(conn):
+            row = conn.execute(
+                "SELECT msg, result FROM recognition_cache WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE recognition_cache SET last_used_ts = ?, hits = hits + 1 WHERE digest = ?",
+                    (now, digest),
+                )
+            return row
+
+        return await self.run(query)
+
+    async def save_recognition(self, digest: str, msg: str, result: str, now: int, max_entries: int):
+        """保存识图结果，超过 max_entries 条时删除最久未使用的缓存"""
+
+        def save(conn):
+            with self.transaction():
+                conn.execute(
+                    "INSERT INTO recognition_cache (digest, msg, result, created_ts, last_used_ts) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (digest) DO UPDATE SET msg = excluded.msg, "
+                    "result = excluded.result, created_ts = excluded.created_ts, last_used_ts = excluded.last_used_ts",
+                    (digest, msg, result, now, now),
+                )
+                count = conn.execute("SELECT COUNT(*) FROM recognition_cache").fetchone()[0]
+                if count > max_entries:
+                    conn.execute(
+                        "DELETE FROM recognition_cache WHERE digest IN ("
+                        "SELECT digest FROM recognition_cache WHERE digest != ? ORDER BY last_used_ts LIMIT ?)",
+                        (digest, count - max_entries),
+                    )
+
+        await self.run(save)
+
+    # MC 服务器关注列表
+
+    async def mc_watchlist(self, umo_id: str) -> list:
+        """按添加顺序返回本群关注的服务器地址"""
+
+        def query(conn):
+            rows = conn.execute(
+                "SELECT address FROM mc_watchlist WHERE umo_id = ? ORDER BY created_ts, address", (umo_id,)
+            ).fetchall()
+            return [row[0] for row in rows]
+
+        return await self.run(query)
+
+    async def add_mc_watch(self, umo_id: str, addresses: list, now: int, limit: int):
+        """添加关注的服务器，超过 limit 个的部分不添加；返回 (新添加的地址, 添加后的总数)"""
+
+        def add(conn):
+            added = []
+            with self.transaction():
+                count = conn.execute("SELECT COUNT(*) FROM mc_watchlist WHERE umo_id = ?", (umo_id,)).fetchone()[0]
+                for address in addresses:
+                    if count >= limit:
+                        break
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO mc_watchlist (umo_id, address, created_ts) VALUES (?, ?, ?)",
+                        (umo_id, address, now),
+                    )
+                    if cursor.rowcount:
+                        added.append(address)
+                        count += 1
+            return added, count
+
+        return await self.run(add)
+
+    async def remove_mc_watch(self, umo_id: str, addresses: list) -> int:
+        """取消关注，返回实际删除的数量"""
+
+        def remove(conn):
+            with self.transaction():
+                cursor = conn.executemany(
+                    "DELETE FROM mc_watchlist WHERE umo_id = ? AND address = ?",
+                    [(umo_id, address) for address in addresses],
+                )
+            return cursor.rowcount
+
+        return await self.run(remove)
+
+    async def close(self):
+        def shutdown(conn):
+            if conn is not None:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                conn.close()
+
+        try:
+            await self.run(shutdown)
+        except Exception as e:
+            logger.warning(f"关闭数据库失败: {e}")
+        self.executor.shutdown(wait=False)
+
+
+class _Transaction:
+    """autocommit 连接上的显式事务，出错时回滚"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
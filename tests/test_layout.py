@@ -0,0 +1,52 @@
+import os
+import sys
+
+from PIL import ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from layout import GlyphMetrics, TextLayout  # noqa: E402
+
+
+def make_layout():
+    layout = TextLayout("", stroke_width=0)
+    metrics = GlyphMetrics(ImageFont.load_default(size=20))
+    return layout, metrics
+
+
+def test_lines_never_exceed_width_after_carrying_a_word():
+    layout, metrics = make_layout()
+    # 空格前的前缀比下一个字形还窄时，移到下一行的单词加上当前字形仍可能超宽
+    text = "i " + "W" * 40 + " a bbbbbbbbbbbb cc dddddddddd e ffffffffff " * 4
+    for max_width in range(40, 300):
+        for line, width in layout.break_lines(text, metrics, max_width):
+            assert width <= max_width
+            assert abs(metrics.width(line) - width) < 1e-6
+
+
+def test_long_word_is_hard_broken():
+    layout, metrics = make_layout()
+    word = "supercalifragilisticexpialidocious"
+    lines = layout.break_lines("a " + word * 3, metrics, 120)
+    assert lines[0][0] == "a"
+    assert "".join(line for line, _ in lines[1:]) == word * 3
+    assert all(width <= 120 for _, width in lines)
+
+
+def test_leading_space_does_not_produce_empty_line():
+    layout, metrics = make_layout()
+    lines = layout.break_lines(" " + "abcdefghij" * 6, metrics, 150)
+    assert lines[0][0].strip()
+    assert all(width <= 150 for _, width in lines)
+
+
+def test_words_are_kept_together():
+    layout, metrics = make_layout()
+    lines = layout.break_lines("hello world again", metrics, metrics.width("hello world") + 1)
+    assert [line for line, _ in lines] == ["hello world", "again"]
+
+
+def test_newlines_start_new_paragraphs():
+    layout, metrics = make_layout()
+    lines = layout.break_lines("first\nsecond", metrics, 500)
+    assert [line for line, _ in lines] == ["first", "second"]
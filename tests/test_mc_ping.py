@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+import socket
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mc_ping import (  # noqa: E402
+    MinecraftPingError,
+    MinecraftPinger,
+    pack_packet,
+    pack_string,
+    pack_varint,
+    parse_address,
+    read_packet,
+    unpack_varint,
+)
+
+STATUS = {
+    "version": {"name": "§6Paper 1.20.4", "protocol": 765},
+    "players": {"max": 20, "online": 2, "sample": [{"name": "Alex", "id": "1"}, {"name": "Steve", "id": "2"}]},
+    "description": {"text": "§aHello", "extra": [{"text": "\n§bWorld"}]},
+    "favicon": "data:image/png;base64,AAAA",
+}
+
+
+async def fake_server(answer_ping: bool = True):
+    """按 Server List Ping 协议应答的本地服务器，返回 (server, 端口, 收到的握手信息)"""
+    received = {}
+
+    async def handle(reader, writer):
+        try:
+            packet_id, body = await read_packet(reader)
+            protocol, offset = unpack_varint(body)
+            length, offset = unpack_varint(body, offset)
+            received["handshake"] = (packet_id, protocol, body[offset:offset + length].decode())
+            offset += length
+            received["port"] = struct.unpack(">H", body[offset:offset + 2])[0]
+            received["next_state"], _ = unpack_varint(body, offset + 2)
+            received["status_request"] = await read_packet(reader)
+            writer.write(pack_packet(0x00, pack_string(json.dumps(STATUS))))
+            await writer.drain()
+            packet_id, payload = await read_packet(reader)
+            received["ping"] = packet_id
+            if answer_ping:
+                writer.write(pack_packet(0x01, payload))
+                await writer.drain()
+            else:
+                await reader.read()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1], received
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 255, 25565, 2 ** 21, 2 ** 31 - 1, -1, -765, -(2 ** 31)])
+def test_varint_round_trip(value):
+    packed = pack_varint(value)
+    assert len(packed) <= 5
+    assert unpack_varint(packed) == (value, len(packed))
+    assert unpack_varint(b"\x00" + packed, 1) == (value, len(packed) + 1)
+
+
+def test_varint_errors():
+    with pytest.raises(MinecraftPingError, match="过长"):
+        unpack_varint(b"\xff" * 5 + b"\x01")
+    with pytest.raises(MinecraftPingError, match="不完整"):
+        unpack_varint(b"\x80\x80")
+
+
+def test_parse_address():
+    assert parse_address("mc.example.com") == ("mc.example.com", None)
+    assert parse_address(" mc.example.com:25566 ") == ("mc.example.com", 25566)
+    assert parse_address("[::1]:25566") == ("::1", 25566)
+    assert parse_address("[2001:db8::1]") == ("2001:db8::1", None)
+    assert parse_address("2001:db8::1") == ("2001:db8::1", None)
+
+
+@pytest.mark.parametrize("address", ["", "  ", ":25565", "[]:25565", "host:abc", "host:0", "host:65536", "[::1]:99999"])
+def test_parse_address_rejects_invalid(address):
+    with pytest.raises(ValueError):
+        parse_address(address)
+
+
+def test_status_matches_mcsrvstat():
+    async def run():
+        server, port, received = await fake_server()
+        async with server:
+            data = await MinecraftPinger(timeout=2).status(f"127.0.0.1:{port}")
+        return port, received, data
+
+    port, received, data = asyncio.run(run())
+    assert received["handshake"] == (0x00, -1, "127.0.0.1")
+    assert received["port"] == port
+    assert received["next_state"] == 1
+    assert received["status_request"] == (0x00, b"")
+    assert received["ping"] == 0x01
+
+    assert data["online"] is True
+    assert (data["ip"], data["port"], data["hostname"]) == ("127.0.0.1", port, "127.0.0.1")
+    assert data["motd"]["raw"] == ["§aHello", "§bWorld"]
+    assert data["motd"]["clean"] == ["Hello", "World"]
+    assert data["players"] == {"online": 2, "max": 20, "list": ["Alex", "Steve"]}
+    assert data["version"] == "Paper 1.20.4"
+    assert data["protocol"] == 765
+    assert data["icon"] == STATUS["favicon"]
+    assert data["debug"]["srv"] is False
+    assert data["debug"]["source"] == "native"
+    assert data["debug"]["latency"] >= 0
+
+
+def test_status_without_pong_uses_status_latency():
+    async def run():
+        server, port, received = await fake_server(answer_ping=False)
+        pinger = MinecraftPinger(timeout=0.6)
+        async with server:
+            data = await pinger.status(f"127.0.0.1:{port}")
+        return received, data, pinger
+
+    received, data, pinger = asyncio.run(run())
+    assert received["ping"] == 0x01
+    assert data["players"]["online"] == 2
+    # 延迟取状态请求的耗时，而不是等待 Pong 超时的时间
+    assert 0 <= data["debug"]["latency"] < 300
+    assert pinger.failures == 0
+
+
+def test_connection_refused_raises_ping_error():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    pinger = MinecraftPinger(timeout=2)
+    with pytest.raises(MinecraftPingError):
+        asyncio.run(pinger.status(f"127.0.0.1:{port}"))
+    assert (pinger.queries, pinger.failures) == (1, 1)
@@ -0,0 +1,140 @@
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import sqlite3
+import sys
+import types
+
+import pytest
+
+# storage.py 使用相对导入，把仓库目录注册为一个包再导入，不执行插件入口
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+package = types.ModuleType("plugin_under_test")
+package.__path__ = [ROOT]
+sys.modules.setdefault("plugin_under_test", package)
+storage = importlib.import_module("plugin_under_test.storage")
+
+UTC8 = datetime.timezone(datetime.timedelta(hours=8))
+UMO = "aiocqhttp:GroupMessage:123"
+
+
+def epoch(text: str) -> int:
+    return int(datetime.datetime.strptime(text, "%Y-%m-%d %H:%M:%S").replace(tzinfo=UTC8).timestamp())
+
+
+NIGHT = "2026-10-17 23:30:00"
+MORNING = "2026-10-18 07:15:00"
+EARLY_NIGHT = "2026-10-18 00:40:00"
+
+
+async def with_store(path: str, fn, legacy_json_path: str = ""):
+    store = storage.PluginStore(path, legacy_json_path)
+    try:
+        return await fn(store)
+    finally:
+        await store.close()
+
+
+async def dump(store):
+    def query(conn):
+        return {
+            "version": conn.execute("PRAGMA user_version").fetchone()[0],
+            "good_morning": conn.execute(
+                "SELECT umo_id, user_id, night_ts, morning_ts FROM good_morning ORDER BY umo_id, user_id"
+            ).fetchall(),
+            "sleep_counters": conn.execute(
+                "SELECT umo_id, day, sleeping, first_name, first_ts FROM sleep_counters ORDER BY umo_id, day"
+            ).fetchall(),
+            "sleep_stats": conn.execute("SELECT COUNT(*) FROM sleep_stats").fetchone()[0],
+            "tables": {
+                row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            },
+        }
+
+    return await store.run(query)
+
+
+def assert_imported(state):
+    assert state["version"] == len(storage.MIGRATIONS) == 7
+    assert {"sleep_stats", "anime_search_cache", "anime_search_bands", "recognition_cache", "mc_watchlist"} <= state[
+        "tables"
+    ]
+    assert state["good_morning"] == [
+        (UMO, "1001", epoch(NIGHT), 0),
+        (UMO, "1002", epoch(NIGHT), epoch(MORNING)),
+        (UMO, "1003", epoch(EARLY_NIGHT), 0),
+    ]
+    # 23:30 和次日 00:40 的晚安分别计入各自的日期
+    assert state["sleep_counters"] == [
+        (UMO, storage.utc8_day(epoch(NIGHT)), 1, "", 0),
+        (UMO, storage.utc8_day(epoch(EARLY_NIGHT)), 1, "", 0),
+    ]
+    # 旧数据只有最近一次早晚安，没有可以回填的历史统计
+    assert state["sleep_stats"] == 0
+
+
+async def morning_after_import(store):
+    now = epoch("2026-10-18 08:00:00")
+    record, _ = await store.check_in(UMO, "1001", "Alex", False, now)
+    stats = await store.get_sleep_stats(UMO, "1001", now)
+    return record, stats
+
+
+def assert_morning_counted(record, stats):
+    # 导入的睡觉状态可以直接接着说早安，并计入新的统计
+    assert record.sleep_seconds == epoch("2026-10-18 08:00:00") - epoch(NIGHT)
+    assert stats["week_sleeps"] == stats["month_sleeps"] == 1
+    assert stats["week_sleep_total"] == stats["month_sleep_total"] == record.sleep_seconds
+
+
+def test_text_schema_is_migrated_to_timestamps(tmp_path):
+    path = str(tmp_path / "data.db")
+    conn = sqlite3.connect(path, isolation_level=None)
+    storage.MIGRATIONS[0](conn)
+    conn.executemany(
+        "INSERT INTO good_morning (umo_id, user_id, night_time, morning_time) VALUES (?, ?, ?, ?)",
+        [(UMO, "1001", NIGHT, ""), (UMO, "1002", NIGHT, MORNING), (UMO, "1003", EARLY_NIGHT, "")],
+    )
+    storage.MIGRATIONS[1](conn)
+    assert conn.execute("SELECT umo_id, date, sleeping FROM sleep_counters ORDER BY date").fetchall() == [
+        (UMO, "2026-10-17", 1),
+        (UMO, "2026-10-18", 1),
+    ]
+    conn.execute("PRAGMA user_version=2")
+    conn.close()
+
+    assert_imported(asyncio.run(with_store(path, dump)))
+    assert_morning_counted(*asyncio.run(with_store(path, morning_after_import)))
+
+
+@pytest.mark.parametrize("nested", [False, True], ids=["top_level", "good_morning_key"])
+def test_legacy_json_is_imported(tmp_path, nested):
+    groups = {
+        UMO: {
+            "1001": {"daily": {"night_time": NIGHT, "morning_time": ""}},
+            "1002": {"daily": {"night_time": NIGHT, "morning_time": MORNING}},
+            "1003": {"daily": {"night_time": EARLY_NIGHT}},
+            "1004": {"daily": {"night_time": "昨晚", "morning_time": ""}},
+        },
+        "broken": [],
+    }
+    json_path = tmp_path / "good_morning.json"
+    json_path.write_text(json.dumps({"good_morning": groups} if nested else groups), encoding="utf-8")
+    path = str(tmp_path / "data.db")
+
+    assert_imported(asyncio.run(with_store(path, dump, str(json_path))))
+    assert not json_path.exists()
+    assert (tmp_path / "good_morning.json.migrated").exists()
+    # 再次打开时不会重复导入
+    assert_imported(asyncio.run(with_store(path, dump, str(json_path))))
+    assert_morning_counted(*asyncio.run(with_store(path, morning_after_import)))
+
+
+def test_legacy_time_is_utc8():
+    assert storage._parse_legacy_time("") == 0
+    assert storage._parse_legacy_time("1970-01-01 08:00:00") == 0
+    assert storage._parse_legacy_time(NIGHT) == epoch(NIGHT)
+    with pytest.raises(ValueError):
+        storage._parse_legacy_time("2026/10/17 23:30")